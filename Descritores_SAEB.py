@@ -5,6 +5,18 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from analytics.exportacao import renderizar_exportacao, tabelas_descritores
+from analytics.armazenamento import selecionar_particao, nome_escola, caminho_dados, fonte_dados
+from analytics.graficos import plotly_chart_medido, plotly_chart_otimizado, exibir_payloads
+from analytics.instrumentacao import iniciar_execucao, medir, exibir_diagnostico
+from analytics.faixas import calcular_faixas, distribuicao_faixas, LIMITES_DESCRITORES, ROTULOS_DESCRITORES, LIMITES_GRADIENTE
+from analytics.tendencias import renderizar_tendencias
+from analytics.validacao import validar_notas, exibir_quarentena
+from analytics.tabelas import renderizar_tabela_paginada, estilos_gradiente
+from analytics.respostas import construir_respostas, selecionar_linhas, agregar_alunos, agregar_descritores, colunas_descritores
+from analytics.tri import calibrar_componente
+from analytics.recomendacao import tabela_recomendacoes
+
 
 def per_aluno(A, B):
     p = (A / B) * 100
@@ -24,6 +36,10 @@ st.set_page_config(
     }
 )
 
+iniciar_execucao('Descritores SAEB')
+
+escola, ano = selecionar_particao()
+
 # CSS personalizado para melhorar a aparência
 st.markdown("""
 <style>
@@ -55,10 +71,10 @@ st.markdown("""
 
 # Sidebar melhorada
 with st.sidebar:
-    st.markdown("""
+    st.markdown(f"""
     <div style="text-align: center; margin-bottom: 20px;">
         <h1 style="color: #2c3e50; font-size: 24px;">Simulados SAEB 2025</h1>
-        <h2 style="color: #3498db; font-size: 18px;">Escola Estadual Helena Dionysio</h2>
+        <h2 style="color: #3498db; font-size: 18px;">{nome_escola(escola)}</h2>
     </div>
     """, unsafe_allow_html=True)
 
@@ -71,13 +87,20 @@ with st.sidebar:
         st.markdown("### Configurações do Relatório")
         try:
             # Corrigido o nome do arquivo para "descritores.csv"
-            df = pd.read_csv("pages/descritores2.csv", sep=";")
-
+            with medir('carga_csv') as registro:
+                df = pd.read_csv(caminho_dados('descritores', escola, ano), sep=";")
+                registro['linhas'] = len(df)
             # Verifica se as colunas necessárias existem
             if 'Simulados' not in df.columns or 'Componentes' not in df.columns:
                 st.error("O arquivo CSV não contém as colunas necessárias ('Simulados' e 'Componentes')")
                 st.stop()
 
+            # Respostas fora de 0/1 e alunos repetidos no mesmo simulado ficam em quarentena
+            df, quarentena = validar_notas(
+                df, colunas_descritores(df), 1, fonte_dados('descritores', escola, ano), chaves=['Aluno', 'Componentes', 'Simulados']
+            )
+            df_completo = df
+
             salas_distintas = df["Simulados"].unique().tolist()
             if not salas_distintas:
                 st.error("Nenhum simulado encontrado no arquivo CSV")
@@ -87,8 +110,9 @@ with st.sidebar:
             componente_selecionada = st.radio("Componente Curricular", ["Matematica", "Portugues"])
 
             if componente_selecionada:
-                df = df[df["Simulados"] == salas_selecionadas]
-                df = df[df["Componentes"] == componente_selecionada]
+                with medir('limpeza', linhas=len(df)):
+                    df = df[df["Simulados"] == salas_selecionadas]
+                    df = df[df["Componentes"] == componente_selecionada]
 
                 if df.empty:
                     st.error("Nenhum dado encontrado para a combinação selecionada")
@@ -132,34 +156,24 @@ st.markdown(f"""
 
 try:
     # Processamento dos dados com tratamento de erros
-    df1 = df.iloc[:, 3:38].copy()
-    num_NaN = df1.iloc[0].isna().sum() if len(df1) > 0 else 0
-    Num_descritores_contemplados = len(df1.columns) - num_NaN
+    # As respostas ficam numa matriz esparsa; só as células respondidas entram nas somas
+    base_respostas = construir_respostas(df_completo)
+    linhas_selecionadas = selecionar_linhas(base_respostas, salas_selecionadas, componente_selecionada)
+    descritores_avaliados = base_respostas['itens_por_simulado'].get((componente_selecionada, salas_selecionadas), [])
+    Num_descritores_contemplados = len(descritores_avaliados)
 
-    df_alunos = df.iloc[:, 0].copy()
-    Num_alunos = len(df_alunos)
+    Num_alunos = len(linhas_selecionadas)
 
     if Num_alunos == 0:
         st.warning("Nenhum aluno encontrado para os filtros selecionados")
         st.stop()
 
-    df_analise_alunos = pd.DataFrame()
-    df_descritores = pd.DataFrame()
-
-    # Calcular porcentagens com tratamento para divisão por zero
-    df2 = df1.sum(axis=1)
-    df_analise_alunos['Nomes'] = df_alunos
-    df_analise_alunos['Porcentagem'] = df2.apply(
-        lambda x: (x / Num_descritores_contemplados * 100) if Num_descritores_contemplados > 0 else 0)
+    with medir('agregacao', linhas=Num_alunos):
+        df_analise_alunos = agregar_alunos(base_respostas, linhas_selecionadas, Num_descritores_contemplados)[['Nomes', 'Porcentagem']]
+        df_acima_de_60 = df_analise_alunos[df_analise_alunos['Porcentagem'] >= 60]
 
-    df_acima_de_60 = df_analise_alunos[df_analise_alunos['Porcentagem'] >= 60]
-
-    # Preparar dados de descritores
-    df_descritores['Descritor'] = df1.columns.tolist()
-    df_descritores['Porcentagem'] = df1.sum(axis=0).tolist()
-    df_descritores['Porcentagem'] = df_descritores['Porcentagem'].apply(
-        lambda x: (x / Num_alunos * 100) if Num_alunos > 0 else 0)
-    df_descritores_mean = df_descritores[df_descritores['Porcentagem'] != 0.0]
+        # Preparar dados de descritores (apenas os avaliados no simulado)
+        df_descritores_mean = agregar_descritores(base_respostas, linhas_selecionadas, descritores_avaliados)[['Descritor', 'Porcentagem']]
 
     # Gráficos interativos com Plotly melhorados
     st.markdown("## 📊 Desempenho dos Alunos")
@@ -200,7 +214,7 @@ try:
                 'yanchor': 'top'
             }
         )
-        st.plotly_chart(fig_alunos, use_container_width=True)
+        plotly_chart_otimizado(fig_alunos, 'Desempenho dos Alunos', use_container_width=True)
     else:
         st.warning("Nenhum dado disponível para exibir o gráfico de desempenho dos alunos")
 
@@ -234,10 +248,8 @@ try:
         )
 
         # Gráfico de pizza (distribuição)
-        bins = [0, 30, 60, 80, 100]
-        labels = ['0-30%', '30-60%', '60-80%', '80-100%']
-        df_descritores_mean['Categoria'] = pd.cut(df_descritores_mean['Porcentagem'], bins=bins, labels=labels)
-        distribuicao = df_descritores_mean['Categoria'].value_counts().sort_index()
+        codigos = calcular_faixas(df_descritores_mean['Porcentagem'], LIMITES_DESCRITORES)
+        distribuicao = distribuicao_faixas(codigos, ROTULOS_DESCRITORES)
 
         fig_descritores.add_trace(
             go.Pie(
@@ -268,7 +280,7 @@ try:
         )
 
         fig_descritores.update_yaxes(autorange="reversed", row=1, col=1)
-        st.plotly_chart(fig_descritores, use_container_width=True)
+        plotly_chart_medido(fig_descritores, use_container_width=True)
     else:
         st.warning("Nenhum dado disponível para exibir o gráfico de descritores")
 
@@ -332,17 +344,13 @@ try:
     # Tabelas com estilo melhorado
     if not df_acima_de_60.empty:
         st.markdown(f"## 🏆 Melhores Alunos - {salas_selecionadas}")
-        st.dataframe(
-            df_acima_de_60.round(2).style
-            .background_gradient(cmap='Greens', subset=['Porcentagem'])
-            .format({'Porcentagem': '{:.1f}%'})
-            .set_properties(**{'text-align': 'center'})
-            .set_table_styles([{
-                'selector': 'th',
-                'props': [('background-color', '#3498db'),
-                          ('color', 'white'),
-                          ('text-align', 'center')]
-            }]),
+        renderizar_tabela_paginada(
+            df_acima_de_60.round(2),
+            chave='tabela_melhores_alunos',
+            faixas=[(['Porcentagem'], LIMITES_GRADIENTE, estilos_gradiente('Greens', LIMITES_GRADIENTE))],
+            formato={'Porcentagem': '{:.1f}%'},
+            coluna_busca='Nomes',
+            propriedades={'text-align': 'center'},
             use_container_width=True,
             height=400
         )
@@ -351,23 +359,81 @@ try:
 
     if not df_descritores_mean.empty:
         st.markdown(f"## 📋 Descritores por Desempenho - {salas_selecionadas}")
-        st.dataframe(
-            df_descritores_mean.sort_values('Porcentagem', ascending=False)
-            .round(2).style
-            .background_gradient(cmap='Purples', subset=['Porcentagem'])
-            .format({'Porcentagem': '{:.1f}%'})
-            .set_properties(**{'text-align': 'center'})
-            .set_table_styles([{
-                'selector': 'th',
-                'props': [('background-color', '#3498db'),
-                          ('color', 'white'),
-                          ('text-align', 'center')]
-            }]),
+        renderizar_tabela_paginada(
+            df_descritores_mean.sort_values('Porcentagem', ascending=False).round(2),
+            chave='tabela_descritores',
+            faixas=[(['Porcentagem'], LIMITES_GRADIENTE, estilos_gradiente('Purples', LIMITES_GRADIENTE))],
+            formato={'Porcentagem': '{:.1f}%'},
+            propriedades={'text-align': 'center'},
             use_container_width=True,
             height=400
         )
     else:
         st.warning("Nenhum dado disponível para exibir a tabela de descritores")
 
+    # Reforço individual: listas montadas junto com as respostas em cache, aqui só lidas
+    st.markdown(f"## 🎯 Reforço Individual - {componente_selecionada}")
+    aluno_reforco = st.selectbox("Selecione um aluno:", df_analise_alunos['Nomes'].tolist(), key='aluno_reforco')
+    tabela_reforco = tabela_recomendacoes(
+        base_respostas['recomendacoes'][componente_selecionada], aluno_reforco, rotulo='Descritor'
+    )
+    if tabela_reforco.empty:
+        st.success(f"{aluno_reforco} acertou todos os descritores que respondeu em {componente_selecionada}.")
+    else:
+        st.caption("Descritores a retomar primeiro, considerando os erros do aluno em todos os simulados, "
+                   "a dificuldade da turma e os descritores que dependem de cada um.")
+        st.dataframe(tabela_reforco, hide_index=True, use_container_width=True)
+
+    simulados_componente = [s for c, s in base_respostas['itens_por_simulado'] if c == componente_selecionada]
+    renderizar_exportacao(
+        'exportacao_descritores',
+        {
+            salas_selecionadas: lambda: tabelas_descritores(base_respostas, componente_selecionada, [salas_selecionadas]),
+            'Todos os simulados': lambda: tabelas_descritores(base_respostas, componente_selecionada, simulados_componente),
+        },
+        nome=f"Descritores_{componente_selecionada}",
+        titulo=f"Descritores - {componente_selecionada}"
+    )
+
+    # Tendências de cada descritor em todos os simulados do componente
+    st.markdown(f"## 📈 Tendência dos Descritores - {componente_selecionada}")
+    renderizar_tendencias(base_respostas, componente_selecionada, chave='tendencias', particao=(escola, ano))
+
+    # Proficiência pela TRI, calibrada com todos os simulados do componente
+    st.markdown(f"## 🎯 Proficiência na Escala SAEB - {componente_selecionada}")
+    modelo_tri = st.radio("Modelo TRI", ["Rasch", "2PL"], horizontal=True, key='modelo_tri')
+    colunas_itens = colunas_descritores(df_completo)
+    tri = calibrar_componente(df_completo, colunas_itens, componente_selecionada, modelo_tri.lower(), particao=(escola, ano))
+    if not tri['convergiu']:
+        st.warning(f"A calibração não convergiu em {tri['iteracoes']} iterações; as estimativas são aproximadas.")
+
+    col_prof, col_itens = st.columns(2)
+    with col_prof:
+        st.markdown("#### Alunos")
+        renderizar_tabela_paginada(
+            tri['alunos'].sort_values('Proficiência (SAEB)', ascending=False),
+            chave='tabela_proficiencia',
+            formato={'Proficiência (SAEB)': '{:.1f}', 'Erro padrão': '{:.1f}'},
+            coluna_busca='Aluno',
+            hide_index=True,
+            use_container_width=True,
+            height=400
+        )
+    with col_itens:
+        st.markdown(f"#### Itens - {salas_selecionadas}")
+        itens_simulado = tri['itens'][tri['itens']['Simulado'] == salas_selecionadas]
+        renderizar_tabela_paginada(
+            itens_simulado.drop(columns='Simulado').sort_values('Dificuldade (SAEB)'),
+            chave='tabela_itens_tri',
+            formato={'Dificuldade (SAEB)': '{:.1f}', 'Discriminação': '{:.2f}'},
+            hide_index=True,
+            use_container_width=True,
+            height=400
+        )
+
+    exibir_payloads()
+    exibir_quarentena(quarentena)
+    exibir_diagnostico()
+
 except Exception as e:
     st.error(f"Ocorreu um erro ao processar os dados: {str(e)}")
\ No newline at end of file
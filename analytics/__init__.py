@@ -0,0 +1 @@
+"""Módulos compartilhados de processamento e visualização do HD Analytics."""
@@ -0,0 +1,221 @@
+"""
+Agregação da rede: estatísticas de várias escolas no estilo map-reduce.
+
+Cada partição (escola/ano/avaliação) gera, numa thread do pool, agregados
+parciais combináveis por chave (ex.: simulado): contagem, média, soma dos
+quadrados dos desvios (M2), mínimo, máximo e um histograma de largura fixa
+para a mediana. A página só combina os parciais, então incluir
+uma escola nova custa a leitura de um arquivo, e uma partição já resumida
+não é lida de novo enquanto o arquivo não mudar.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from analytics.armazenamento import escolas, particoes, RAIZ
+from analytics.instrumentacao import medir
+from analytics.persistencia import persistente
+from analytics.respostas import colunas_descritores
+
+TRABALHADORES_AGREGACAO = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+# Notas em porcentagem: 1000 faixas de 0,1 ponto dão a mediana com erro < 0,05
+LIMITES_HISTOGRAMA = (0.0, 100.0)
+FAIXAS_HISTOGRAMA = 1000
+
+ESTATISTICAS = ['Mínimo', 'Máximo', 'Média', 'Mediana', 'Desvio Padrão']
+
+
+def padronizar_externos(df):
+    """Planilha dos simulados externos com nomes padronizados e notas numéricas."""
+    df.columns = ['Aluno', 'SAEB ACERTA BRASIL', 'CAEd 1', 'CAEd 2']
+    for col in df.columns[1:]:
+        df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
+    return df
+
+
+def _valores_externos(caminho):
+    """Formato longo (chave, valor): uma linha por aluno e simulado externo."""
+    df = padronizar_externos(pd.read_csv(caminho, sep=','))
+    colunas = list(df.columns[1:])
+    valores = df[colunas].to_numpy(dtype=float, na_value=np.nan)
+    return np.repeat(np.array(colunas, dtype=object), len(df)), valores.T.ravel()
+
+
+def _valores_descritores(caminho):
+    """Porcentagem de acerto de cada aluno em cada simulado de descritores (chave 'Componente | Simulado')."""
+    df = pd.read_csv(caminho, sep=',')
+    respostas = df[colunas_descritores(df)].apply(pd.to_numeric, errors='coerce')
+    respondidas = respostas.notna().sum(axis=1)
+    valor = (100 * respostas.sum(axis=1) / respondidas.where(respondidas > 0)).to_numpy(dtype=float)
+    chave = (df['Componentes'].astype(str) + ' | ' + df['Simulados'].astype(str)).to_numpy(dtype=object)
+    return chave, valor
+
+
+LEITORES = {
+    'simulados_externos': _valores_externos,
+    'descritores': _valores_descritores,
+}
+
+
+def agregado_parcial(chaves, valores):
+    """
+    Agregados combináveis de cada chave, numa passada vetorizada.
+
+    Devolve {chave: {'n', 'media', 'm2', 'minimo', 'maximo', 'histograma'}};
+    valores ausentes são ignorados, como no pandas.
+    """
+    validos = ~np.isnan(valores)
+    chaves, valores = chaves[validos], valores[validos]
+    if not len(valores):
+        return {}
+    nomes, codigos = np.unique(chaves, return_inverse=True)
+    k = len(nomes)
+
+    n = np.bincount(codigos, minlength=k).astype(float)
+    media = np.bincount(codigos, weights=valores, minlength=k) / n
+    m2 = np.bincount(codigos, weights=(valores - media[codigos]) ** 2, minlength=k)
+    minimo = np.full(k, np.inf)
+    maximo = np.full(k, -np.inf)
+    np.minimum.at(minimo, codigos, valores)
+    np.maximum.at(maximo, codigos, valores)
+
+    inicio, fim = LIMITES_HISTOGRAMA
+    faixas = np.clip(((valores - inicio) / (fim - inicio) * FAIXAS_HISTOGRAMA).astype(int), 0, FAIXAS_HISTOGRAMA - 1)
+    histogramas = np.bincount(codigos * FAIXAS_HISTOGRAMA + faixas, minlength=k * FAIXAS_HISTOGRAMA)
+    histogramas = histogramas.reshape(k, FAIXAS_HISTOGRAMA)
+
+    return {
+        nome: {'n': n[i], 'media': media[i], 'm2': m2[i], 'minimo': minimo[i], 'maximo': maximo[i],
+               'histograma': histogramas[i]}
+        for i, nome in enumerate(nomes)
+    }
+
+
+def combinar(a, b):
+    """Combina dois agregados da mesma chave (fórmula de Chan para média e M2)."""
+    n = a['n'] + b['n']
+    delta = b['media'] - a['media']
+    return {
+        'n': n,
+        'media': a['media'] + delta * b['n'] / n,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * b['n'] / n,
+        'minimo': min(a['minimo'], b['minimo']),
+        'maximo': max(a['maximo'], b['maximo']),
+        'histograma': a['histograma'] + b['histograma'],
+    }
+
+
+def reduzir(parciais):
+    """Junta os agregados parciais de várias partições, chave a chave."""
+    total = {}
+    for parcial in parciais:
+        for chave, agregado in parcial.items():
+            total[chave] = combinar(total[chave], agregado) if chave in total else agregado
+    return total
+
+
+def centros_faixas(faixas):
+    """Centro das faixas do histograma (índices de 0 a FAIXAS_HISTOGRAMA - 1)."""
+    inicio, fim = LIMITES_HISTOGRAMA
+    return inicio + (np.asarray(faixas) + 0.5) * (fim - inicio) / FAIXAS_HISTOGRAMA
+
+
+def quantil(agregado, q):
+    """
+    Quantil pelo histograma, com a interpolação linear do pandas entre as duas
+    notas vizinhas; cada nota vale o centro da sua faixa, limitado ao mínimo e
+    ao máximo reais.
+    """
+    acumulado = np.cumsum(agregado['histograma'])
+    posicao = (int(agregado['n']) - 1) * q
+    abaixo = int(np.floor(posicao))
+    faixas = np.searchsorted(acumulado, [abaixo + 1, min(abaixo + 2, acumulado[-1])])
+    centros = centros_faixas(faixas)
+    valor = centros[0] + (posicao - abaixo) * (centros[1] - centros[0])
+    return float(np.clip(valor, agregado['minimo'], agregado['maximo']))
+
+
+def finalizar(total):
+    """Tabela no formato da seção 'Estatísticas Descritivas': estatísticas nas linhas, chaves nas colunas."""
+    tabela = pd.DataFrame({
+        chave: [
+            agregado['minimo'],
+            agregado['maximo'],
+            agregado['media'],
+            quantil(agregado, 0.5),
+            np.sqrt(agregado['m2'] / (agregado['n'] - 1)) if agregado['n'] > 1 else np.nan,
+        ]
+        for chave, agregado in total.items()
+    }, index=ESTATISTICAS)
+    return tabela.round(2)
+
+
+@persistente
+def mapear_particao(avaliacao, caminho):
+    """Executada no pool: lê uma partição e devolve seus agregados parciais."""
+    return agregado_parcial(*LEITORES[avaliacao](caminho))
+
+
+def _criar_pool():
+    """
+    Pool de threads: um meio-termo, não paralelismo completo. O parser do
+    read_csv e as contas do NumPy liberam o GIL, mas a conversão de colunas
+    de texto (to_numeric, apply) não, então o ganho entre escolas é parcial.
+
+    Processos não servem aqui: um fork dentro do servidor do Streamlit, que
+    tem várias threads, pode travar o filho, e com spawn/forkserver o filho
+    executa o __main__ do pai, que durante um rerun é o script da página.
+    Medido com 8 escolas sintéticas (carga gerar --fator 20): descritores
+    0,31 s em sequência, 0,26 s com threads.
+    """
+    return ThreadPoolExecutor(TRABALHADORES_AGREGACAO, thread_name_prefix='agregacao')
+
+
+@st.cache_resource
+def _servico():
+    """Pool e agregados parciais já calculados: caminho -> (versão do arquivo, parcial)."""
+    return {'pool': _criar_pool(), 'parciais': {}, 'trava': threading.Lock()}
+
+
+def _versao(caminho):
+    info = os.stat(caminho)
+    return info.st_mtime_ns, info.st_size
+
+
+def agregar_rede(avaliacao, ano, escolas_rede=None):
+    """
+    Estatísticas de `avaliacao` somando todas as escolas do ano (ou só `escolas_rede`).
+
+    Devolve a tabela final e, por escola, o agregado já reduzido, para que a
+    página compare a escola com a rede sem outra leitura.
+    """
+    servico = _servico()
+    tarefas = {}
+    por_escola = {}
+    with medir('agregacao_rede') as registro:
+        for escola in escolas_rede or escolas():
+            for particao in particoes(avaliacao, escola, ano):
+                caminho = os.path.join(RAIZ, particao['caminho'])
+                versao = _versao(caminho)
+                with servico['trava']:
+                    guardado = servico['parciais'].get(caminho)
+                if guardado is not None and guardado[0] == versao:
+                    por_escola.setdefault(escola, []).append(guardado[1])
+                else:
+                    tarefas[caminho] = (escola, versao, servico['pool'].submit(mapear_particao, avaliacao, caminho))
+
+        for caminho, (escola, versao, futuro) in tarefas.items():
+            parcial = futuro.result()
+            with servico['trava']:
+                servico['parciais'][caminho] = (versao, parcial)
+            por_escola.setdefault(escola, []).append(parcial)
+
+        por_escola = {escola: reduzir(parciais) for escola, parciais in por_escola.items()}
+        total = reduzir(por_escola.values())
+        registro['linhas'] = int(sum(a['n'] for a in total.values()))
+    return finalizar(total), por_escola
@@ -0,0 +1,173 @@
+"""
+Grupos homogêneos para recuperação: alunos que erram as mesmas habilidades.
+
+A matriz de habilidades do CAEd (0: não domina, 1: domina, 2: domina
+plenamente) é agrupada por k-modes com distância de Hamming, opcionalmente
+ponderada por habilidade. Tudo é vetorizado sobre a codificação one-hot da
+matriz: a distância de todos os alunos a todas as modas é um produto de
+matrizes, e as modas saem da contagem de níveis por grupo. A atribuição
+respeita um tamanho máximo de grupo.
+
+    grupos = agrupar_homogeneos(df, habilidades, max_por_grupo=5, pesos={'H03': 2})
+    resumo = habilidades_frageis(grupos, descricoes)
+"""
+import numpy as np
+import pandas as pd
+
+from analytics.instrumentacao import medir
+
+# Níveis da matriz; notas acima do último contam como o último (ex.: 3 no CAEd de português)
+NIVEIS = 3
+# Fração mínima de alunos do grupo sem domínio (nota 0) para a habilidade ser frágil no grupo
+LIMIAR_FRAGIL = 0.5
+MAX_ITERACOES = 20
+INICIALIZACOES = 4
+
+
+def codificar(df, habilidades):
+    """Matriz de níveis (alunos x habilidades) em inteiros 0..NIVEIS-1; ausentes contam como 0."""
+    valores = df[habilidades].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy()
+    return np.clip(valores, 0, NIVEIS - 1).astype(np.int8)
+
+
+def _one_hot(matriz):
+    """(n, h) -> (n, h * NIVEIS) com 1 no nível de cada habilidade."""
+    n, h = matriz.shape
+    codificada = np.zeros((n, h * NIVEIS), dtype=np.float32)
+    codificada[np.arange(n)[:, None], np.arange(h) * NIVEIS + matriz] = 1
+    return codificada
+
+
+def distancias(codificada, modas, pesos_colunas):
+    """Hamming ponderada de cada aluno a cada moda: peso total menos o peso das habilidades iguais."""
+    return pesos_colunas.sum() / NIVEIS - (codificada * pesos_colunas) @ _one_hot(modas).T
+
+
+def _atribuir(dist, capacidade):
+    """
+    Cada aluno no grupo mais próximo com vaga, em rodadas vetorizadas: todos
+    vão para o grupo mais próximo; os grupos que passaram da capacidade ficam
+    com os alunos mais próximos da moda, e os demais vão, na rodada seguinte,
+    para o grupo mais próximo entre os que ainda não estão cheios.
+    """
+    n, k = dist.shape
+    todos = np.arange(n)
+    rotulos = dist.argmin(axis=1)
+    while True:
+        contagem = np.bincount(rotulos, minlength=k)
+        if contagem.max() <= capacidade:
+            return rotulos
+        ordem = np.lexsort((dist[todos, rotulos], rotulos))
+        posicao_no_grupo = todos - np.searchsorted(rotulos[ordem], rotulos[ordem])
+        fora = ordem[posicao_no_grupo >= capacidade]
+        # Um grupo cheio continua cheio (só troca alunos por outros mais próximos) e sai das opções
+        cheios = np.minimum(contagem, capacidade) >= capacidade
+        rotulos[fora] = np.where(cheios, np.inf, dist[fora]).argmin(axis=1)
+
+
+def _modas(codificada, rotulos, k, h):
+    """Nível mais frequente de cada habilidade em cada grupo (empates: o menor nível)."""
+    pertence = np.zeros((len(rotulos), k), dtype=np.float32)
+    pertence[np.arange(len(rotulos)), rotulos] = 1
+    contagem = (pertence.T @ codificada).reshape(k, h, NIVEIS)
+    return contagem.argmax(axis=2).astype(np.int8)
+
+
+def _sementes(matriz, k, sorteio):
+    """Modas iniciais no estilo k-means++: alunos distantes dos já escolhidos têm mais chance."""
+    n = len(matriz)
+    escolhidos = [int(sorteio.integers(n))]
+    minimas = (matriz != matriz[escolhidos[0]]).sum(axis=1).astype(float)
+    for _ in range(1, k):
+        total = minimas.sum()
+        proximo = int(sorteio.choice(n, p=minimas / total)) if total > 0 else int(sorteio.integers(n))
+        escolhidos.append(proximo)
+        minimas = np.minimum(minimas, (matriz != matriz[proximo]).sum(axis=1))
+    return matriz[escolhidos].copy()
+
+
+def kmodes(matriz, k, capacidade, pesos=None, semente=0):
+    """
+    k-modes com grupos de no máximo `capacidade` alunos.
+
+    Devolve (rotulos, modas, custo); várias inicializações, fica a de menor
+    custo (soma das distâncias de cada aluno à moda do seu grupo).
+    """
+    n, h = matriz.shape
+    pesos = np.ones(h, dtype=np.float32) if pesos is None else np.asarray(pesos, dtype=np.float32)
+    pesos_colunas = np.repeat(pesos, NIVEIS)
+    codificada = _one_hot(matriz)
+    sorteio = np.random.default_rng(semente)
+
+    melhor = None
+    for _ in range(INICIALIZACOES):
+        modas = _sementes(matriz, k, sorteio)
+        rotulos = None
+        for _ in range(MAX_ITERACOES):
+            novos = _atribuir(distancias(codificada, modas, pesos_colunas), capacidade)
+            if rotulos is not None and np.array_equal(novos, rotulos):
+                break
+            rotulos = novos
+            modas = _modas(codificada, rotulos, k, h)
+        custo = float(distancias(codificada, modas, pesos_colunas)[np.arange(n), rotulos].sum())
+        if melhor is None or custo < melhor[2]:
+            melhor = (rotulos, modas, custo)
+    return melhor
+
+
+def agrupar_homogeneos(df, habilidades, max_por_grupo, pesos=None, semente=0):
+    """
+    Grupos homogêneos dos alunos de `df` nas `habilidades`.
+
+    `pesos` (habilidade -> peso, padrão 1) faz as habilidades foco pesarem
+    mais na semelhança. Devolve um dicionário com os rótulos (Series no
+    índice de `df`), a matriz de níveis e as modas de cada grupo.
+    """
+    with medir('agrupar_homogeneos', linhas=len(df)):
+        matriz = codificar(df, habilidades)
+        n = len(matriz)
+        k = max(1, -(-n // max_por_grupo))
+        vetor_pesos = None if pesos is None else [pesos.get(h, 1) for h in habilidades]
+        rotulos, modas, custo = kmodes(matriz, k, max_por_grupo, vetor_pesos, semente)
+        # Grupos que ficaram vazios saem; os demais são renumerados a partir de 0
+        usados, rotulos = np.unique(rotulos, return_inverse=True)
+        modas = modas[usados]
+    return {
+        'rotulos': pd.Series(rotulos, index=df.index, name='Grupo'),
+        'matriz': matriz,
+        'modas': modas,
+        'habilidades': list(habilidades),
+        'custo': custo,
+    }
+
+
+def habilidades_frageis(grupos, descricoes=None, limiar=LIMIAR_FRAGIL):
+    """
+    Habilidades sem domínio compartilhadas por grupo: as que ao menos
+    `limiar` dos integrantes não dominam, da mais para a menos comum.
+
+    Devolve um DataFrame (Grupo, Alunos, Habilidade, Sem domínio (%), Descrição).
+    """
+    descricoes = descricoes or {}
+    rotulos = grupos['rotulos'].to_numpy()
+    k = int(rotulos.max()) + 1 if len(rotulos) else 0
+    pertence = np.zeros((len(rotulos), k), dtype=np.float32)
+    pertence[np.arange(len(rotulos)), rotulos] = 1
+    tamanhos = pertence.sum(axis=0)
+    # Fração de alunos com nota 0, por grupo e habilidade, num produto só
+    sem_dominio = (pertence.T @ (grupos['matriz'] == 0).astype(np.float32)) / np.maximum(tamanhos, 1)[:, None]
+
+    linhas = []
+    for grupo in range(k):
+        for j in np.argsort(-sem_dominio[grupo], kind='stable'):
+            if sem_dominio[grupo, j] < limiar:
+                break
+            habilidade = grupos['habilidades'][j]
+            linhas.append({
+                'Grupo': grupo + 1,
+                'Alunos': int(tamanhos[grupo]),
+                'Habilidade': habilidade.strip(),
+                'Sem domínio (%)': round(100 * float(sem_dominio[grupo, j]), 1),
+                'Descrição': descricoes.get(habilidade.strip(), 'N/A'),
+            })
+    return pd.DataFrame(linhas, columns=['Grupo', 'Alunos', 'Habilidade', 'Sem domínio (%)', 'Descrição'])
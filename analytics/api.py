@@ -0,0 +1,356 @@
+"""
+API HTTP/JSON somente leitura sobre os agregados do HD Analytics.
+
+Uso isolado:        uvicorn analytics.api:app --port 8600
+Junto do Streamlit: HD_ANALYTICS_API_PORTA=8600 streamlit run main.py
+
+Rodando dentro do processo do Streamlit, a API compartilha os caches e a
+tabela de risco materializada das páginas. Cada rota calcula sua tabela uma
+vez por versão dos arquivos e depois só serve fatias dela.
+
+Os arquivos vêm do catálogo de partições; `escola` e `ano` na query string
+escolhem a partição (padrão: a primeira escola e o ano mais recente).
+"""
+import hashlib
+import json
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from analytics.armazenamento import escolas, anos, caminho_dados, fonte_dados
+from analytics.respostas import colunas_descritores, construir_respostas, selecionar_linhas, agregar_descritores, agregar_alunos
+from analytics.risco import atualizar_ranking, colunas_simulados
+from analytics.validacao import validar_notas
+
+# Porta da API iniciada junto do Streamlit (vazia: não inicia)
+VARIAVEL_PORTA = 'HD_ANALYTICS_API_PORTA'
+VARIAVEL_HOST = 'HD_ANALYTICS_API_HOST'
+
+AVALIACAO_MENSAIS = 'mensais'
+AVALIACAO_DESCRITORES = 'descritores'
+
+POR_PAGINA_PADRAO = 100
+POR_PAGINA_MAXIMO = 1000
+
+_trava_snapshots = threading.Lock()
+_snapshots = {}
+
+
+class ErroConsulta(Exception):
+    """Parâmetro de consulta inválido ou recurso inexistente."""
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _versao_arquivo(caminho):
+    """Versão barata do arquivo de origem: tamanho e data de modificação."""
+    info = os.stat(caminho)
+    return f"{info.st_mtime_ns:x}-{info.st_size:x}", info.st_mtime
+
+
+def _carregar_mensais(caminho, fonte):
+    """Mesma carga da página de simulados mensais (validação e notas vazias como zero)."""
+    df = pd.read_csv(caminho, sep=',')
+    colunas_notas = [col for col in df.columns if col.startswith('Sim')]
+    df, _ = validar_notas(df, colunas_notas, None, fonte, chaves=['Aluno', 'Turma', 'Componente'])
+    for col in colunas_notas:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['Turma'] = df['Turma'].astype(str)
+    return df
+
+
+def _carregar_descritores(caminho, fonte):
+    """Mesma carga das páginas de descritores."""
+    df = pd.read_csv(caminho, sep=',')
+    df, _ = validar_notas(df, colunas_descritores(df), 1, fonte, chaves=['Aluno', 'Componentes', 'Simulados'])
+    return df
+
+
+CARREGADORES = {
+    AVALIACAO_MENSAIS: _carregar_mensais,
+    AVALIACAO_DESCRITORES: _carregar_descritores,
+}
+
+
+def _snapshot(avaliacao, particao):
+    """
+    Dados validados da partição e as tabelas já derivadas deles.
+
+    O snapshot só é refeito quando o arquivo muda; as tabelas de cada rota
+    são calculadas uma vez por snapshot e servidas em fatias depois disso.
+    """
+    caminho = caminho_dados(avaliacao, *particao)
+    versao, _ = _versao_arquivo(caminho)
+    chave = (avaliacao, *particao)
+    with _trava_snapshots:
+        atual = _snapshots.get(chave)
+        if atual is None or atual['versao'] != versao:
+            df = CARREGADORES[avaliacao](caminho, fonte_dados(avaliacao, *particao))
+            atual = {'versao': versao, 'df': df, 'tabelas': {}, 'trava': threading.Lock()}
+            _snapshots[chave] = atual
+    return atual
+
+
+def _tabela(avaliacao, particao, nome, construir):
+    """Tabela derivada do snapshot, construída na primeira consulta."""
+    snapshot = _snapshot(avaliacao, particao)
+    with snapshot['trava']:
+        if nome not in snapshot['tabelas']:
+            snapshot['tabelas'][nome] = construir(snapshot['df'])
+    return snapshot['tabelas'][nome]
+
+
+def _medias_turmas(df):
+    """Média, desvio e alunos de cada turma em cada simulado mensal (formato longo)."""
+    colunas = colunas_simulados(df)
+    grupos = df.groupby(['Componente', 'Turma'])[colunas]
+    tabela = pd.concat({
+        'media': grupos.mean(),
+        'desvio': grupos.std(),
+        'alunos': grupos.count(),
+    }, axis=1).stack(level=1, future_stack=True).rename_axis(['componente', 'turma', 'simulado']).reset_index()
+    tabela['media'] = tabela['media'].round(2)
+    tabela['desvio'] = tabela['desvio'].round(2)
+    tabela['ordem'] = tabela['simulado'].str[3:].astype(int)
+    return tabela.sort_values(['componente', 'turma', 'ordem'], kind='stable').drop(columns='ordem').reset_index(drop=True)
+
+
+def _dominio_descritores(df):
+    """Percentual de acerto de cada descritor em cada simulado e componente."""
+    base = construir_respostas(df)
+    partes = []
+    for (componente, simulado), itens in base['itens_por_simulado'].items():
+        linhas = selecionar_linhas(base, simulado, componente)
+        tabela = agregar_descritores(base, linhas, itens)
+        tabela.insert(0, 'simulado', simulado)
+        tabela.insert(0, 'componente', componente)
+        partes.append(tabela)
+    tabela = pd.concat(partes, ignore_index=True).rename(columns={
+        'Descritor': 'descritor', 'Acertos': 'acertos', 'Respondidas': 'respondidas', 'Porcentagem': 'percentual',
+    })
+    tabela['percentual'] = tabela['percentual'].round(1)
+    return tabela
+
+
+def _ranking_risco(df, particao):
+    """Ranking de risco com os nomes de coluna da API."""
+    ranking = atualizar_ranking(df, particao=particao)
+    tabela = ranking.rename(columns=lambda c: c.lower().replace(' ', '_'))
+    tabela = tabela.rename(columns={'tendência': 'tendencia', 'distância_da_meta': 'distancia_meta',
+                                    'maior_sequência_de_zeros': 'maior_sequencia_zeros',
+                                    'média_recente': 'media_recente', 'última_nota': 'ultima_nota',
+                                    'nível': 'nivel'})
+    tabela['nivel'] = tabela['nivel'].astype(str)
+    return tabela.round(2)
+
+
+def _historico_mensal(df):
+    """Notas de cada aluno em cada simulado mensal (formato longo)."""
+    colunas = colunas_simulados(df)
+    tabela = df.melt(id_vars=['Aluno', 'Turma', 'Componente'], value_vars=colunas, var_name='simulado', value_name='nota')
+    return tabela.rename(columns={'Aluno': 'aluno', 'Turma': 'turma', 'Componente': 'componente'})
+
+
+def _historico_descritores(df):
+    """Acertos e percentual de cada aluno em cada simulado de descritores."""
+    base = construir_respostas(df)
+    partes = []
+    for (componente, simulado), itens in base['itens_por_simulado'].items():
+        linhas = selecionar_linhas(base, simulado, componente)
+        tabela = agregar_alunos(base, linhas, len(itens))
+        tabela.insert(1, 'simulado', simulado)
+        tabela.insert(1, 'componente', componente)
+        partes.append(tabela)
+    tabela = pd.concat(partes, ignore_index=True).rename(columns={
+        'Nomes': 'aluno', 'Acertos': 'acertos', 'Respondidas': 'respondidas', 'Porcentagem': 'percentual',
+    })
+    tabela['percentual'] = tabela['percentual'].round(1)
+    return tabela
+
+
+def _inteiro(params, nome, padrao, minimo, maximo):
+    """Lê um parâmetro inteiro da query string dentro dos limites."""
+    valor = params.get(nome)
+    if valor is None:
+        return padrao
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErroConsulta(f"'{nome}' deve ser um número inteiro")
+    if not minimo <= valor <= maximo:
+        raise ErroConsulta(f"'{nome}' deve estar entre {minimo} e {maximo}")
+    return valor
+
+
+def _particao(params):
+    """Escola e ano da consulta; sem eles, a primeira escola e o ano mais recente."""
+    opcoes = escolas()
+    escola = params.get('escola', next(iter(opcoes), None))
+    if escola not in opcoes:
+        raise ErroConsulta(f"Escola '{escola}' não encontrada", status=404)
+    anos_escola = anos(escola)
+    ano = _inteiro(params, 'ano', anos_escola[0], 1900, 9999)
+    if ano not in anos_escola:
+        raise ErroConsulta(f"Sem dados de {escola} em {ano}", status=404)
+    return escola, ano
+
+
+def _filtrar(tabela, params, filtros):
+    """Aplica os filtros de igualdade presentes na query string (parâmetro -> coluna)."""
+    mascara = pd.Series(True, index=tabela.index)
+    for parametro, coluna in filtros.items():
+        if parametro in params:
+            mascara &= tabela[coluna].astype(str) == params[parametro]
+    return tabela if mascara.all() else tabela[mascara]
+
+
+def _etag(request, versoes):
+    """ETag forte: versão dos arquivos de origem mais o caminho e a query da requisição."""
+    consulta = '&'.join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    resumo = hashlib.sha1('|'.join([*versoes, request.url.path, consulta]).encode('utf-8'))
+    return f'"{resumo.hexdigest()[:20]}"'
+
+
+def _nao_modificado(request, etag, modificado_em):
+    """Avalia If-None-Match (prioritário) e If-Modified-Since."""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        candidatos = [c.strip().removeprefix('W/') for c in if_none_match.split(',')]
+        return '*' in candidatos or etag in candidatos
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(modificado_em) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _pagina_json(request, tabela):
+    """Fatia a tabela e monta o JSON sem passar pelos objetos Python linha a linha."""
+    params = request.query_params
+    por_pagina = _inteiro(params, 'por_pagina', POR_PAGINA_PADRAO, 1, POR_PAGINA_MAXIMO)
+    total = len(tabela)
+    paginas = max(-(-total // por_pagina), 1)
+    pagina = _inteiro(params, 'pagina', 1, 1, paginas)
+
+    inicio = (pagina - 1) * por_pagina
+    dados = tabela.iloc[inicio:inicio + por_pagina].to_json(orient='records', force_ascii=False)
+    proxima = str(request.url.include_query_params(pagina=pagina + 1)) if pagina < paginas else None
+    cabecalho = json.dumps({'pagina': pagina, 'por_pagina': por_pagina, 'total': total,
+                            'paginas': paginas, 'proxima': proxima}, ensure_ascii=False, separators=(',', ':'))
+    return f'{cabecalho[:-1]},"dados":{dados}}}'
+
+
+def _rota(avaliacoes, consulta):
+    """
+    Envolve uma consulta com o GET condicional.
+
+    A ETag depende só da versão dos arquivos e da URL, então um cliente que
+    consulta de novo sem mudança nos dados recebe 304 sem nenhum cálculo.
+    """
+    def endpoint(request):
+        try:
+            particao = _particao(request.query_params)
+        except ErroConsulta as e:
+            return JSONResponse({'erro': str(e)}, status_code=e.status)
+        try:
+            versoes, datas = zip(*(_versao_arquivo(caminho_dados(a, *particao)) for a in avaliacoes))
+        except FileNotFoundError as e:
+            return JSONResponse({'erro': f"Arquivo de dados não encontrado: {e.filename or e}"}, status_code=503)
+
+        etag = _etag(request, versoes)
+        cabecalhos = {
+            'ETag': etag,
+            'Last-Modified': formatdate(max(datas), usegmt=True),
+            'Cache-Control': 'no-cache',
+        }
+        if _nao_modificado(request, etag, max(datas)):
+            return Response(status_code=304, headers=cabecalhos)
+
+        try:
+            corpo = _pagina_json(request, consulta(request, particao))
+        except ErroConsulta as e:
+            return JSONResponse({'erro': str(e)}, status_code=e.status)
+        return Response(corpo, media_type='application/json', headers=cabecalhos)
+
+    return endpoint
+
+
+def medias_turmas(request, particao):
+    """Médias das turmas por simulado mensal. Filtros: componente, turma, simulado."""
+    tabela = _tabela(AVALIACAO_MENSAIS, particao, 'medias_turmas', _medias_turmas)
+    return _filtrar(tabela, request.query_params, {'componente': 'componente', 'turma': 'turma', 'simulado': 'simulado'})
+
+
+def dominio_descritores(request, particao):
+    """Domínio de cada descritor por simulado. Filtros: componente, simulado, descritor."""
+    tabela = _tabela(AVALIACAO_DESCRITORES, particao, 'dominio_descritores', _dominio_descritores)
+    return _filtrar(tabela, request.query_params, {'componente': 'componente', 'simulado': 'simulado', 'descritor': 'descritor'})
+
+
+def alunos_risco(request, particao):
+    """Ranking de risco da escola. Filtros: componente, turma, nivel."""
+    tabela = _tabela(AVALIACAO_MENSAIS, particao, 'risco', lambda df: _ranking_risco(df, particao))
+    return _filtrar(tabela, request.query_params, {'componente': 'componente', 'turma': 'turma', 'nivel': 'nivel'})
+
+
+def historico_aluno(request, particao):
+    """Notas mensais e desempenho nos simulados de descritores de um aluno. Filtro: componente."""
+    aluno = request.path_params['aluno']
+    mensal = _tabela(AVALIACAO_MENSAIS, particao, 'historico_mensal', _historico_mensal)
+    descritores = _tabela(AVALIACAO_DESCRITORES, particao, 'historico_descritores', _historico_descritores)
+
+    mensal = mensal[mensal['aluno'] == aluno].assign(origem='mensal')
+    descritores = descritores[descritores['aluno'] == aluno].assign(origem='descritores')
+    if mensal.empty and descritores.empty:
+        raise ErroConsulta(f"Aluno '{aluno}' não encontrado", status=404)
+    tabela = pd.concat([mensal, descritores], ignore_index=True)
+    return _filtrar(tabela, request.query_params, {'componente': 'componente'})
+
+
+def saude(request):
+    """Versão atual de cada arquivo de origem, por escola e ano."""
+    versoes = {}
+    for escola in escolas():
+        for ano in anos(escola):
+            for avaliacao in CARREGADORES:
+                try:
+                    versao = _versao_arquivo(caminho_dados(avaliacao, escola, ano))[0]
+                except FileNotFoundError:
+                    versao = None
+                versoes[f"{escola}/{ano}/{avaliacao}"] = versao
+    return JSONResponse({'status': 'ok', 'versoes': versoes})
+
+
+app = Starlette(routes=[
+    Route('/saude', saude),
+    Route('/turmas/medias', _rota([AVALIACAO_MENSAIS], medias_turmas)),
+    Route('/descritores/dominio', _rota([AVALIACAO_DESCRITORES], dominio_descritores)),
+    Route('/risco', _rota([AVALIACAO_MENSAIS], alunos_risco)),
+    Route('/alunos/{aluno}/historico', _rota([AVALIACAO_MENSAIS, AVALIACAO_DESCRITORES], historico_aluno)),
+])
+
+
+def iniciar_em_segundo_plano():
+    """
+    Sobe a API numa thread do processo do Streamlit, se a porta estiver configurada.
+
+    Deve ser chamada de dentro de um st.cache_resource para subir uma vez só.
+    """
+    porta = os.environ.get(VARIAVEL_PORTA, '').strip()
+    if not porta:
+        return None
+    import uvicorn
+
+    config = uvicorn.Config(app, host=os.environ.get(VARIAVEL_HOST, '127.0.0.1'), port=int(porta), log_level='warning')
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, name='hd-analytics-api', daemon=True).start()
+    return servidor
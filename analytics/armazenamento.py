@@ -0,0 +1,178 @@
+"""
+Armazenamento particionado por escola, ano e avaliação.
+
+Os arquivos novos seguem o layout
+
+    dados/escola=<escola>/ano=<ano>/avaliacao=<avaliacao>[/turma=<turma>]/<arquivo>.csv
+
+e o catálogo (dados/catalogo.json) lista as partições existentes (o
+atributo opcional `aluno` indica a coluna com o nome do aluno). As páginas
+consultam só o catálogo: abrir uma escola lê apenas os arquivos dela, e nada
+percorre a árvore de dados na inicialização. Para incluir arquivos novos:
+
+    python -m analytics.armazenamento catalogar
+
+Com HD_ANALYTICS_DADOS=<pasta> o catálogo é lido de <pasta>/catalogo.json
+(usado pelo teste de carga com dados sintéticos); caminhos absolutos no
+catálogo são aceitos.
+"""
+import json
+import os
+import sys
+
+import streamlit as st
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_DADOS = os.environ.get('HD_ANALYTICS_DADOS', '').strip() or os.path.join(RAIZ, 'dados')
+ARQUIVO_CATALOGO = os.path.join(PASTA_DADOS, 'catalogo.json')
+
+# Níveis obrigatórios de toda partição, nessa ordem no layout
+NIVEIS = ['escola', 'ano', 'avaliacao']
+EXTENSOES = ('.csv',)
+
+
+@st.cache_data
+def _ler_catalogo(caminho, versao):
+    """Lê o catálogo; `versao` (mtime) entra só na chave do cache."""
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def carregar_catalogo(caminho=ARQUIVO_CATALOGO):
+    """Catálogo atual; é relido apenas quando o arquivo muda."""
+    try:
+        versao = os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        return {'escolas': {}, 'particoes': []}
+    return _ler_catalogo(caminho, versao)
+
+
+def escolas():
+    """Identificador e nome de cada escola catalogada."""
+    catalogo = carregar_catalogo()
+    identificadores = sorted({p['escola'] for p in catalogo['particoes']})
+    return {e: catalogo['escolas'].get(e, {}).get('nome', e) for e in identificadores}
+
+
+def nome_escola(escola):
+    """Nome de exibição da escola."""
+    return escolas().get(escola, escola)
+
+
+def anos(escola):
+    """Anos com dados da escola, do mais recente ao mais antigo."""
+    return sorted({p['ano'] for p in carregar_catalogo()['particoes'] if p['escola'] == escola}, reverse=True)
+
+
+def particoes(avaliacao, escola, ano, **filtros):
+    """
+    Partições que atendem aos filtros, sem abrir nenhum arquivo de dados.
+
+    Filtros extras (ex.: turma='9º Ano A') comparam atributos da partição.
+    """
+    criterios = {'avaliacao': avaliacao, 'escola': escola, 'ano': ano, **filtros}
+    return [p for p in carregar_catalogo()['particoes']
+            if all(p.get(chave) == valor for chave, valor in criterios.items())]
+
+
+def caminho_dados(avaliacao, escola, ano, **filtros):
+    """Caminho absoluto da única partição que atende aos filtros."""
+    encontradas = particoes(avaliacao, escola, ano, **filtros)
+    if not encontradas:
+        descricao = ', '.join(f"{k}={v}" for k, v in filtros.items())
+        raise FileNotFoundError(f"Sem dados de '{avaliacao}' para {escola}/{ano}" + (f" ({descricao})" if descricao else ''))
+    return os.path.join(RAIZ, encontradas[0]['caminho'])
+
+
+def fonte_dados(avaliacao, escola, ano, **filtros):
+    """Nome curto da partição, usado nos relatórios de quarentena."""
+    partes = [escola, str(ano), avaliacao] + [str(v) for v in filtros.values()]
+    return '_'.join(partes).replace(' ', '_').replace('/', '-')
+
+
+def selecionar_particao():
+    """
+    Escolha da escola e do ano na barra lateral, mantida entre as páginas.
+
+    Com uma só escola (ou um só ano) o seletor não aparece.
+    """
+    opcoes = escolas()
+    if not opcoes:
+        st.error(f"Nenhuma partição de dados catalogada em {ARQUIVO_CATALOGO}.")
+        st.stop()
+
+    escola = st.session_state.get('particao_escola')
+    if escola not in opcoes:
+        escola = next(iter(opcoes))
+    if len(opcoes) > 1:
+        lista = list(opcoes)
+        escola = st.sidebar.selectbox("Escola:", lista, index=lista.index(escola), format_func=opcoes.get)
+
+    anos_escola = anos(escola)
+    ano = st.session_state.get('particao_ano')
+    if ano not in anos_escola:
+        ano = anos_escola[0]
+    if len(anos_escola) > 1:
+        ano = st.sidebar.selectbox("Ano:", anos_escola, index=anos_escola.index(ano))
+
+    st.session_state['particao_escola'] = escola
+    st.session_state['particao_ano'] = ano
+    return escola, ano
+
+
+def _atributos(relativo):
+    """Atributos chave=valor dos diretórios de um caminho no layout particionado."""
+    atributos = {}
+    for parte in relativo.split(os.sep)[:-1]:
+        chave, separador, valor = parte.partition('=')
+        if separador:
+            atributos[chave] = int(valor) if chave == 'ano' and valor.isdigit() else valor
+    return atributos
+
+
+def _relativo(caminho):
+    """Caminho relativo à raiz do projeto, sempre com '/' (o catálogo vale em qualquer sistema)."""
+    return os.path.relpath(caminho, RAIZ).replace(os.sep, '/')
+
+
+def catalogar(pasta=PASTA_DADOS, caminho=ARQUIVO_CATALOGO):
+    """
+    Percorre o layout particionado e regrava o catálogo.
+
+    Partições registradas à mão fora de `pasta` (ex.: arquivos antigos em
+    pages/) são mantidas enquanto o arquivo existir.
+    """
+    catalogo = carregar_catalogo(caminho)
+    pasta_relativa = _relativo(pasta)
+    mantidas = [p for p in catalogo['particoes']
+                if not p['caminho'].startswith(pasta_relativa + '/') and os.path.exists(os.path.join(RAIZ, p['caminho']))]
+
+    encontradas = []
+    for diretorio, _, arquivos in os.walk(pasta):
+        for nome in sorted(arquivos):
+            if not nome.lower().endswith(EXTENSOES):
+                continue
+            absoluto = os.path.join(diretorio, nome)
+            atributos = _atributos(os.path.relpath(absoluto, pasta))
+            if all(nivel in atributos for nivel in NIVEIS):
+                encontradas.append({**atributos, 'caminho': _relativo(absoluto)})
+
+    particoes_novas = sorted(mantidas + encontradas, key=lambda p: (p['escola'], p['ano'], p['avaliacao'], p['caminho']))
+    nomes = dict(catalogo['escolas'])
+    for particao in particoes_novas:
+        nomes.setdefault(particao['escola'], {'nome': particao['escola']})
+
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({'escolas': nomes, 'particoes': particoes_novas}, arquivo, ensure_ascii=False, indent=2)
+        arquivo.write('\n')
+    os.replace(temporario, caminho)
+    return len(encontradas), len(mantidas)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['catalogar']:
+        sys.exit("uso: python -m analytics.armazenamento catalogar")
+    novas, mantidas = catalogar()
+    print(f"{novas} partição(ões) no layout particionado, {mantidas} registrada(s) fora dele.")
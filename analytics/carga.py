@@ -0,0 +1,323 @@
+"""
+Teste de carga das páginas: várias sessões simultâneas, sem navegador.
+
+Cada página roda num subprocesso próprio (início frio e pico de memória
+isolados), com N sessões do AppTest do Streamlit em threads. Depois da
+primeira execução, as sessões mudam widgets ao acaso (selectbox, radio,
+multiselect, checkbox) e medem o tempo de cada rerun. Os dados são
+sintéticos: os arquivos do catálogo replicados F vezes (com os alunos
+renomeados) para K escolas, num catálogo próprio (HD_ANALYTICS_DADOS).
+
+    python -m analytics.carga executar --sessoes 8 --rodadas 20 --fator 10 --escolas 3
+    python -m analytics.carga executar --paginas pages/3_Simulados_mensais.py --saida logs/carga.json
+    python -m analytics.carga gerar /tmp/dados_sinteticos --fator 50
+
+O relatório (JSON) traz, por página, p50/p95/p99 dos reruns, vazão e pico
+de memória (RSS).
+"""
+import argparse
+import codecs
+import glob
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from analytics.armazenamento import ARQUIVO_CATALOGO, RAIZ
+
+ARQUIVO_RELATORIO_PADRAO = os.path.join('logs', 'carga.json')
+# Tempo máximo (s) de um rerun antes de contar como erro
+TEMPO_LIMITE_PADRAO = 120
+# Mensagens de erro guardadas por página no relatório
+MAXIMO_MENSAGENS = 5
+
+
+def paginas_padrao():
+    """Página inicial e todas as páginas de pages/, relativas à raiz."""
+    return ['main.py'] + sorted(os.path.relpath(p, RAIZ) for p in glob.glob(os.path.join(RAIZ, 'pages', '*.py')))
+
+
+def _replicar(origem, destino, fator, coluna_aluno=None):
+    """
+    Copia o CSV repetindo os alunos `fator` vezes; nas cópias a coluna do
+    aluno (`coluna_aluno`, declarada no catálogo; sem ela, a primeira) ganha
+    um sufixo, para os alunos seguirem únicos. Lido e gravado pelo pandas como
+    texto, então campos entre aspas (mesmo com quebra de linha), o separador e
+    a codificação são mantidos.
+    """
+    with open(origem, 'rb') as arquivo:
+        inicio = arquivo.read(65536)
+    codificacao = 'utf-8-sig' if inicio.startswith(codecs.BOM_UTF8) else 'utf-8'
+    try:
+        inicio.decode(codificacao)
+    except UnicodeDecodeError as erro:
+        # Arquivos exportados do Excel em Latin-1; um corte no meio de um caractere UTF-8 não conta
+        if erro.start < len(inicio) - 4:
+            codificacao = 'latin-1'
+    cabecalho = inicio.split(b'\n', 1)[0]
+    separador = ';' if cabecalho.count(b';') > cabecalho.count(b',') else ','
+    df = pd.read_csv(origem, sep=separador, dtype=str, keep_default_na=False, encoding=codificacao)
+    coluna = coluna_aluno if coluna_aluno is not None else df.columns[0]
+
+    copias = [df]
+    for copia in range(1, fator):
+        replica = df.copy()
+        replica[coluna] = replica[coluna] + f" {copia}"
+        copias.append(replica)
+    pd.concat(copias, ignore_index=True).to_csv(destino, sep=separador, index=False, encoding=codificacao)
+
+
+def gerar_dados(destino, fator=1, escolas=1, catalogo=ARQUIVO_CATALOGO):
+    """
+    Gera os dados sintéticos e o catálogo em `destino`: cada partição do
+    catálogo atual, com `fator` vezes mais alunos, para cada uma das
+    `escolas`. Devolve o caminho do catálogo gerado.
+    """
+    with open(catalogo, encoding='utf-8') as arquivo:
+        original = json.load(arquivo)
+
+    nomes, particoes = {}, []
+    for numero in range(1, escolas + 1):
+        escola = f"sintetica-{numero}"
+        nomes[escola] = {'nome': f"Escola Sintética {numero}"}
+        pasta = os.path.join(destino, escola)
+        os.makedirs(pasta, exist_ok=True)
+        for particao in original['particoes']:
+            origem = os.path.join(RAIZ, particao['caminho'])
+            if not os.path.exists(origem):
+                continue
+            caminho = os.path.join(pasta, os.path.basename(origem))
+            if numero == 1:
+                _replicar(origem, caminho, fator, particao.get('aluno'))
+            else:
+                # Arquivos distintos por escola: o cache não confunde uma escola com a outra
+                shutil.copyfile(os.path.join(destino, 'sintetica-1', os.path.basename(origem)), caminho)
+            particoes.append({**particao, 'escola': escola, 'caminho': caminho})
+
+    caminho_catalogo = os.path.join(destino, 'catalogo.json')
+    with open(caminho_catalogo, 'w', encoding='utf-8') as arquivo:
+        json.dump({'escolas': nomes, 'particoes': particoes}, arquivo, ensure_ascii=False, indent=2)
+    return caminho_catalogo
+
+
+def _rotulos_proprios(widget):
+    """
+    Se as opções aparecem como os próprios valores. Com format_func (ex.: o
+    seletor de escola) o AppTest só aceita o valor original, que não aparece
+    na árvore de elementos.
+    """
+    try:
+        return all(str(widget.format_func(opcao)) == opcao for opcao in widget.options[:2])
+    except Exception:
+        return False
+
+
+def _mudar_widget(at, sorteio, escolas=()):
+    """Muda um widget ao acaso, como um usuário faria; devolve o rótulo (ou None sem widgets)."""
+    candidatos = [w for w in list(at.selectbox) + list(at.radio) if len(w.options) > 1 and _rotulos_proprios(w)]
+    candidatos += [w for w in at.multiselect if w.options and _rotulos_proprios(w)]
+    candidatos += list(at.checkbox)
+    # A escola vai pelo estado da sessão, que o seletor da barra lateral usa como padrão
+    if len(escolas) > 1 and 'particao_escola' in at.session_state:
+        candidatos.append('escola')
+    if not candidatos:
+        return None
+    widget = sorteio.choice(candidatos)
+    if widget == 'escola':
+        at.session_state['particao_escola'] = sorteio.choice(escolas)
+        return 'Escola'
+    if widget.type == 'selectbox':
+        widget.select_index(sorteio.randrange(len(widget.options)))
+    elif widget.type == 'radio':
+        widget.set_value(sorteio.choice(widget.options))
+    elif widget.type == 'multiselect':
+        widget.set_value(sorteio.sample(widget.options, sorteio.randint(1, len(widget.options))))
+    else:
+        widget.set_value(not widget.value)
+    return widget.label
+
+
+def _percentil(tempos, q):
+    return round(float(pd.Series(tempos).quantile(q)), 1) if tempos else None
+
+
+def _rss_pico_mb():
+    """Pico de memória residente do processo, em MB (None fora do Unix)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB no Linux, bytes no macOS
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def executar_pagina(pagina, sessoes, rodadas, semente=0, tempo_limite=TEMPO_LIMITE_PADRAO):
+    """
+    Roda a página neste processo com `sessoes` sessões simultâneas de
+    `rodadas` mudanças de widget cada uma. A primeira execução de uma sessão
+    sozinha mede o início frio; as demais começam juntas.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    with open(ARQUIVO_CATALOGO, encoding='utf-8') as arquivo:
+        escolas = sorted({p['escola'] for p in json.load(arquivo)['particoes']})
+    caminho = os.path.join(RAIZ, pagina)
+    tempos, erros, trava = [], [], threading.Lock()
+
+    def rodar(at):
+        inicio = time.perf_counter()
+        try:
+            at.run()
+            falhas = [excecao.value for excecao in at.exception]
+        except Exception as e:  # tempo limite ou falha do próprio AppTest
+            falhas = [f"{type(e).__name__}: {e}"]
+        duracao = (time.perf_counter() - inicio) * 1000
+        if falhas:
+            with trava:
+                erros.extend(falhas)
+        return duracao
+
+    apps = [AppTest.from_file(caminho, default_timeout=tempo_limite) for _ in range(sessoes)]
+    inicio_frio = rodar(apps[0])
+    largada = threading.Barrier(sessoes + 1)
+
+    def sessao(numero):
+        sorteio = random.Random(semente * 1000 + numero)
+        at = apps[numero]
+        try:
+            if numero:
+                rodar(at)
+        finally:
+            largada.wait()
+        for _ in range(rodadas):
+            try:
+                _mudar_widget(at, sorteio, escolas)
+            except Exception as e:
+                with trava:
+                    erros.append(f"{type(e).__name__}: {e}")
+            duracao = rodar(at)
+            with trava:
+                tempos.append(duracao)
+
+    threads = [threading.Thread(target=sessao, args=(numero,), daemon=True) for numero in range(sessoes)]
+    for thread in threads:
+        thread.start()
+    largada.wait()
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duracao_total = time.perf_counter() - inicio
+
+    return {
+        'pagina': pagina,
+        'sessoes': sessoes,
+        'reruns': len(tempos),
+        'erros': len(erros),
+        'inicio_frio_ms': round(inicio_frio, 1),
+        'p50_ms': _percentil(tempos, 0.50),
+        'p95_ms': _percentil(tempos, 0.95),
+        'p99_ms': _percentil(tempos, 0.99),
+        'vazao_reruns_s': round(len(tempos) / duracao_total, 2) if duracao_total > 0 else None,
+        'rss_pico_mb': _rss_pico_mb(),
+        'mensagens': [str(m)[:300] for m in dict.fromkeys(erros)][:MAXIMO_MENSAGENS],
+    }
+
+
+def executar(paginas, sessoes, rodadas, fator, escolas, dados=None, semente=0, tempo_limite=TEMPO_LIMITE_PADRAO):
+    """
+    Gera os dados sintéticos (ou usa a pasta `dados` já gerada) e roda cada
+    página num subprocesso, com cache em disco próprio e vazio.
+    """
+    informada = dados
+    temporaria = tempfile.mkdtemp(prefix='hd_carga_')
+    try:
+        if dados is None:
+            dados = os.path.join(temporaria, 'dados')
+            gerar_dados(dados, fator, escolas)
+        resultados = []
+        for numero, pagina in enumerate(paginas):
+            ambiente = {
+                **os.environ,
+                'HD_ANALYTICS_DADOS': os.path.abspath(dados),
+                'HD_ANALYTICS_CACHE': os.path.join(temporaria, f"cache_{numero}"),
+                'PYTHONPATH': os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])),
+            }
+            comando = [sys.executable, '-m', 'analytics.carga', 'pagina', pagina,
+                       '--sessoes', str(sessoes), '--rodadas', str(rodadas),
+                       '--semente', str(semente + numero), '--tempo-limite', str(tempo_limite)]
+            processo = subprocess.run(comando, cwd=RAIZ, env=ambiente, capture_output=True, text=True)
+            linhas = processo.stdout.strip().splitlines()
+            if processo.returncode or not linhas:
+                resultados.append({'pagina': pagina, 'sessoes': sessoes, 'erros': 1,
+                                   'mensagens': processo.stderr.strip().splitlines()[-MAXIMO_MENSAGENS:]})
+            else:
+                resultados.append(json.loads(linhas[-1]))
+            print(f"{pagina}: {resultados[-1].get('reruns', 0)} reruns, {resultados[-1]['erros']} erro(s)", file=sys.stderr)
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+    return {
+        'parametros': {'sessoes': sessoes, 'rodadas': rodadas, 'fator': fator, 'escolas': escolas,
+                       'semente': semente, 'dados': informada},
+        'paginas': resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga das páginas do HD Analytics.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    geracao = subcomandos.add_parser('gerar', help="gera dados sintéticos e o catálogo")
+    geracao.add_argument('destino')
+    geracao.add_argument('--fator', type=int, default=1, help="vezes mais alunos por arquivo")
+    geracao.add_argument('--escolas', type=int, default=1)
+
+    execucao = subcomandos.add_parser('executar', help="roda as páginas e grava o relatório")
+    execucao.add_argument('--paginas', nargs='+', default=None, help="padrão: main.py e pages/*.py")
+    execucao.add_argument('--sessoes', type=int, default=4, help="sessões simultâneas por página")
+    execucao.add_argument('--rodadas', type=int, default=10, help="mudanças de widget por sessão")
+    execucao.add_argument('--fator', type=int, default=1)
+    execucao.add_argument('--escolas', type=int, default=1)
+    execucao.add_argument('--dados', default=None, help="pasta já gerada com 'gerar'")
+    execucao.add_argument('--semente', type=int, default=0)
+    execucao.add_argument('--tempo-limite', type=float, default=TEMPO_LIMITE_PADRAO)
+    execucao.add_argument('--saida', default=ARQUIVO_RELATORIO_PADRAO)
+
+    # Uso interno: uma página, no processo atual, com o resultado em JSON na saída
+    pagina = subcomandos.add_parser('pagina')
+    pagina.add_argument('pagina')
+    pagina.add_argument('--sessoes', type=int, default=4)
+    pagina.add_argument('--rodadas', type=int, default=10)
+    pagina.add_argument('--semente', type=int, default=0)
+    pagina.add_argument('--tempo-limite', type=float, default=TEMPO_LIMITE_PADRAO)
+
+    args = parser.parse_args(argv)
+    if args.comando == 'gerar':
+        print(f"Catálogo sintético em {gerar_dados(args.destino, args.fator, args.escolas)}")
+    elif args.comando == 'pagina':
+        resultado = executar_pagina(args.pagina, args.sessoes, args.rodadas, args.semente, args.tempo_limite)
+        print(json.dumps(resultado, ensure_ascii=False))
+    else:
+        relatorio = executar(args.paginas or paginas_padrao(), args.sessoes, args.rodadas, args.fator,
+                             args.escolas, args.dados, args.semente, args.tempo_limite)
+        pasta = os.path.dirname(args.saida)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        colunas = ['pagina', 'sessoes', 'reruns', 'erros', 'inicio_frio_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+                   'vazao_reruns_s', 'rss_pico_mb']
+        print(pd.DataFrame(relatorio['paginas']).reindex(columns=colunas).to_string(index=False))
+        print(f"Relatório em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
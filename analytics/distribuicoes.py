@@ -0,0 +1,147 @@
+"""
+Resumos de distribuição calculados no servidor para histogramas e box plots.
+
+Em vez de mandar a nota de cada aluno para o navegador calcular faixas e
+quartis, cada grupo (simulado, turma, componente...) vira um resumo com
+quartis, bigodes, atípicos e contagens por faixa, e os gráficos recebem só
+esses números. Grupos pequenos usam os valores exatos; grupos grandes usam
+o histograma combinável de analytics.agregacao, que pode vir de várias
+partições somadas.
+"""
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from analytics.agregacao import LIMITES_HISTOGRAMA, FAIXAS_HISTOGRAMA, agregado_parcial, centros_faixas, quantil
+from analytics.instrumentacao import medir
+
+# Acima disso o grupo é resumido pelo histograma de 0,1 ponto em vez dos valores exatos
+LIMITE_EXATO = 2000
+FAIXAS_EXIBICAO = 10
+# Bigodes de Tukey: 1,5 intervalo interquartil além dos quartis
+FATOR_BIGODE = 1.5
+
+
+def _bigodes_e_atipicos(valores, contagens, q1, q3):
+    """Bigodes (valor mais extremo dentro das cercas) e atípicos como pares (valor, contagem)."""
+    iqr = q3 - q1
+    dentro = (valores >= q1 - FATOR_BIGODE * iqr) & (valores <= q3 + FATOR_BIGODE * iqr)
+    bigodes = (valores[dentro].min(), valores[dentro].max()) if dentro.any() else (q1, q3)
+    atipicos = list(zip(valores[~dentro].tolist(), contagens[~dentro].tolist()))
+    return float(bigodes[0]), float(bigodes[1]), atipicos
+
+
+def _resumo_exato(valores, faixas):
+    """Resumo com os próprios valores (quartis com a interpolação linear do pandas)."""
+    q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+    unicos, contagens = np.unique(valores, return_counts=True)
+    inferior, superior, atipicos = _bigodes_e_atipicos(unicos, contagens, q1, q3)
+    histograma, _ = np.histogram(valores, bins=faixas, range=LIMITES_HISTOGRAMA)
+    return {
+        'n': len(valores), 'minimo': float(valores.min()), 'maximo': float(valores.max()),
+        'media': float(valores.mean()), 'desvio': float(valores.std(ddof=1)) if len(valores) > 1 else np.nan,
+        'q1': float(q1), 'mediana': float(mediana), 'q3': float(q3),
+        'bigode_inferior': inferior, 'bigode_superior': superior, 'atipicos': atipicos,
+        'histograma': histograma.tolist(), 'exato': True,
+    }
+
+
+def resumo_de_agregado(agregado, faixas=FAIXAS_EXIBICAO):
+    """
+    Resumo a partir de um agregado combinável (ver analytics.agregacao).
+
+    Quartis e atípicos usam o centro das faixas de 0,1 ponto; `faixas` precisa
+    dividir FAIXAS_HISTOGRAMA para o histograma exibido sair da soma das faixas finas.
+    """
+    finas = np.asarray(agregado['histograma'])
+    q1, mediana, q3 = (quantil(agregado, q) for q in (0.25, 0.5, 0.75))
+    ocupadas = np.flatnonzero(finas)
+    valores = np.clip(centros_faixas(ocupadas), agregado['minimo'], agregado['maximo'])
+    inferior, superior, atipicos = _bigodes_e_atipicos(valores, finas[ocupadas], q1, q3)
+    n = agregado['n']
+    return {
+        'n': int(n), 'minimo': float(agregado['minimo']), 'maximo': float(agregado['maximo']),
+        'media': float(agregado['media']), 'desvio': float(np.sqrt(agregado['m2'] / (n - 1))) if n > 1 else np.nan,
+        'q1': q1, 'mediana': mediana, 'q3': q3,
+        'bigode_inferior': inferior, 'bigode_superior': superior, 'atipicos': atipicos,
+        'histograma': finas.reshape(faixas, FAIXAS_HISTOGRAMA // faixas).sum(axis=1).tolist(), 'exato': False,
+    }
+
+
+def resumir(valores, faixas=FAIXAS_EXIBICAO):
+    """Resumo de um conjunto de notas: exato até LIMITE_EXATO valores, pelo histograma acima disso."""
+    valores = np.asarray(valores, dtype=float)
+    valores = valores[~np.isnan(valores)]
+    if not len(valores):
+        return None
+    if len(valores) <= LIMITE_EXATO:
+        return _resumo_exato(valores, faixas)
+    agregado = agregado_parcial(np.zeros(len(valores), dtype=np.int8), valores)[0]
+    return resumo_de_agregado(agregado, faixas)
+
+
+@st.cache_data
+def resumir_grupos(df, coluna, grupos=None, faixas=FAIXAS_EXIBICAO):
+    """
+    Resumo de `coluna` em cada grupo, na ordem em que os grupos aparecem.
+
+    `grupos` é uma coluna ou lista de colunas (ex.: ['Simulado', 'Turma']);
+    sem grupos, o resultado tem uma única chave 'Todos'.
+    """
+    with medir('resumo_distribuicao', linhas=len(df)):
+        if not grupos:
+            resumo = resumir(df[coluna], faixas)
+            return {'Todos': resumo} if resumo else {}
+        resumos = {}
+        for chave, parte in df.groupby(grupos, sort=False, observed=True)[coluna]:
+            resumo = resumir(parte, faixas)
+            if resumo:
+                resumos[chave[0] if isinstance(chave, tuple) and len(chave) == 1 else chave] = resumo
+        return resumos
+
+
+def bordas_faixas(faixas=FAIXAS_EXIBICAO):
+    """Limites das faixas exibidas no histograma."""
+    return np.linspace(*LIMITES_HISTOGRAMA, faixas + 1)
+
+
+def figura_boxplot(resumos, cores=None, nome_valor='Nota', **layout):
+    """
+    Box plot com os quartis já calculados: um Box por grupo e os atípicos
+    num Scatter, com a contagem de alunos no hover.
+    """
+    cores = cores or px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, (nome, resumo) in enumerate(resumos.items()):
+        cor = cores[i % len(cores)]
+        nome = str(nome)
+        fig.add_trace(go.Box(
+            x=[nome], name=nome, q1=[resumo['q1']], median=[resumo['mediana']], q3=[resumo['q3']],
+            lowerfence=[resumo['bigode_inferior']], upperfence=[resumo['bigode_superior']],
+            mean=[resumo['media']], sd=[resumo['desvio']], marker_color=cor, boxpoints=False,
+            hoverinfo='y',
+        ))
+        if resumo['atipicos']:
+            valores, contagens = zip(*resumo['atipicos'])
+            fig.add_trace(go.Scatter(
+                x=[nome] * len(valores), y=valores, customdata=contagens, mode='markers',
+                marker=dict(color=cor, size=7, symbol='circle-open'), showlegend=False,
+                hovertemplate=f'<b>{nome}</b><br>{nome_valor}: %{{y:.1f}}<br>Alunos: %{{customdata}}<extra></extra>',
+            ))
+    fig.update_layout(template='plotly_white', showlegend=False, **layout)
+    return fig
+
+
+def figura_histograma(resumo, cor='#4e73df', faixas=FAIXAS_EXIBICAO, nome_valor='Nota', **layout):
+    """Histograma com as contagens por faixa já calculadas (uma barra por faixa)."""
+    bordas = bordas_faixas(faixas)
+    rotulos = [f"{a:.0f}–{b:.0f}" for a, b in zip(bordas[:-1], bordas[1:])]
+    fig = go.Figure(go.Bar(
+        x=(bordas[:-1] + bordas[1:]) / 2, y=resumo['histograma'], width=np.diff(bordas) * 0.9,
+        customdata=rotulos, marker_color=cor,
+        hovertemplate=f'{nome_valor}: %{{customdata}}<br>Alunos: %{{y}}<extra></extra>',
+    ))
+    fig.update_layout(template='plotly_white', showlegend=False, xaxis_title=nome_valor, yaxis_title='Alunos', **layout)
+    return fig
+
@@ -0,0 +1,150 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+N_REAMOSTRAGENS = 10000
+CONFIANCA = 0.95
+
+# Limite de células (reamostragens x alunos) processadas por bloco do bootstrap
+CELULAS_POR_BLOCO = 2_000_000
+
+
+def parear_edicoes(df_1ed, df_2ed, colunas, chave='Aluno', coluna_grupo=None):
+    """
+    Junta as duas edições pelo aluno, mantendo só quem fez as duas provas.
+
+    Retorna as matrizes (alunos x colunas) de cada edição e o grupo de cada aluno.
+    """
+    extras = [coluna_grupo] if coluna_grupo else []
+    antes = df_1ed.drop_duplicates(chave)[[chave] + extras + list(colunas)]
+    depois = df_2ed.drop_duplicates(chave)[[chave] + list(colunas)]
+    pareado = antes.merge(depois, on=chave, suffixes=('_1ed', '_2ed')).sort_values(chave)
+
+    matriz_1ed = pareado[[f'{c}_1ed' for c in colunas]].to_numpy(dtype=float, na_value=np.nan)
+    matriz_2ed = pareado[[f'{c}_2ed' for c in colunas]].to_numpy(dtype=float, na_value=np.nan)
+    grupos = pareado[coluna_grupo].to_numpy() if coluna_grupo else np.full(len(pareado), 'Todos', dtype=object)
+    return matriz_1ed, matriz_2ed, grupos, pareado[chave].tolist()
+
+
+def _medias_validas(pesos, valores, validos):
+    """Média ponderada ignorando ausentes: pesos (m x n) sobre valores (n x k)."""
+    soma = pesos @ np.where(validos, valores, 0.0)
+    contagem = pesos @ validos.astype(float)
+    return np.divide(soma, contagem, out=np.full(soma.shape, np.nan), where=contagem > 0)
+
+
+def bootstrap_medias(diferencas, n_reamostragens=N_REAMOSTRAGENS, semente=0):
+    """
+    Médias bootstrap das diferenças de todas as colunas de uma vez.
+
+    Os índices sorteados formam uma matriz (B x n) que vira contagens por aluno
+    (np.bincount); as médias saem de um único produto matricial por bloco.
+    """
+    diferencas = np.asarray(diferencas, dtype=float)
+    n, k = diferencas.shape
+    if n == 0:
+        return np.full((n_reamostragens, k), np.nan)
+
+    rng = np.random.default_rng(semente)
+    validos = ~np.isnan(diferencas)
+    tamanho_bloco = max(1, CELULAS_POR_BLOCO // n)
+    medias = np.empty((n_reamostragens, k))
+
+    for inicio in range(0, n_reamostragens, tamanho_bloco):
+        b = min(tamanho_bloco, n_reamostragens - inicio)
+        indices = rng.integers(0, n, size=(b, n))
+        linhas = np.repeat(np.arange(b), n) * n
+        contagens = np.bincount(linhas + indices.ravel(), minlength=b * n).reshape(b, n)
+        medias[inicio:inicio + b] = _medias_validas(contagens, diferencas, validos)
+    return medias
+
+
+def testes_pareados(antes, depois, n_reamostragens=N_REAMOSTRAGENS, confianca=CONFIANCA, semente=0):
+    """
+    Teste t pareado, d de Cohen e IC bootstrap para cada coluna das matrizes.
+
+    Os alunos sem nota numa coluna ficam de fora só daquela coluna.
+    """
+    antes = np.asarray(antes, dtype=float)
+    depois = np.asarray(depois, dtype=float)
+    diferencas = depois - antes
+    validos = ~np.isnan(diferencas)
+    antes = np.where(validos, antes, np.nan)
+    depois = np.where(validos, depois, np.nan)
+
+    n = validos.sum(axis=0)
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        # Colunas sem alunos pareados geram fatias vazias; o resultado fica NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        media_dif = np.nanmean(diferencas, axis=0)
+        desvio_dif = np.nanstd(diferencas, axis=0, ddof=1)
+        t = media_dif / (desvio_dif / np.sqrt(n))
+        p_valor = 2 * stats.t.sf(np.abs(t), n - 1)
+        desvio_medio = np.sqrt((np.nanvar(antes, axis=0, ddof=1) + np.nanvar(depois, axis=0, ddof=1)) / 2)
+        cohen_d = media_dif / desvio_medio
+
+        alfa = (1 - confianca) / 2
+        medias_boot = bootstrap_medias(diferencas, n_reamostragens, semente)
+        ic = np.nanquantile(medias_boot, [alfa, 1 - alfa], axis=0)
+        media_1ed = np.nanmean(antes, axis=0)
+        media_2ed = np.nanmean(depois, axis=0)
+
+    insuficiente = n < 2
+    p_valor = np.where(insuficiente | np.isnan(p_valor), 1.0, p_valor)
+    cohen_d = np.where(insuficiente | ~np.isfinite(cohen_d), 0.0, cohen_d)
+
+    return {
+        'n': n,
+        'media_1ed': media_1ed,
+        'media_2ed': media_2ed,
+        'diferenca': media_dif,
+        'ic_inferior': ic[0],
+        'ic_superior': ic[1],
+        't': t,
+        'p_valor': p_valor,
+        'cohen_d': cohen_d,
+    }
+
+
+@st.cache_data(show_spinner="Calculando testes e intervalos bootstrap...")
+def comparar_edicoes(df_1ed, df_2ed, colunas, chave='Aluno', coluna_grupo=None,
+                     n_reamostragens=N_REAMOSTRAGENS, confianca=CONFIANCA, semente=0):
+    """
+    Tabela de significância por grupo (turma) e disciplina, em cache por snapshot.
+
+    Cada linha traz as médias das duas edições, a diferença com o IC bootstrap,
+    o teste t pareado e o d de Cohen.
+    """
+    colunas = list(colunas)
+    with medir('estatisticas_bootstrap') as registro:
+        matriz_1ed, matriz_2ed, grupos, _ = parear_edicoes(df_1ed, df_2ed, colunas, chave, coluna_grupo)
+        registro['linhas'] = len(grupos)
+
+        resultados = []
+        for grupo in pd.unique(grupos):
+            mascara = grupos == grupo
+            r = testes_pareados(matriz_1ed[mascara], matriz_2ed[mascara], n_reamostragens, confianca, semente)
+            resultados.append(pd.DataFrame({
+                'Grupo': grupo,
+                'Disciplina': colunas,
+                'Alunos': r['n'],
+                'Média 1ª Ed.': r['media_1ed'],
+                'Média 2ª Ed.': r['media_2ed'],
+                'Diferença': r['diferenca'],
+                'IC inferior': r['ic_inferior'],
+                'IC superior': r['ic_superior'],
+                't': r['t'],
+                'p-valor': r['p_valor'],
+                'Cohen d': r['cohen_d'],
+            }))
+
+    if not resultados:
+        return pd.DataFrame(columns=['Grupo', 'Disciplina', 'Alunos', 'Diferença', 'p-valor', 'Cohen d', 'Significativo'])
+    tabela = pd.concat(resultados, ignore_index=True)
+    tabela['Significativo'] = tabela['p-valor'] < (1 - confianca)
+    return tabela
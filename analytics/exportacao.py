@@ -0,0 +1,305 @@
+import io
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+
+from analytics.armazenamento import RAIZ
+from analytics.instrumentacao import medir
+from analytics.respostas import selecionar_linhas, agregar_alunos, agregar_descritores
+
+PASTA_EXPORTACOES = os.path.join(RAIZ, 'exportacoes')
+FORMATOS = {'XLSX': 'xlsx', 'CSV': 'csv', 'PDF': 'pdf'}
+TIPOS_MIME = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+}
+
+TRABALHADORES_EXPORTACAO = 2
+# Linhas gravadas por vez no CSV e por página no PDF
+LINHAS_POR_BLOCO = 5000
+LINHAS_POR_PAGINA_PDF = 30
+# Arquivos gerados há mais tempo que isso são apagados na próxima exportação
+VALIDADE_SEGUNDOS = 24 * 3600
+INTERVALO_ATUALIZACAO = 2
+
+
+def _nome_aba(nome, usados):
+    """Nome de planilha válido no Excel (até 31 caracteres, sem []:*?/\\) e sem repetição."""
+    base = re.sub(r'[\[\]:*?/\\]', '-', str(nome)).strip()[:31] or 'Tabela'
+    nome, contador = base, 2
+    while nome.lower() in usados:
+        sufixo = f" ({contador})"
+        nome, contador = base[:31 - len(sufixo)] + sufixo, contador + 1
+    usados.add(nome.lower())
+    return nome
+
+
+def _gravar_xlsx(tabelas, caminho):
+    """Grava uma aba por tabela, linha a linha; com constant_memory o livro só guarda a linha atual."""
+    import xlsxwriter
+
+    livro = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'nan_inf_to_errors': True})
+    cabecalho = livro.add_format({'bold': True, 'bg_color': '#3498db', 'font_color': 'white', 'border': 1})
+    decimal = livro.add_format({'num_format': '0.0'})
+    usados = set()
+    for nome, tabela in tabelas.items():
+        aba = livro.add_worksheet(_nome_aba(nome, usados))
+        aba.freeze_panes(1, 0)
+        for coluna, titulo in enumerate(tabela.columns):
+            largura = max(len(str(titulo)), int(tabela[titulo].astype(str).str.len().max() if len(tabela) else 0))
+            formato = decimal if tabela[titulo].dtype.kind == 'f' else None
+            aba.set_column(coluna, coluna, min(largura + 2, 50), formato)
+            aba.write(0, coluna, str(titulo), cabecalho)
+        # Ausentes viram None (célula vazia) e tipos do NumPy viram tipos nativos
+        valores = tabela.astype(object).where(tabela.notna(), None)
+        for inicio in range(0, len(valores), LINHAS_POR_BLOCO):
+            bloco = valores.iloc[inicio:inicio + LINHAS_POR_BLOCO].to_numpy().tolist()
+            for linha, registro in enumerate(bloco, start=inicio + 1):
+                aba.write_row(linha, 0, registro)
+    livro.close()
+
+
+def _gravar_csv(tabela, destino, separador=';'):
+    """Grava a tabela em blocos, no padrão das planilhas da escola (';' e vírgula decimal)."""
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    for inicio in range(0, max(len(tabela), 1), LINHAS_POR_BLOCO):
+        tabela.iloc[inicio:inicio + LINHAS_POR_BLOCO].to_csv(
+            texto, sep=separador, decimal=',', index=False, header=inicio == 0
+        )
+    texto.flush()
+    texto.detach()
+
+
+def _gravar_csvs(tabelas, caminho):
+    """Uma tabela vira um CSV; várias, um ZIP com um CSV por tabela."""
+    if len(tabelas) == 1:
+        with open(caminho, 'wb') as arquivo:
+            _gravar_csv(next(iter(tabelas.values())), arquivo)
+        return
+    usados = set()
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        for nome, tabela in tabelas.items():
+            info = zipfile.ZipInfo(f"{_nome_aba(nome, usados)}.csv", time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with pacote.open(info, 'w') as membro:
+                _gravar_csv(tabela, membro)
+
+
+def _texto_celulas(tabela):
+    """Valores da página formatados para o PDF (uma casa decimal, vazio para ausentes)."""
+    colunas = {}
+    for coluna in tabela.columns:
+        valores = tabela[coluna]
+        if valores.dtype.kind == 'f':
+            colunas[coluna] = valores.map(lambda v: '' if pd.isna(v) else f"{v:.1f}")
+        else:
+            colunas[coluna] = valores.astype(str).where(valores.notna(), '')
+    return pd.DataFrame(colunas).to_numpy()
+
+
+def _gravar_pdf(tabelas, caminho, titulo):
+    """Uma página por bloco de linhas; cada página é desenhada, gravada e descartada."""
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    with PdfPages(caminho) as pdf:
+        for nome, tabela in tabelas.items():
+            paginas = max(-(-len(tabela) // LINHAS_POR_PAGINA_PDF), 1)
+            for pagina in range(paginas):
+                bloco = tabela.iloc[pagina * LINHAS_POR_PAGINA_PDF:(pagina + 1) * LINHAS_POR_PAGINA_PDF]
+                figura = Figure(figsize=(11.69, 8.27))
+                eixo = figura.add_subplot()
+                eixo.axis('off')
+                eixo.set_title(f"{titulo} - {nome} ({pagina + 1}/{paginas})", fontsize=12, loc='left')
+                if len(bloco):
+                    grade = eixo.table(cellText=_texto_celulas(bloco), colLabels=[str(c) for c in bloco.columns],
+                                       loc='upper center', cellLoc='center')
+                    grade.auto_set_font_size(False)
+                    grade.set_fontsize(8)
+                    for (linha, _), celula in grade.get_celld().items():
+                        if linha == 0:
+                            celula.set_facecolor('#3498db')
+                            celula.set_text_props(color='white', weight='bold')
+                pdf.savefig(figura)
+
+
+def gerar_arquivo(tabelas, caminho, formato, titulo):
+    """
+    Executada numa thread do pool: grava o pacote num arquivo temporário e o
+    renomeia ao final, para que um download nunca pegue um arquivo pela metade.
+    """
+    parcial = caminho + '.parcial'
+    with medir('exportacao', linhas=sum(len(t) for t in tabelas.values())) as registro:
+        if formato == 'xlsx':
+            _gravar_xlsx(tabelas, parcial)
+        elif formato == 'pdf':
+            _gravar_pdf(tabelas, parcial, titulo)
+        else:
+            _gravar_csvs(tabelas, parcial)
+        os.replace(parcial, caminho)
+        registro['bytes'] = os.path.getsize(caminho)
+    return caminho
+
+
+def montar_e_gerar(montar, base, formato, titulo):
+    """
+    Executada numa thread do pool: monta as tabelas (carga e validação das
+    turmas incluídas) e grava o arquivo. Devolve o nome e a extensão do arquivo.
+    """
+    tabelas = montar()
+    extensao = 'zip' if formato == 'csv' and len(tabelas) > 1 else formato
+    caminho = gerar_arquivo(tabelas, f"{base}.{extensao}", formato, titulo)
+    return {'arquivo': os.path.basename(caminho), 'extensao': extensao}
+
+
+@st.cache_resource
+def _servico():
+    """
+    Pool e tarefas de exportação, compartilhados entre sessões.
+
+    Threads e não processos: sob o Streamlit o módulo __main__ é o script da
+    página, e um processo novo o executaria de novo ao iniciar.
+    """
+    pool = ThreadPoolExecutor(TRABALHADORES_EXPORTACAO, thread_name_prefix='exportacao')
+    return {'pool': pool, 'tarefas': {}, 'trava': threading.Lock()}
+
+
+def descartar_tarefa(identificador):
+    """Esquece a tarefa (o arquivo fica até vencer)."""
+    servico = _servico()
+    with servico['trava']:
+        servico['tarefas'].pop(identificador, None)
+
+
+def _limpar_antigas():
+    """Apaga exportações vencidas e esquece as tarefas concluídas há mais tempo que a validade."""
+    limite = time.time() - VALIDADE_SEGUNDOS
+    servico = _servico()
+    with servico['trava']:
+        vencidas = [identificador for identificador, tarefa in servico['tarefas'].items()
+                    if tarefa['futuro'].done() and tarefa['criada'] < limite]
+        for identificador in vencidas:
+            del servico['tarefas'][identificador]
+    for nome in os.listdir(PASTA_EXPORTACOES):
+        caminho = os.path.join(PASTA_EXPORTACOES, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+
+def enviar_exportacao(montar, nome, formato, titulo=None):
+    """
+    Agenda no pool a montagem das tabelas (`montar` devolve {nome: DataFrame})
+    e a gravação do arquivo; devolve o identificador da tarefa.
+    """
+    os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+    _limpar_antigas()
+
+    identificador = uuid.uuid4().hex[:12]
+    slug = re.sub(r'[^\w-]+', '_', nome).strip('_')
+    base = os.path.join(PASTA_EXPORTACOES, f"{slug}_{time.strftime('%Y%m%d_%H%M%S')}_{identificador[:4]}")
+
+    servico = _servico()
+    futuro = servico['pool'].submit(montar_e_gerar, montar, base, formato, titulo or nome)
+    with servico['trava']:
+        servico['tarefas'][identificador] = {'futuro': futuro, 'criada': time.time()}
+    return identificador
+
+
+def situacao_exportacao(identificador):
+    """
+    Estado da tarefa: 'executando', 'concluida', 'erro' ou None se desconhecida.
+    Concluída, a tarefa traz também o nome do arquivo e a extensão.
+    """
+    tarefa = _servico()['tarefas'].get(identificador)
+    if tarefa is None:
+        return None, None
+    futuro = tarefa['futuro']
+    if not futuro.done():
+        return 'executando', tarefa
+    if futuro.exception() is not None:
+        return 'erro', tarefa
+    return 'concluida', {**tarefa, **futuro.result()}
+
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO)
+def _acompanhar(identificador):
+    """Consulta a tarefa periodicamente sem rodar a página inteira de novo."""
+    situacao, _ = situacao_exportacao(identificador)
+    if situacao == 'executando':
+        st.info("⏳ Gerando arquivo... você pode continuar usando a página.")
+    else:
+        st.rerun()
+
+
+def renderizar_exportacao(chave, escopos, nome, titulo=None):
+    """
+    Painel de exportação: escolha da abrangência e do formato, geração em segundo plano e download.
+
+    `escopos` mapeia o rótulo da abrangência (ex.: 'Turma selecionada', 'Escola')
+    para uma função que devolve {nome da tabela: DataFrame}; só a escolhida é montada.
+    """
+    with st.expander("📤 Exportar dados"):
+        col_escopo, col_formato, col_botao = st.columns([2, 1, 1])
+        escopo = col_escopo.selectbox("Abrangência:", list(escopos), key=f"{chave}_escopo")
+        formato = col_formato.selectbox("Formato:", list(FORMATOS), key=f"{chave}_formato")
+        col_botao.markdown("<br>", unsafe_allow_html=True)
+        if col_botao.button("Gerar arquivo", key=f"{chave}_gerar", use_container_width=True):
+            # A montagem das tabelas também vai para o pool: a página segue livre
+            st.session_state[f"{chave}_tarefa"] = enviar_exportacao(
+                escopos[escopo], f"{nome}_{escopo}", FORMATOS[formato], titulo=f"{titulo or nome} - {escopo}"
+            )
+
+        identificador = st.session_state.get(f"{chave}_tarefa")
+        if identificador is None:
+            return
+        situacao, tarefa = situacao_exportacao(identificador)
+        if situacao is None:
+            del st.session_state[f"{chave}_tarefa"]
+        elif situacao == 'executando':
+            _acompanhar(identificador)
+        elif situacao == 'erro':
+            st.error(f"Erro ao gerar o arquivo: {tarefa['futuro'].exception()}")
+        elif situacao == 'concluida':
+            caminho = os.path.join(PASTA_EXPORTACOES, tarefa['arquivo'])
+            if not os.path.exists(caminho):
+                st.warning("O arquivo expirou; gere novamente.")
+                return
+            with open(caminho, 'rb') as arquivo:
+                st.download_button(
+                    f"⬇️ Baixar {tarefa['arquivo']}", arquivo, file_name=tarefa['arquivo'],
+                    mime=TIPOS_MIME[tarefa['extensao']], key=f"{chave}_baixar",
+                    on_click=_baixado, args=(chave, identificador)
+                )
+
+
+def _baixado(chave, identificador):
+    """Depois do download a tarefa sai do serviço e da sessão."""
+    descartar_tarefa(identificador)
+    st.session_state.pop(f"{chave}_tarefa", None)
+
+
+def tabelas_descritores(base, componente, simulados):
+    """Alunos e descritores de cada simulado, como nas tabelas das páginas de descritores."""
+    tabelas = {}
+    for simulado in simulados:
+        itens = base['itens_por_simulado'].get((componente, simulado), [])
+        linhas = selecionar_linhas(base, simulado, componente)
+        if not len(linhas):
+            continue
+        alunos = agregar_alunos(base, linhas, len(itens))
+        descritores = agregar_descritores(base, linhas, itens)
+        tabelas[f"{simulado} - Alunos"] = alunos.sort_values('Porcentagem', ascending=False).round(2)
+        tabelas[f"{simulado} - Descritores"] = descritores.sort_values('Porcentagem', ascending=False).round(2)
+    return tabelas
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Colunas de faixa anexadas ao DataFrame em cache (ex.: 'MAT__faixa')
+SUFIXO_FAIXA = '__faixa'
+
+# Desempenho por aluno: < 60 (0), 60 a 80 (1), >= 80 (2)
+LIMITES_DESEMPENHO = [60, 80]
+ROTULOS_DESEMPENHO = ['Abaixo de 60%', '60-80%', '80-100%']
+
+# Distribuição dos descritores: bins [0, 30, 60, 80, 100]
+LIMITES_DESCRITORES = [30, 60, 80]
+ROTULOS_DESCRITORES = ['0-30%', '30-60%', '60-80%', '80-100%']
+
+# Faixas de 20 em 20 pontos que substituem o background_gradient nas tabelas
+LIMITES_GRADIENTE = [20, 40, 60, 80]
+
+
+def calcular_faixas(valores, limites):
+    """
+    Código da faixa de cada valor, para a matriz inteira de uma vez (np.digitize).
+
+    As faixas são fechadas à esquerda (60 já conta como "60-80%"), como as
+    comparações `>= 60` das páginas. Valores ausentes recebem -1.
+    """
+    valores = np.asarray(valores, dtype=float)
+    codigos = np.digitize(valores, limites).astype(np.int8)
+    codigos[np.isnan(valores)] = -1
+    return codigos
+
+
+def coluna_faixa(coluna):
+    """Nome da coluna de códigos de faixa associada a uma coluna de notas."""
+    return f"{coluna}{SUFIXO_FAIXA}"
+
+
+def anexar_faixas(df, colunas, limites):
+    """
+    Anexa ao DataFrame as colunas de códigos de faixa das colunas informadas.
+
+    Deve ser chamada dentro das funções em cache, para que as faixas sejam
+    calculadas uma única vez por snapshot dos dados e não a cada rerun.
+    """
+    colunas = list(colunas)
+    codigos = calcular_faixas(df[colunas].to_numpy(dtype=float, na_value=np.nan), limites)
+    faixas = pd.DataFrame(codigos, index=df.index, columns=[coluna_faixa(c) for c in colunas])
+    return pd.concat([df.drop(columns=faixas.columns, errors='ignore'), faixas], axis=1)
+
+
+def codigos_faixas(df, colunas, limites):
+    """Usa as colunas de faixa já anexadas ou, na falta delas, calcula na hora."""
+    colunas = list(colunas)
+    anexadas = [coluna_faixa(c) for c in colunas]
+    if all(c in df.columns for c in anexadas):
+        return df[anexadas].to_numpy(dtype=np.int8)
+    return calcular_faixas(df[colunas].to_numpy(dtype=float, na_value=np.nan), limites)
+
+
+def distribuicao_faixas(codigos, rotulos):
+    """Contagem por faixa (np.bincount) para gráficos de pizza e rosca."""
+    codigos = np.asarray(codigos).ravel()
+    contagem = np.bincount(codigos[codigos >= 0], minlength=len(rotulos))
+    return pd.Series(contagem, index=rotulos)
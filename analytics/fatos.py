@@ -0,0 +1,66 @@
+"""
+Tabela de fatos no formato longo: (dimensões..., avaliação, aluno, valor).
+
+Montada uma vez na carga e compartilhada entre as sessões. As linhas ficam
+ordenadas pelas dimensões (ex.: componente e turma) e, dentro delas, pela
+avaliação; as colunas de texto são Categorical (códigos inteiros mais um
+dicionário). Cada combinação das dimensões ocupa um trecho contíguo, então
+os gráficos recebem fatias da mesma tabela em vez de um melt a cada execução.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+
+def _categorica(coluna, posicoes):
+    """Coluna codificada em dicionário, já na ordem da tabela de fatos."""
+    codigos, categorias = pd.factorize(coluna, sort=True)
+    return pd.Categorical.from_codes(codigos[posicoes], categorias)
+
+
+@st.cache_resource
+def construir_fatos(df, colunas, chave='Aluno', dimensoes=(), nome_avaliacao='Simulado', nome_valor='Nota'):
+    """
+    Converte as colunas de notas (`colunas`) para o formato longo sem melt.
+
+    Devolve {'tabela', 'fatias', 'avaliacoes'}: `fatias` leva cada combinação
+    de `dimensoes` ao seu trecho (início, fim) na tabela. A tabela é a mesma
+    para todas as sessões e deve ser tratada como somente leitura.
+    """
+    dimensoes = list(dimensoes)
+    with medir('fatos', linhas=len(df)):
+        valores = df[colunas].to_numpy(dtype=float, na_value=np.nan)
+        k = len(colunas)
+        grupos = df.groupby(dimensoes, sort=True).indices if dimensoes else {(): np.arange(len(df))}
+
+        fatias, linhas, avaliacoes, inicio = {}, [], [], 0
+        for grupo, posicoes in grupos.items():
+            grupo = grupo if isinstance(grupo, tuple) else (grupo,)
+            fatias[grupo] = (inicio, inicio + len(posicoes) * k)
+            inicio += len(posicoes) * k
+            # Avaliação a avaliação, com os alunos na ordem da planilha
+            linhas.append(np.tile(posicoes, k))
+            avaliacoes.append(np.repeat(np.arange(k), len(posicoes)))
+        linhas = np.concatenate(linhas) if linhas else np.empty(0, dtype=int)
+        avaliacoes = np.concatenate(avaliacoes) if avaliacoes else np.empty(0, dtype=int)
+
+        tabela = pd.DataFrame({
+            **{d: _categorica(df[d], linhas) for d in dimensoes},
+            nome_avaliacao: pd.Categorical.from_codes(avaliacoes, pd.Index(colunas)),
+            chave: _categorica(df[chave], linhas),
+            nome_valor: valores[linhas, avaliacoes],
+        })
+    return {'tabela': tabela, 'fatias': fatias, 'avaliacoes': list(colunas)}
+
+
+def fatia(fatos, *grupo):
+    """Trecho de uma combinação das dimensões, sem cópia (vazio se ela não existir)."""
+    inicio, fim = fatos['fatias'].get(tuple(grupo), (0, 0))
+    return fatos['tabela'].iloc[inicio:fim]
+
+
+def fatos_alunos(tabela, alunos, chave='Aluno'):
+    """Linhas dos alunos escolhidos; a cópia é do tamanho da seleção."""
+    return tabela[tabela[chave].isin(alunos)]
@@ -0,0 +1,105 @@
+"""
+Fluxo de dados das páginas: cálculos declarados com as suas entradas.
+
+A página registra parâmetros (valores de widgets, partição, versão dos
+arquivos) e nós (funções com a lista de entradas). `obter` só executa um nó
+quando a assinatura das entradas mudou desde a última execução; caso
+contrário devolve o valor guardado na sessão. As seções controladas por um
+único widget ficam em st.fragment: mudar esse widget executa só o fragmento,
+que lê os nós já calculados.
+
+    fluxo = criar_fluxo('mensais')
+    definir(fluxo, 'turma', turma_selecionada)
+    no(fluxo, 'filtrado', ['dados', 'turma'])(filtrar)
+    df_filtrado = obter(fluxo, 'filtrado')
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+
+def criar_fluxo(nome):
+    """Fluxo da página, guardado na sessão para sobreviver aos reruns."""
+    return st.session_state.setdefault(f"fluxo_{nome}", {'nos': {}, 'parametros': {}, 'cache': {}})
+
+
+def _ficha(valor):
+    """Representação barata e comparável de um valor de entrada."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return ('tabela', valor.shape, int(pd.util.hash_pandas_object(valor, index=True).sum()))
+    try:
+        hash(valor)
+        return valor
+    except TypeError:
+        return repr(valor)
+
+
+def definir(fluxo, nome, valor):
+    """Define um parâmetro; os nós que dependem dele só são invalidados se o valor mudou."""
+    ficha = _ficha(valor)
+    atual = fluxo['parametros'].get(nome)
+    if atual is not None and atual['ficha'] == ficha:
+        atual['valor'] = valor
+        return
+    versao = atual['versao'] + 1 if atual else 0
+    fluxo['parametros'][nome] = {'valor': valor, 'ficha': ficha, 'versao': versao}
+
+
+def no(fluxo, nome, entradas=()):
+    """
+    Decorador que registra um nó: a função recebe, na ordem, os valores das
+    `entradas` (parâmetros ou outros nós).
+    """
+    def registrar(funcao):
+        fluxo['nos'][nome] = {'funcao': funcao, 'entradas': list(entradas)}
+        return funcao
+    return registrar
+
+
+def _versao(fluxo, nome):
+    """Versão atual de uma entrada, calculando o nó se necessário."""
+    if nome in fluxo['nos']:
+        obter(fluxo, nome)
+        return fluxo['cache'][nome]['versao']
+    if nome in fluxo['parametros']:
+        return fluxo['parametros'][nome]['versao']
+    raise KeyError(f"Entrada '{nome}' não definida no fluxo")
+
+
+def _valor(fluxo, nome):
+    if nome in fluxo['nos']:
+        return fluxo['cache'][nome]['valor']
+    return fluxo['parametros'][nome]['valor']
+
+
+def obter(fluxo, nome):
+    """Valor do nó, recalculado só quando alguma entrada mudou de versão."""
+    definicao = fluxo['nos'][nome]
+    assinatura = tuple(_versao(fluxo, entrada) for entrada in definicao['entradas'])
+    guardado = fluxo['cache'].get(nome)
+    if guardado is not None and guardado['assinatura'] == assinatura:
+        return guardado['valor']
+
+    with medir(f"no_{nome}"):
+        valor = definicao['funcao'](*(_valor(fluxo, entrada) for entrada in definicao['entradas']))
+    fluxo['cache'][nome] = {
+        'assinatura': assinatura,
+        'valor': valor,
+        'versao': guardado['versao'] + 1 if guardado else 0,
+    }
+    return valor
+
+
+def versao_arquivos(*caminhos):
+    """Data de modificação e tamanho dos arquivos, para usar como parâmetro do fluxo."""
+    versoes = []
+    for caminho in caminhos:
+        try:
+            info = os.stat(caminho)
+            versoes.append((info.st_mtime_ns, info.st_size))
+        except OSError:
+            versoes.append(None)
+    return tuple(versoes)
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+
+from analytics.instrumentacao import medir, perfil_ativo
+
+# Acima deste total de pontos os gráficos de alunos passam para WebGL
+LIMITE_WEBGL = 1000
+
+
+def suporta_arrays_binarios():
+    """Indica se o Plotly instalado serializa arrays NumPy em base64 (plotly >= 6)."""
+    return int(plotly.__version__.split('.')[0]) >= 6
+
+
+def tamanho_payload(fig):
+    """Tamanho em bytes do JSON que o st.plotly_chart envia ao navegador."""
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+
+def contar_pontos(fig):
+    """Soma o número de pontos de todos os traces da figura."""
+    total = 0
+    for trace in fig.data:
+        # Traces polares e mapas de calor não têm os mesmos eixos das barras
+        for eixo in ('y', 'x', 'r', 'z'):
+            valores = getattr(trace, eixo, None) if eixo in trace else None
+            if valores is not None:
+                total += len(valores)
+                break
+    return total
+
+
+def _array_compacto(valores):
+    """Converte arrays numéricos no menor tipo possível para a codificação binária do Plotly."""
+    if valores is None:
+        return None
+    array = np.asarray(valores)
+    if array.dtype.kind in 'iu' and len(array):
+        return array.astype(np.result_type(np.min_scalar_type(array.min()), np.min_scalar_type(array.max())))
+    if array.dtype.kind in 'fb':
+        return array.astype(np.float32)
+    return valores
+
+
+def _barras_para_webgl(fig):
+    """Substitui as barras verticais por pontos Scattergl, preservando grupos e cores."""
+    barras = [t for t in fig.data if t.type == 'bar']
+    categorias = pd.unique(np.concatenate([np.asarray(t.x, dtype=object) for t in barras]))
+    indice = pd.Index(categorias)
+
+    agrupado = fig.layout.barmode == 'group' and len(barras) > 1
+    largura = 0.8 / len(barras) if agrupado else 0.0
+
+    novos = []
+    for j, trace in enumerate(barras):
+        deslocamento = (j - (len(barras) - 1) / 2) * largura
+        posicoes = indice.get_indexer(np.asarray(trace.x, dtype=object))
+        # Traces na mesma ordem das categorias dispensam o array x (x0 + i * dx)
+        sequencial = np.array_equal(posicoes, np.arange(len(posicoes)))
+        eixo = dict(x0=deslocamento, dx=1) if sequencial else dict(x=(posicoes + deslocamento).astype(np.float32))
+        marcador = dict(size=6, color=trace.marker.color, coloraxis=trace.marker.coloraxis)
+        novos.append(go.Scattergl(
+            **eixo,
+            y=_array_compacto(trace.y),
+            mode='markers',
+            name=trace.name,
+            legendgroup=trace.legendgroup,
+            showlegend=trace.showlegend,
+            marker=marcador,
+            # Os nomes dos alunos seguem só no primeiro trace; no hover unificado eles
+            # aparecem uma vez por posição
+            hovertext=np.asarray(trace.x, dtype=object) if j == 0 else None,
+            hovertemplate=('<b>%{hovertext}</b><br>' if j == 0 else '') + '%{y:.1f}<extra>' + (trace.name or '') + '</extra>',
+        ))
+
+    outros = [t for t in fig.data if t.type != 'bar']
+    fig.data = []
+    for trace in novos + outros:
+        fig.add_trace(trace)
+
+    eixo_x = dict(tickmode='array', tickvals=list(range(len(categorias))), ticktext=list(categorias))
+    if len(categorias) > 100:
+        eixo_x = dict(showticklabels=False)
+    fig.update_layout(xaxis=eixo_x, barmode=None, hovermode='x unified' if agrupado else 'closest')
+    return fig
+
+
+def otimizar_figura(fig, limite=LIMITE_WEBGL):
+    """
+    Reduz o payload da figura: arrays numéricos em float32 (base64 no Plotly >= 6)
+    e, acima do limite de pontos, barras convertidas em traces WebGL.
+    """
+    webgl = contar_pontos(fig) > limite and any(
+        t.type == 'bar' and t.orientation != 'h' for t in fig.data
+    )
+    if webgl:
+        fig = _barras_para_webgl(fig)
+    else:
+        for trace in fig.data:
+            if trace.type in ('bar', 'scatter', 'scattergl'):
+                trace.y = _array_compacto(trace.y)
+    return fig, webgl
+
+
+def plotly_chart_medido(fig, **kwargs):
+    """st.plotly_chart que, com a instrumentação ligada, registra tempo e bytes do gráfico."""
+    with medir('serializacao_grafico', linhas=contar_pontos(fig) if perfil_ativo() else None) as registro:
+        if perfil_ativo() and registro['bytes'] is None:
+            registro['bytes'] = tamanho_payload(fig)
+        st.plotly_chart(fig, **kwargs)
+
+
+def plotly_chart_otimizado(fig, rotulo, limite=LIMITE_WEBGL, **kwargs):
+    """Otimiza, mede e exibe a figura, registrando os bytes enviados por gráfico."""
+    with medir('otimizacao_grafico'):
+        fig, webgl = otimizar_figura(fig, limite)
+        tamanho = tamanho_payload(fig)
+
+    st.session_state.setdefault('payload_graficos', {})[rotulo] = {
+        'Bytes': tamanho,
+        'Pontos': contar_pontos(fig),
+        'WebGL': webgl,
+        'Base64': suporta_arrays_binarios(),
+    }
+    with medir('serializacao_grafico', linhas=contar_pontos(fig), bytes_emitidos=tamanho):
+        st.plotly_chart(fig, **kwargs)
+    return tamanho
+
+
+def exibir_payloads():
+    """Mostra, num expander recolhido, o tamanho dos gráficos enviados nesta execução."""
+    payloads = st.session_state.get('payload_graficos', {})
+    if not payloads:
+        return
+    with st.expander("📦 Tamanho dos gráficos enviados", expanded=False):
+        df_payload = pd.DataFrame.from_dict(payloads, orient='index')
+        df_payload['KB'] = (df_payload['Bytes'] / 1024).round(1)
+        st.dataframe(df_payload, use_container_width=True)
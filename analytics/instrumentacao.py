@@ -0,0 +1,140 @@
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+# Ativa a instrumentação: HD_ANALYTICS_PERFIL=1 streamlit run main.py
+VARIAVEL_ATIVACAO = 'HD_ANALYTICS_PERFIL'
+VARIAVEL_LOG = 'HD_ANALYTICS_PERFIL_LOG'
+ARQUIVO_LOG_PADRAO = os.path.join('logs', 'perfil.jsonl')
+
+_trava_log = threading.Lock()
+
+
+def perfil_ativo():
+    """Indica se a variável de ambiente de instrumentação está ligada."""
+    return os.environ.get(VARIAVEL_ATIVACAO, '').strip().lower() not in ('', '0', 'false', 'nao', 'não')
+
+
+def _id_sessao():
+    """Identificador da sessão do Streamlit (ou 'local' fora do servidor)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else 'local'
+    except Exception:
+        return 'local'
+
+
+def _gravar_jsonl(registro):
+    """Acrescenta o registro ao log JSON lines para análise offline."""
+    caminho = os.environ.get(VARIAVEL_LOG, ARQUIVO_LOG_PADRAO)
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    linha = json.dumps(registro, ensure_ascii=False, default=str)
+    with _trava_log:
+        with open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha + '\n')
+
+
+def iniciar_execucao(pagina):
+    """Marca o início de um rerun da página; as fases seguintes são agrupadas nele."""
+    from analytics.memoria import contabilizar_sessao
+
+    contabilizar_sessao(pagina)
+    # O relatório de tamanho dos gráficos cobre só a execução atual
+    st.session_state['payload_graficos'] = {}
+    if not perfil_ativo():
+        return
+    st.session_state['perfil_pagina'] = pagina
+    st.session_state['perfil_execucao'] = uuid.uuid4().hex[:12]
+    st.session_state['perfil_fases'] = []
+
+
+@contextmanager
+def medir(fase, linhas=None, bytes_emitidos=None):
+    """
+    Cronometra um trecho da página.
+
+    O dicionário devolvido pode ser preenchido dentro do bloco com 'linhas' e
+    'bytes' quando esses valores só são conhecidos depois do processamento.
+    """
+    registro = {'linhas': linhas, 'bytes': bytes_emitidos}
+    if not perfil_ativo():
+        yield registro
+        return
+
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        duracao = (time.perf_counter() - inicio) * 1000
+        try:
+            pagina = st.session_state.get('perfil_pagina', '?')
+            execucao = st.session_state.get('perfil_execucao', '?')
+        except Exception:
+            pagina, execucao = '?', '?'
+
+        registro = {
+            'ts': time.time(),
+            'sessao': _id_sessao(),
+            'pagina': pagina,
+            'execucao': execucao,
+            'fase': fase,
+            'duracao_ms': round(duracao, 3),
+            'linhas': registro.get('linhas'),
+            'bytes': registro.get('bytes'),
+        }
+        try:
+            st.session_state.setdefault('perfil_fases', []).append(registro)
+        except Exception:
+            pass
+        _gravar_jsonl(registro)
+
+
+def cronometrado(fase):
+    """Decorador que mede a função; as linhas vêm do primeiro argumento DataFrame."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if not perfil_ativo():
+                return funcao(*args, **kwargs)
+            linhas = next((len(a) for a in args if isinstance(a, pd.DataFrame)), None)
+            with medir(fase, linhas=linhas):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+def exibir_diagnostico():
+    """Painel oculto com as fases do último rerun; só aparece com a instrumentação ligada."""
+    if not perfil_ativo():
+        return
+    fases = st.session_state.get('perfil_fases', [])
+    with st.sidebar.expander("🩺 Diagnóstico de desempenho", expanded=False):
+        if not fases:
+            st.caption("Nenhuma fase registrada neste rerun.")
+            return
+        df_fases = pd.DataFrame(fases)[['fase', 'duracao_ms', 'linhas', 'bytes']]
+        st.metric("Soma das fases", f"{df_fases['duracao_ms'].sum():.1f} ms")
+        st.dataframe(df_fases, hide_index=True, use_container_width=True)
+        st.caption(f"Log: {os.environ.get(VARIAVEL_LOG, ARQUIVO_LOG_PADRAO)}")
+
+        from analytics.memoria import resumo_sessoes, orcamento_bytes
+        sessoes = resumo_sessoes()
+        orcamento = orcamento_bytes()
+        st.caption(f"Memória retida pelas sessões: {sessoes['KB'].sum():.1f} KB"
+                   + (f" de {orcamento / 1024:.0f} KB" if orcamento else " (sem orçamento)"))
+        st.dataframe(sessoes, hide_index=True, use_container_width=True)
+
+        from analytics.persistencia import diretorio, estatisticas
+        if diretorio():
+            st.caption(f"Cache em disco: {diretorio()}")
+            st.dataframe(estatisticas(), hide_index=True, use_container_width=True)
@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import medir
+
+# Acima deste número de linhas o mapa de calor passa a mostrar faixas de alunos
+LIMITE_LINHAS = 60
+
+
+def agrupar_linhas(valores, rotulos, limite=LIMITE_LINHAS):
+    """
+    Ordena as linhas pela média e, se passarem do limite, agrupa em faixas.
+
+    Retorna um dicionário com a matriz z compacta, os rótulos do eixo y e as
+    posições (no DataFrame original) que compõem cada linha do mapa.
+    """
+    valores = np.asarray(valores, dtype=float)
+    rotulos = np.asarray(rotulos, dtype=object)
+
+    validos = ~np.isnan(valores)
+    contagem = validos.sum(axis=1)
+    soma = np.where(validos, valores, 0.0).sum(axis=1)
+    medias = np.divide(soma, contagem, out=np.full(len(valores), np.nan), where=contagem > 0)
+
+    # Ordem crescente: no Plotly a primeira linha fica embaixo, como no 'total ascending'
+    ordem = np.argsort(medias, kind='stable')
+    n = len(ordem)
+
+    if n <= limite:
+        return {
+            'z': valores[ordem],
+            'y': rotulos[ordem].tolist(),
+            'posicoes': [ordem[i:i + 1] for i in range(n)],
+            'agrupado': False,
+        }
+
+    tamanho = math.ceil(n / limite)
+    num_faixas = math.ceil(n / tamanho)
+    preenchido = np.full((num_faixas * tamanho, valores.shape[1]), np.nan)
+    preenchido[:n] = valores[ordem]
+    blocos = preenchido.reshape(num_faixas, tamanho, -1)
+
+    validos_bloco = ~np.isnan(blocos)
+    soma_bloco = np.where(validos_bloco, blocos, 0.0).sum(axis=1)
+    contagem_bloco = validos_bloco.sum(axis=1)
+    z = np.divide(soma_bloco, contagem_bloco, out=np.full(soma_bloco.shape, np.nan), where=contagem_bloco > 0)
+
+    posicoes = [ordem[i * tamanho:(i + 1) * tamanho] for i in range(num_faixas)]
+    rotulos_faixas = [
+        f"Faixa {i + 1}: {rotulos[p[0]]} – {rotulos[p[-1]]} ({len(p)})"
+        for i, p in enumerate(posicoes)
+    ]
+
+    return {
+        'z': z,
+        'y': rotulos_faixas,
+        'posicoes': posicoes,
+        'agrupado': True,
+    }
+
+
+def criar_mapa_calor(dados, rotulos_x, escala='Viridis', template='plotly_white',
+                     rotulo_cor='% Acertos', titulo=None, zmid=None):
+    """Cria o go.Heatmap a partir da matriz já agregada no servidor."""
+    fig = go.Figure(go.Heatmap(
+        z=dados['z'].astype(np.float32),
+        x=list(rotulos_x),
+        y=dados['y'],
+        colorscale=escala,
+        zmid=zmid,
+        colorbar=dict(title=rotulo_cor),
+        hovertemplate="<b>%{y}</b><br>%{x}<br>%{z:.1f}%<extra></extra>",
+    ))
+
+    fig.update_layout(
+        template=template,
+        title=titulo,
+        height=max(400, len(dados['y']) * 20),
+        yaxis={'type': 'category'},
+    )
+    return fig
+
+
+def renderizar_mapa_calor(df, coluna_rotulo, colunas, chave, rotulos_x=None,
+                          limite=LIMITE_LINHAS, **opcoes):
+    """
+    Exibe o mapa de calor, agregando em faixas as turmas grandes.
+
+    Quando há faixas, um seletor permite detalhar os alunos de uma delas.
+    """
+    rotulos_x = list(rotulos_x) if rotulos_x is not None else list(colunas)
+    with medir('agregacao_mapa_calor', linhas=len(df)):
+        valores = df[colunas].to_numpy(dtype=float, na_value=np.nan)
+        rotulos = df[coluna_rotulo].to_numpy()
+        dados = agrupar_linhas(valores, rotulos, limite)
+
+    if dados['agrupado']:
+        st.caption(f"{len(df)} alunos agrupados em {len(dados['y'])} faixas pela média de desempenho.")
+        faixa = st.selectbox(
+            "Detalhar faixa:",
+            options=["Visão geral"] + list(reversed(dados['y'])),
+            key=f"{chave}_faixa"
+        )
+        if faixa != "Visão geral":
+            posicoes = dados['posicoes'][dados['y'].index(faixa)]
+            dados = agrupar_linhas(valores[posicoes], rotulos[posicoes], limite)
+
+    with medir('figura_mapa_calor', linhas=len(dados['y'])):
+        fig = criar_mapa_calor(dados, rotulos_x, **opcoes)
+    plotly_chart_medido(fig, use_container_width=True, key=chave)
+    return dados
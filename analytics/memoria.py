@@ -0,0 +1,182 @@
+"""
+Dados compartilhados entre sessões e contabilidade de memória por sessão.
+
+O st.cache_data devolve uma cópia nova do resultado a cada chamada, então
+cada sessão (e cada rerun) carrega o seu próprio DataFrame. Com `compartilhado`
+o resultado fica guardado uma vez só (st.cache_resource) e as páginas recebem
+visões com Copy-on-Write do pandas: uma coluna só é copiada quando a página
+a altera.
+
+Para limitar a memória das sessões ociosas:
+
+    HD_ANALYTICS_MEMORIA_MB=512 streamlit run main.py
+"""
+import functools
+import os
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Orçamento (MB) da memória retida pelas sessões; vazio: sem limite
+VARIAVEL_ORCAMENTO = 'HD_ANALYTICS_MEMORIA_MB'
+# Sessões conectadas usadas há menos tempo que isso nunca são encerradas
+OCIOSIDADE_MINIMA_SEGUNDOS = 300
+
+# Visões entregues por `visao`, por id; saem sozinhas quando a visão é coletada
+_visoes = weakref.WeakValueDictionary()
+
+# Padrão a partir do pandas 3; no 2.x precisa ser ligado
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+def visao(objeto):
+    """
+    Visão Copy-on-Write de DataFrames e Series, também dentro de tuplas, listas
+    e dicionários. As visões ficam registradas para não entrarem na conta da sessão.
+    """
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        copia = objeto.copy(deep=False)
+        _visoes[id(copia)] = copia
+        return copia
+    if isinstance(objeto, dict):
+        return {chave: visao(valor) for chave, valor in objeto.items()}
+    if isinstance(objeto, (tuple, list)):
+        return type(objeto)(visao(valor) for valor in objeto)
+    return objeto
+
+
+def compartilhado(funcao=None, **opcoes):
+    """
+    Substitui o st.cache_data: guarda o resultado uma vez para todas as
+    sessões e entrega visões dele. Aceita as opções do st.cache_resource.
+    """
+    if funcao is None:
+        return lambda f: compartilhado(f, **opcoes)
+    em_cache = st.cache_resource(**opcoes)(funcao)
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        return visao(em_cache(*args, **kwargs))
+
+    envoltorio.clear = em_cache.clear
+    return envoltorio
+
+
+def tamanho(objeto):
+    """
+    Bytes que o objeto retém só para si (DataFrames com o conteúdo das
+    strings). Visões de dados compartilhados não contam: a memória é do cache.
+    """
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        if _visoes.get(id(objeto)) is objeto:
+            return 0
+        uso = objeto.memory_usage(deep=True, index=True)
+        return int(uso.sum() if isinstance(uso, pd.Series) else uso)
+    if isinstance(objeto, np.ndarray):
+        return objeto.nbytes
+    if isinstance(objeto, dict):
+        return sys.getsizeof(objeto) + sum(tamanho(v) for v in objeto.values())
+    if isinstance(objeto, (list, tuple, set)):
+        return sys.getsizeof(objeto) + sum(tamanho(v) for v in objeto)
+    return sys.getsizeof(objeto)
+
+
+@st.cache_resource
+def _registro():
+    """Bytes retidos e último uso de cada sessão: id -> {'bytes', 'ultimo_uso', 'pagina'}."""
+    return {'sessoes': {}, 'trava': threading.Lock()}
+
+
+def orcamento_bytes():
+    """Orçamento configurado em bytes, ou None sem limite."""
+    valor = os.environ.get(VARIAVEL_ORCAMENTO, '').strip()
+    return int(float(valor) * 1024 * 1024) if valor else None
+
+
+def contabilizar_sessao(pagina=None):
+    """
+    Registra a memória retida pela sessão atual (o session_state) e aplica o
+    orçamento. Chamada no início de cada rerun.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    retido = sum(tamanho(valor) for valor in st.session_state.to_dict().values())
+    registro = _registro()
+    with registro['trava']:
+        registro['sessoes'][ctx.session_id] = {'bytes': retido, 'ultimo_uso': time.time(), 'pagina': pagina}
+        _remover_encerradas(registro['sessoes'])
+    aplicar_orcamento(ctx.session_id)
+
+
+def _remover_encerradas(sessoes):
+    """Tira da contabilidade as sessões que o Streamlit já encerrou (com ou sem orçamento)."""
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return
+    gerenciador = getattr(Runtime.instance(), '_session_mgr', None)
+    if gerenciador is None:
+        return
+    for id_sessao in [i for i in sessoes if gerenciador.get_session_info(i) is None]:
+        del sessoes[id_sessao]
+
+
+def aplicar_orcamento(sessao_atual=None):
+    """
+    Encerra sessões ociosas até o total retido caber no orçamento.
+
+    Sessões desconectadas saem primeiro (o Streamlit as manteria até o TTL),
+    depois as conectadas ociosas há mais de OCIOSIDADE_MINIMA_SEGUNDOS, da mais
+    antiga para a mais recente; a sessão atual nunca é encerrada.
+    """
+    limite = orcamento_bytes()
+    if limite is None:
+        return []
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return []
+    runtime = Runtime.instance()
+    registro = _registro()
+    agora = time.time()
+    encerradas = []
+    with registro['trava']:
+        sessoes = registro['sessoes']
+        total = sum(s['bytes'] for s in sessoes.values())
+        ativas = {id_sessao: runtime.is_active_session(id_sessao) for id_sessao in sessoes}
+        candidatas = sorted(
+            (id_sessao for id_sessao, s in sessoes.items()
+             if id_sessao != sessao_atual
+             and (not ativas[id_sessao] or agora - s['ultimo_uso'] >= OCIOSIDADE_MINIMA_SEGUNDOS)),
+            key=lambda id_sessao: (ativas[id_sessao], sessoes[id_sessao]['ultimo_uso']),
+        )
+        for id_sessao in candidatas:
+            if total <= limite:
+                break
+            runtime.close_session(id_sessao)
+            total -= sessoes.pop(id_sessao)['bytes']
+            encerradas.append(id_sessao)
+    return encerradas
+
+
+def resumo_sessoes():
+    """Tabela com a memória retida por sessão, da maior para a menor."""
+    registro = _registro()
+    with registro['trava']:
+        sessoes = dict(registro['sessoes'])
+    agora = time.time()
+    tabela = pd.DataFrame([
+        {'Sessão': id_sessao[:8], 'Página': s['pagina'], 'KB': round(s['bytes'] / 1024, 1),
+         'Ociosa (s)': int(agora - s['ultimo_uso'])}
+        for id_sessao, s in sessoes.items()
+    ], columns=['Sessão', 'Página', 'KB', 'Ociosa (s)'])
+    return tabela.sort_values('KB', ascending=False, ignore_index=True)
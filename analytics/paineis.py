@@ -0,0 +1,36 @@
+"""
+Painéis preguiçosos: abas e páginas internas montadas só quando abertas.
+
+O st.tabs comum executa o conteúdo de todas as abas a cada rerun, embora o
+navegador mostre uma só. `abas_preguicosas` liga o estado das abas e indica
+qual está aberta; `conteudo_painel` guarda o que a aba (ou a página escolhida
+num radio/botão) montou, enquanto a versão dos dados for a mesma.
+
+    for sim, (aba, aberta) in zip(simulados, abas_preguicosas(simulados, chave='abas')):
+        if aberta:
+            with aba:
+                fig = conteudo_painel(f'grafico_{sim}', versao, lambda: montar(sim))
+"""
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+
+def abas_preguicosas(rotulos, chave):
+    """st.tabs que só executa a aba aberta: devolve pares (aba, aberta)."""
+    abas = st.tabs(rotulos, key=chave, on_change='rerun')
+    return [(aba, aba.open) for aba in abas]
+
+
+def conteudo_painel(chave, versao, construir):
+    """
+    Conteúdo pronto de um painel (figuras, tabelas estilizadas...), montado na
+    primeira abertura e reaproveitado enquanto `versao` não muda.
+    """
+    paineis = st.session_state.setdefault('paineis', {})
+    guardado = paineis.get(chave)
+    if guardado is None or guardado[0] != versao:
+        with medir('painel'):
+            guardado = (versao, construir())
+        paineis[chave] = guardado
+    return guardado[1]
@@ -0,0 +1,431 @@
+"""
+Cache persistente em disco, endereçado pelo conteúdo das entradas.
+
+O st.cache_data e o `compartilhado` vivem na memória do processo: cada deploy
+ou processo novo começa frio. Com `persistente`, o resultado de uma carga
+fica em disco, numa chave que é o hash da função (nome, código-fonte, arquivo
+que a define e os módulos do pacote analytics) e dos argumentos; arquivos passados como argumento entram pela data de
+modificação e tamanho. DataFrames são gravados em Parquet e o restante do
+resultado (listas, dicionários, arrays dos agregados) em pickle.
+
+O índice e as estatísticas ficam num SQLite na mesma pasta, então todos os
+processos do servidor na máquina compartilham as entradas e a contagem de
+acertos. Passado o limite de tamanho, as entradas usadas há mais tempo saem.
+
+    HD_ANALYTICS_CACHE=/var/cache/hd_analytics HD_ANALYTICS_CACHE_MB=1024 streamlit run main.py
+    python -m analytics.persistencia estatisticas
+    python -m analytics.persistencia limpar [--tudo]
+
+Com HD_ANALYTICS_CACHE=0 o cache em disco fica desligado.
+"""
+import argparse
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from analytics.armazenamento import RAIZ
+from analytics.instrumentacao import medir
+
+VARIAVEL_DIRETORIO = 'HD_ANALYTICS_CACHE'
+VARIAVEL_LIMITE = 'HD_ANALYTICS_CACHE_MB'
+DIRETORIO_PADRAO = os.path.join(RAIZ, 'cache')
+PASTA_PACOTE = os.path.dirname(os.path.abspath(__file__))
+LIMITE_PADRAO_MB = 512
+# Muda quando o layout das entradas muda; entradas antigas deixam de ser encontradas
+VERSAO_FORMATO = 1
+
+ARQUIVO_ESTRUTURA = 'estrutura.pkl'
+ARQUIVO_INDICE = 'indice.sqlite'
+# Pastas temporárias mais antigas que isso são de gravações interrompidas
+IDADE_TEMPORARIA_SEGUNDOS = 3600
+
+_local = threading.local()
+_log = logging.getLogger(__name__)
+
+
+def diretorio():
+    """Pasta do cache, ou None com o cache desligado."""
+    valor = os.environ.get(VARIAVEL_DIRETORIO, '').strip()
+    if valor.lower() in ('0', 'false', 'nao', 'não'):
+        return None
+    return valor or DIRETORIO_PADRAO
+
+
+def limite_bytes():
+    """Tamanho máximo do cache em bytes."""
+    valor = os.environ.get(VARIAVEL_LIMITE, '').strip()
+    return int(float(valor or LIMITE_PADRAO_MB) * 1024 * 1024)
+
+
+def _conexao(pasta):
+    """Conexão com o índice, uma por thread, processo e pasta (não pode atravessar um fork)."""
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    pasta_processo = (os.getpid(), pasta)
+    if pasta_processo not in conexoes:
+        os.makedirs(pasta, exist_ok=True)
+        conexao = sqlite3.connect(os.path.join(pasta, ARQUIVO_INDICE), timeout=30, isolation_level=None)
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.execute('PRAGMA synchronous=NORMAL')
+        conexao.execute(
+            'CREATE TABLE IF NOT EXISTS entradas ('
+            'chave TEXT PRIMARY KEY, funcao TEXT, bytes INTEGER, criada REAL, ultimo_uso REAL)'
+        )
+        conexao.execute(
+            'CREATE TABLE IF NOT EXISTS estatisticas ('
+            'funcao TEXT PRIMARY KEY, acertos INTEGER DEFAULT 0, faltas INTEGER DEFAULT 0, erros INTEGER DEFAULT 0)'
+        )
+        conexoes[pasta_processo] = conexao
+    return conexoes[pasta_processo]
+
+
+def _contar(conexao, funcao, coluna):
+    conexao.execute(
+        f'INSERT INTO estatisticas (funcao, {coluna}) VALUES (?, 1) '
+        f'ON CONFLICT(funcao) DO UPDATE SET {coluna} = {coluna} + 1',
+        (funcao,)
+    )
+
+
+def _contabilizar(operacao, *args):
+    """
+    Escrita no índice ou nas estatísticas. É só contabilidade: se falhar
+    (índice travado, somente leitura, disco cheio), fica no log e a carga segue.
+    """
+    try:
+        operacao(*args)
+    except Exception:
+        _log.warning("Falha ao atualizar o índice do cache em disco", exc_info=True)
+
+
+def _hash_arquivo(caminho):
+    with open(caminho, 'rb') as entrada:
+        return hashlib.sha256(entrada.read()).hexdigest()
+
+
+def versao_pacote():
+    """Hash de todos os módulos do pacote analytics."""
+    arquivos = sorted(nome for nome in os.listdir(PASTA_PACOTE) if nome.endswith('.py'))
+    return hashlib.sha256(
+        ''.join(nome + _hash_arquivo(os.path.join(PASTA_PACOTE, nome)) for nome in arquivos).encode()
+    ).hexdigest()
+
+
+def versao_codigo(funcao):
+    """
+    Hash do código: a função, o módulo que a define e o pacote analytics.
+    A função depende do que chama (funções auxiliares, constantes como
+    LIMITES_DESEMPENHO), então alterar qualquer um deles invalida as entradas.
+    """
+    try:
+        fonte = inspect.getsource(funcao).encode()
+    except (OSError, TypeError):
+        fonte = funcao.__code__.co_code
+    try:
+        modulo = _hash_arquivo(inspect.getsourcefile(funcao)).encode()
+    except (OSError, TypeError):
+        modulo = b''
+    return hashlib.sha256(fonte + modulo + versao_pacote().encode()).hexdigest()[:16]
+
+
+def _ficha(valor):
+    """Representação estável de um argumento para a chave."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        colunas = valor.columns if isinstance(valor, pd.DataFrame) else [valor.name]
+        return ('tabela', valor.shape, tuple(map(str, colunas)),
+                int(pd.util.hash_pandas_object(valor, index=True).sum()))
+    if isinstance(valor, str) and os.path.isfile(valor):
+        info = os.stat(valor)
+        return ('arquivo', os.path.abspath(valor), info.st_mtime_ns, info.st_size)
+    if isinstance(valor, (list, tuple)):
+        return tuple(_ficha(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((str(k), _ficha(v)) for k, v in valor.items()))
+    return repr(valor)
+
+
+def chave(nome, codigo, args, kwargs):
+    """Chave da chamada: nome da função, versão do código e argumentos."""
+    conteudo = (
+        VERSAO_FORMATO, nome, codigo,
+        tuple(_ficha(a) for a in args), tuple(sorted((k, _ficha(v)) for k, v in kwargs.items())),
+    )
+    return hashlib.sha256(repr(conteudo).encode()).hexdigest()
+
+
+def _caminho(pasta, chave_entrada):
+    return os.path.join(pasta, chave_entrada[:2], chave_entrada)
+
+
+def _separar(valor, tabelas):
+    """Troca os DataFrames do resultado por marcadores; eles vão para Parquet."""
+    if isinstance(valor, pd.DataFrame):
+        tabelas.append(valor)
+        return ('__tabela__', len(tabelas) - 1)
+    if isinstance(valor, tuple):
+        return ('__tupla__', [_separar(v, tabelas) for v in valor])
+    if isinstance(valor, list):
+        return [_separar(v, tabelas) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _separar(v, tabelas) for k, v in valor.items()}
+    return valor
+
+
+def _juntar(estrutura, tabelas):
+    if isinstance(estrutura, tuple) and len(estrutura) == 2 and estrutura[0] == '__tabela__':
+        return tabelas[estrutura[1]]
+    if isinstance(estrutura, tuple) and len(estrutura) == 2 and estrutura[0] == '__tupla__':
+        return tuple(_juntar(v, tabelas) for v in estrutura[1])
+    if isinstance(estrutura, list):
+        return [_juntar(v, tabelas) for v in estrutura]
+    if isinstance(estrutura, dict):
+        return {k: _juntar(v, tabelas) for k, v in estrutura.items()}
+    return estrutura
+
+
+def _gravar(destino, valor):
+    """
+    Grava a entrada numa pasta temporária e a renomeia para o destino, de
+    modo que outro processo nunca leia uma entrada pela metade. Devolve os bytes gravados.
+    """
+    temporaria = f"{destino}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(temporaria)
+    try:
+        tabelas = []
+        estrutura = _separar(valor, tabelas)
+        for i, tabela in enumerate(tabelas):
+            arquivo = os.path.join(temporaria, f"tabela_{i}.parquet")
+            try:
+                tabela.to_parquet(arquivo, index=True)
+            except Exception:
+                # Colunas que o Arrow não representa (tipos misturados, nomes não textuais)
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
+                with open(arquivo + '.pkl', 'wb') as saida:
+                    pickle.dump(tabela, saida, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(temporaria, ARQUIVO_ESTRUTURA), 'wb') as saida:
+            pickle.dump((len(tabelas), estrutura), saida, protocol=pickle.HIGHEST_PROTOCOL)
+        tamanho = sum(os.path.getsize(os.path.join(temporaria, nome)) for nome in os.listdir(temporaria))
+        try:
+            os.rename(temporaria, destino)
+        except OSError:
+            # Outro processo gravou a mesma entrada antes
+            shutil.rmtree(temporaria, ignore_errors=True)
+        return tamanho
+    except BaseException:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        raise
+
+
+def _ler(origem):
+    with open(os.path.join(origem, ARQUIVO_ESTRUTURA), 'rb') as entrada:
+        quantidade, estrutura = pickle.load(entrada)
+    tabelas = []
+    for i in range(quantidade):
+        arquivo = os.path.join(origem, f"tabela_{i}.parquet")
+        if os.path.exists(arquivo):
+            tabelas.append(pd.read_parquet(arquivo))
+        else:
+            with open(arquivo + '.pkl', 'rb') as entrada:
+                tabelas.append(pickle.load(entrada))
+    return _juntar(estrutura, tabelas)
+
+
+def _descartar(destino):
+    """Remove a entrada; renomeia antes para que leitores em curso vejam uma falta, não meia pasta."""
+    lixo = f"{destino}.{uuid.uuid4().hex}.lixo"
+    try:
+        os.rename(destino, lixo)
+    except OSError:
+        return
+    shutil.rmtree(lixo, ignore_errors=True)
+
+
+def aplicar_limite(pasta=None, limite=None):
+    """Remove as entradas usadas há mais tempo até o cache caber no limite; devolve quantas saíram."""
+    pasta = pasta or diretorio()
+    if pasta is None:
+        return 0
+    limite = limite_bytes() if limite is None else limite
+    conexao = _conexao(pasta)
+    total = conexao.execute('SELECT COALESCE(SUM(bytes), 0) FROM entradas').fetchone()[0]
+    if total <= limite:
+        return 0
+    removidas = 0
+    conexao.execute('BEGIN IMMEDIATE')
+    try:
+        for chave_entrada, tamanho in conexao.execute('SELECT chave, bytes FROM entradas ORDER BY ultimo_uso').fetchall():
+            if total <= limite:
+                break
+            _descartar(_caminho(pasta, chave_entrada))
+            conexao.execute('DELETE FROM entradas WHERE chave = ?', (chave_entrada,))
+            total -= tamanho
+            removidas += 1
+        conexao.execute('COMMIT')
+    except BaseException:
+        conexao.execute('ROLLBACK')
+        raise
+    return removidas
+
+
+def persistente(funcao):
+    """
+    Decorador do cache em disco. Usado por baixo do `compartilhado`, que
+    continua sendo o primeiro nível (memória):
+
+        @compartilhado
+        @persistente
+        def carregar_dados(caminho): ...
+
+    Resultados None não são guardados (as cargas devolvem None quando falham).
+    Falhas do cache nunca impedem a carga: a função é executada normalmente.
+    """
+    nome = f"{funcao.__module__}.{funcao.__qualname__}"
+    codigo = versao_codigo(funcao)
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        pasta = diretorio()
+        if pasta is None:
+            return funcao(*args, **kwargs)
+        try:
+            chave_entrada = chave(nome, codigo, args, kwargs)
+            destino = _caminho(pasta, chave_entrada)
+            conexao = _conexao(pasta)
+        except Exception:
+            return funcao(*args, **kwargs)
+
+        if os.path.isdir(destino):
+            try:
+                with medir('cache_disco') as registro:
+                    valor = _ler(destino)
+                    registro['linhas'] = sum(len(t) for t in _tabelas(valor))
+            except Exception:
+                # Entrada corrompida ou removida durante a leitura: refaz
+                _descartar(destino)
+                _contabilizar(_contar, conexao, nome, 'erros')
+            else:
+                # A entrada lida é válida mesmo que a contabilidade falhe
+                _contabilizar(conexao.execute, 'UPDATE entradas SET ultimo_uso = ? WHERE chave = ?',
+                              (time.time(), chave_entrada))
+                _contabilizar(_contar, conexao, nome, 'acertos')
+                return valor
+
+        valor = funcao(*args, **kwargs)
+        _contabilizar(_contar, conexao, nome, 'faltas')
+        if valor is None:
+            return valor
+        try:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            tamanho = _gravar(destino, valor)
+        except Exception:
+            _contabilizar(_contar, conexao, nome, 'erros')
+            return valor
+        agora = time.time()
+        _contabilizar(
+            conexao.execute,
+            'INSERT OR REPLACE INTO entradas (chave, funcao, bytes, criada, ultimo_uso) VALUES (?, ?, ?, ?, ?)',
+            (chave_entrada, nome, tamanho, agora, agora)
+        )
+        _contabilizar(aplicar_limite, pasta)
+        return valor
+
+    return envoltorio
+
+
+def _tabelas(valor):
+    tabelas = []
+    _separar(valor, tabelas)
+    return tabelas
+
+
+def estatisticas(pasta=None):
+    """Acertos, faltas, taxa de acerto, entradas e tamanho por função."""
+    pasta = pasta or diretorio()
+    colunas = ['Função', 'Acertos', 'Faltas', 'Erros', 'Taxa de acerto (%)', 'Entradas', 'MB']
+    if pasta is None or not os.path.exists(os.path.join(pasta, ARQUIVO_INDICE)):
+        return pd.DataFrame(columns=colunas)
+    conexao = _conexao(pasta)
+    contagens = pd.read_sql_query('SELECT funcao, acertos, faltas, erros FROM estatisticas', conexao)
+    entradas = pd.read_sql_query(
+        'SELECT funcao, COUNT(*) AS entradas, SUM(bytes) AS bytes FROM entradas GROUP BY funcao', conexao
+    )
+    tabela = contagens.merge(entradas, on='funcao', how='outer').fillna(0)
+    consultas = tabela['acertos'] + tabela['faltas']
+    return pd.DataFrame({
+        'Função': tabela['funcao'],
+        'Acertos': tabela['acertos'].astype(int),
+        'Faltas': tabela['faltas'].astype(int),
+        'Erros': tabela['erros'].astype(int),
+        'Taxa de acerto (%)': (100 * tabela['acertos'] / consultas.where(consultas > 0)).round(1),
+        'Entradas': tabela['entradas'].astype(int),
+        'MB': (tabela['bytes'] / 1024 / 1024).round(2),
+    }, columns=colunas)
+
+
+def limpar(pasta=None, tudo=False):
+    """
+    Remove pastas temporárias e órfãs, entradas do índice sem arquivos e
+    aplica o limite de tamanho. Com `tudo`, esvazia o cache e zera as estatísticas.
+    """
+    pasta = pasta or diretorio()
+    if pasta is None or not os.path.isdir(pasta):
+        return 0
+    conexao = _conexao(pasta)
+    if tudo:
+        conexao.execute('DELETE FROM entradas')
+        conexao.execute('DELETE FROM estatisticas')
+    conhecidas = {linha[0] for linha in conexao.execute('SELECT chave FROM entradas')}
+    removidas = 0
+    for prefixo in os.listdir(pasta):
+        subpasta = os.path.join(pasta, prefixo)
+        if not os.path.isdir(subpasta):
+            continue
+        for nome in os.listdir(subpasta):
+            caminho = os.path.join(subpasta, nome)
+            # Gravações em curso de outros processos ainda não estão no índice
+            recente = time.time() - os.path.getmtime(caminho) < IDADE_TEMPORARIA_SEGUNDOS
+            if nome not in conhecidas and not (nome.endswith('.tmp') and recente):
+                shutil.rmtree(caminho, ignore_errors=True)
+                removidas += 1
+        try:
+            os.rmdir(subpasta)
+        except OSError:
+            pass  # ainda tem entradas
+    for chave_entrada in conhecidas:
+        if not os.path.isdir(_caminho(pasta, chave_entrada)):
+            conexao.execute('DELETE FROM entradas WHERE chave = ?', (chave_entrada,))
+    return removidas + aplicar_limite(pasta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cache persistente das cargas do HD Analytics.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    subcomandos.add_parser('estatisticas', help="acertos, faltas e tamanho por função")
+    limpeza = subcomandos.add_parser('limpar', help="remove órfãos e aplica o limite de tamanho")
+    limpeza.add_argument('--tudo', action='store_true', help="esvazia o cache")
+    args = parser.parse_args(argv)
+
+    if diretorio() is None:
+        print(f"Cache em disco desligado ({VARIAVEL_DIRETORIO}=0).")
+        return
+    if args.comando == 'estatisticas':
+        print(f"Cache: {diretorio()} (limite {limite_bytes() / 1024 / 1024:.0f} MB)")
+        print(estatisticas().to_string(index=False))
+    else:
+        print(f"{limpar(tudo=args.tudo)} entradas removidas de {diretorio()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Índices de ranking mantidos de forma incremental, por (escopo, métrica).
+
+Cada índice guarda os alunos em ordem decrescente de nota numa lista
+ordenada (bisect) e as notas distintas, para o ranking denso. Quando a página
+passa as notas de novo, só os alunos cuja nota mudou saem e voltam para a
+lista; top-k, posição, percentil e faixas de nota são buscas binárias, sem
+ordenar a turma a cada rerun.
+
+O índice vivo é compartilhado pelas sessões e só é tocado sob a trava; as
+consultas recebem um instantâneo imutável dele, refeito quando ele muda.
+
+    indice = indice_ranking((escola, ano), 'Média Aluno', df['Média Aluno'], versao=versao_dados)
+    top_alunos = df.loc[top(indice, 5)]
+
+As chaves são os rótulos do índice do DataFrame (precisam ser comparáveis
+entre si, como o RangeIndex do read_csv); notas ausentes ficam fora do ranking.
+"""
+import bisect
+import math
+import threading
+from types import MappingProxyType
+
+import pandas as pd
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+
+def _vazio():
+    return {'ordem': [], 'notas': {}, 'distintas': [], 'contagem': {}, 'versao': 0, 'instantaneo': None}
+
+
+def remover(indice, chave):
+    """Tira um aluno do índice."""
+    nota = indice['notas'].pop(chave)
+    ordem = indice['ordem']
+    del ordem[bisect.bisect_left(ordem, (-nota, chave))]
+    indice['contagem'][nota] -= 1
+    if not indice['contagem'][nota]:
+        del indice['contagem'][nota]
+        distintas = indice['distintas']
+        del distintas[bisect.bisect_left(distintas, -nota)]
+    indice['versao'] += 1
+
+
+def inserir(indice, chave, nota):
+    """Inclui um aluno ou atualiza a sua nota; a posição é achada por busca binária."""
+    atual = indice['notas'].get(chave)
+    if atual == nota:
+        return
+    if atual is not None:
+        remover(indice, chave)
+    bisect.insort(indice['ordem'], (-nota, chave))
+    indice['notas'][chave] = nota
+    contagem = indice['contagem'].get(nota, 0)
+    if not contagem:
+        bisect.insort(indice['distintas'], -nota)
+    indice['contagem'][nota] = contagem + 1
+    indice['versao'] += 1
+
+
+def sincronizar(indice, notas):
+    """Aplica ao índice só as diferenças em relação à Series `notas`; devolve quantos alunos mudaram."""
+    notas = notas.dropna()
+    novas = dict(zip(notas.index.tolist(), notas.astype(float).tolist()))
+    atuais = indice['notas']
+    saidas = [chave for chave in atuais if chave not in novas]
+    alteradas = [(chave, nota) for chave, nota in novas.items() if atuais.get(chave) != nota]
+    for chave in saidas:
+        remover(indice, chave)
+    for chave, nota in alteradas:
+        inserir(indice, chave, nota)
+    return len(saidas) + len(alteradas)
+
+
+@st.cache_resource
+def _indices():
+    """Índices de todas as sessões: (escopo, métrica) -> índice."""
+    return {'trava': threading.Lock(), 'indices': {}}
+
+
+def _instantaneo(indice):
+    """Cópia somente leitura do índice na versão atual; as consultas usam só ela."""
+    guardado = indice['instantaneo']
+    if guardado is None or guardado['versao'] != indice['versao']:
+        guardado = indice['instantaneo'] = {
+            'ordem': tuple(indice['ordem']),
+            'notas': MappingProxyType(dict(indice['notas'])),
+            'distintas': tuple(indice['distintas']),
+            'versao': indice['versao'],
+            'posicoes': {},
+        }
+    return guardado
+
+
+def indice_ranking(escopo, metrica, notas, versao=None):
+    """
+    Instantâneo do índice de `metrica` no `escopo` (ex.: escola, ano e turma), em dia com `notas`.
+
+    `versao` é a ficha que a página já tem dos dados (ex.: a versão dos
+    arquivos): com ela, a mesma versão não percorre as notas de novo. Sem ela,
+    as notas são identificadas por um hash da Series, que custa O(n).
+    Se os dados são os mesmos da última chamada, nada é refeito; senão só os
+    alunos que mudaram são reposicionados. A sincronização e a cópia são
+    feitas sob a trava; o instantâneo devolvido não muda depois.
+    """
+    if versao is not None:
+        ficha = ('versao', versao)
+    else:
+        ficha = (len(notas), int(pd.util.hash_pandas_object(notas, index=True).sum()))
+    registro = _indices()
+    with registro['trava']:
+        indice = registro['indices'].setdefault((escopo, metrica), _vazio())
+        if indice.get('ficha') != ficha:
+            with medir('ranking_indice') as registro_medicao:
+                registro_medicao['linhas'] = sincronizar(indice, notas)
+            indice['ficha'] = ficha
+        return _instantaneo(indice)
+
+
+def top(indice, k):
+    """Chaves dos k maiores, em ordem decrescente (empates pela chave, como no nlargest)."""
+    return [chave for _, chave in indice['ordem'][:k]]
+
+
+def _maiores(indice, nota):
+    """Quantos alunos têm nota estritamente maior."""
+    return bisect.bisect_left(indice['ordem'], (-nota,))
+
+
+def posicao(indice, chave, denso=False):
+    """Posição do aluno: com empates 1, 2, 2, 4 (method='min') ou, densa, 1, 2, 2, 3."""
+    nota = indice['notas'][chave]
+    if denso:
+        return bisect.bisect_left(indice['distintas'], -nota) + 1
+    return _maiores(indice, nota) + 1
+
+
+def posicoes(indice, denso=False):
+    """Posição de todos os alunos, na ordem do ranking (guardada no instantâneo)."""
+    guardadas = indice['posicoes']
+    if denso in guardadas:
+        return guardadas[denso]
+    chaves, valores = [], []
+    anterior, atual = None, 0
+    for i, (negativa, chave) in enumerate(indice['ordem']):
+        if negativa != anterior:
+            atual = atual + 1 if denso else i + 1
+            anterior = negativa
+        chaves.append(chave)
+        valores.append(atual)
+    serie = pd.Series(valores, index=chaves, dtype=int)
+    with _indices()['trava']:
+        return guardadas.setdefault(denso, serie)
+
+
+def percentil(indice, chave):
+    """Porcentagem dos alunos com nota menor ou igual à do aluno."""
+    n = len(indice['ordem'])
+    return 100 * (n - _maiores(indice, indice['notas'][chave])) / n
+
+
+def entre_notas(indice, minima, maxima):
+    """Chaves dos alunos com nota entre `minima` e `maxima` (inclusive), da maior para a menor."""
+    ordem = indice['ordem']
+    inicio = bisect.bisect_left(ordem, (-maxima,))
+    fim = bisect.bisect_left(ordem, (math.nextafter(-minima, math.inf),))
+    return [chave for _, chave in ordem[inicio:fim]]
+
+
+def entre_percentis(indice, inferior, superior):
+    """Chaves dos alunos com percentil entre `inferior` e `superior` (inclusive), da maior nota para a menor."""
+    distintas = indice['distintas']
+    n = len(indice['ordem'])
+    if not n:
+        return []
+
+    # O percentil cai ao longo das notas distintas: duas buscas binárias acham a faixa
+    def percentil_negativo(j):
+        return -100 * (n - _maiores(indice, -distintas[j])) / n
+
+    faixa = range(len(distintas))
+    primeira = bisect.bisect_left(faixa, -superior, key=percentil_negativo)
+    ultima = bisect.bisect_right(faixa, -inferior, key=percentil_negativo)
+    if primeira >= ultima:
+        return []
+    return entre_notas(indice, -distintas[ultima - 1], -distintas[primeira])
@@ -0,0 +1,127 @@
+"""
+Recomendação de reforço por aluno: os descritores (ou habilidades) a retomar.
+
+Todos os pares aluno x item são pontuados de uma vez, em matrizes:
+
+- erros do próprio aluno no item (1 - domínio);
+- dificuldade do item na turma do aluno (erro médio da turma);
+- pré-requisitos: um item pesa mais quando o aluno também erra os itens que
+  dependem dele, porque retomá-lo destrava os demais.
+
+As listas com os N primeiros itens de cada aluno são montadas junto com os
+dados em cache (uma vez por snapshot); as telas individuais só as leem.
+"""
+import numpy as np
+import pandas as pd
+
+# Peso de cada componente (todos entre 0 e 1) na pontuação de recomendação
+PESOS_RECOMENDACAO = {
+    'erros': 0.6,
+    'dificuldade': 0.2,
+    'pre_requisitos': 0.2,
+}
+
+# Itens guardados por aluno
+TOP_N = 5
+
+# Item -> itens que precisam estar consolidados antes dele, por componente.
+# Matriz de referência SAEB de Matemática do 9º ano: números e operações
+# antes dos problemas, figuras antes de medidas, expressões antes das equações.
+PRE_REQUISITOS = {
+    'Matematica': {
+        'D03': ['D02'],
+        'D04': ['D02'],
+        'D08': ['D03', 'D04', 'D06'],
+        'D10': ['D03'],
+        'D12': ['D04', 'D15'],
+        'D13': ['D05', 'D12'],
+        'D14': ['D13'],
+        'D17': ['D16', 'D21'],
+        'D18': ['D16'],
+        'D20': ['D18', 'D19'],
+        'D22': ['D21'],
+        'D23': ['D22'],
+        'D25': ['D18', 'D23', 'D24'],
+        'D26': ['D19', 'D25'],
+        'D27': ['D25'],
+        'D28': ['D21', 'D26'],
+        'D29': ['D26'],
+        'D30': ['D18', 'D25'],
+        'D31': ['D30'],
+        'D32': ['D30'],
+        'D33': ['D30'],
+        'D34': ['D33'],
+        'D35': ['D09', 'D34'],
+        'D36': ['D37'],
+    },
+}
+
+
+def matriz_pre_requisitos(itens, pre_requisitos):
+    """P[a, b] = 1 quando o item a é pré-requisito do item b (só itens presentes)."""
+    posicao = {item: i for i, item in enumerate(itens)}
+    matriz = np.zeros((len(itens), len(itens)), dtype=np.float32)
+    for item, requisitos in (pre_requisitos or {}).items():
+        if item not in posicao:
+            continue
+        for requisito in requisitos:
+            if requisito in posicao:
+                matriz[posicao[requisito], posicao[item]] = 1
+    return matriz
+
+
+def recomendar(dominio, alunos, itens, turmas=None, pre_requisitos=None, n=TOP_N, pesos=PESOS_RECOMENDACAO):
+    """
+    Lista de reforço de cada aluno.
+
+    `dominio` é a matriz alunos x itens com o domínio entre 0 e 1 (NaN: item
+    sem resposta do aluno, fora das recomendações). Devolve um DataFrame
+    indexado pelo aluno com até `n` linhas por aluno (Posição, Item,
+    Pontuação, Erros (%), Dificuldade da turma (%), Pré-requisito de), do item
+    mais urgente para o menos.
+    """
+    dominio = np.asarray(dominio, dtype=np.float32)
+    avaliado = ~np.isnan(dominio)
+    erro = np.where(avaliado, 1 - np.nan_to_num(dominio), 0).astype(np.float32)
+
+    # Dificuldade por turma: erro médio dos alunos da turma que fizeram o item
+    codigos = pd.factorize(pd.Series(turmas if turmas is not None else np.zeros(len(alunos))), use_na_sentinel=False)[0]
+    membros = np.zeros((len(alunos), codigos.max() + 1 if len(codigos) else 0), dtype=np.float32)
+    membros[np.arange(len(alunos)), codigos] = 1
+    dificuldade_turma = (membros.T @ erro) / np.maximum(membros.T @ avaliado.astype(np.float32), 1)
+    dificuldade = dificuldade_turma[codigos]
+
+    # Erro médio do aluno nos itens que dependem de cada item
+    dependencias = matriz_pre_requisitos(itens, pre_requisitos)
+    desbloqueio = (erro @ dependencias.T) / np.maximum(dependencias.sum(axis=1), 1)
+
+    pontuacao = (pesos['erros'] * erro + pesos['dificuldade'] * dificuldade
+                 + pesos['pre_requisitos'] * desbloqueio)
+    candidatos = avaliado & (erro > 0)
+    pontuacao = np.where(candidatos, pontuacao, -np.inf)
+    ordem = np.argsort(-pontuacao, axis=1, kind='stable')[:, :n]
+
+    # Pares (aluno, item) escolhidos, já na ordem de cada aluno
+    alunos_escolhidos, posicoes = np.nonzero(np.take_along_axis(candidatos, ordem, axis=1))
+    itens_escolhidos = ordem[alunos_escolhidos, posicoes]
+    nomes_itens = np.asarray(itens, dtype=object)
+    # Itens que a retomada destrava: só para os itens que são pré-requisito de algum outro
+    tem_dependentes = dependencias.any(axis=1)
+    destravados = [', '.join(nomes_itens[np.flatnonzero(dependencias[j] * erro[i])]) if tem_dependentes[j] else ''
+                   for i, j in zip(alunos_escolhidos, itens_escolhidos)]
+    return pd.DataFrame({
+        'Posição': posicoes + 1,
+        'Item': nomes_itens[itens_escolhidos],
+        'Pontuação': pontuacao[alunos_escolhidos, itens_escolhidos].astype(float).round(3),
+        'Erros (%)': (100 * erro[alunos_escolhidos, itens_escolhidos].astype(float)).round(1),
+        'Dificuldade da turma (%)': (100 * dificuldade[alunos_escolhidos, itens_escolhidos].astype(float)).round(1),
+        'Pré-requisito de': destravados,
+    }, index=pd.Index(np.asarray(alunos, dtype=object)[alunos_escolhidos], name='Aluno'))
+
+
+def tabela_recomendacoes(recomendacoes, aluno, descricoes=None, rotulo='Item'):
+    """Lista guardada do aluno, pronta para exibição (vazia se não há o que retomar)."""
+    tabela = recomendacoes[recomendacoes.index == aluno].reset_index(drop=True)
+    if descricoes is not None:
+        tabela.insert(2, 'Descrição', tabela['Item'].map(lambda item: descricoes.get(item.strip(), 'N/A')))
+    return tabela.rename(columns={'Item': rotulo})
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from analytics.instrumentacao import medir
+from analytics.memoria import compartilhado
+from analytics.recomendacao import PRE_REQUISITOS, recomendar
+
+COLUNAS_CHAVE = ['Aluno', 'Componentes', 'Simulados']
+
+
+def colunas_descritores(df):
+    """Colunas D01, D02, ... presentes na planilha."""
+    return [c for c in df.columns if c.startswith('D') and c[1:].isdigit()]
+
+
+@compartilhado
+def construir_respostas(df):
+    """
+    Guarda as respostas como matrizes CSR (linha da planilha x descritor).
+
+    Só as células respondidas são armazenadas: `respostas` traz o 0/1 de cada
+    uma (zeros explícitos incluídos) e `respondidas` marca a presença. A lista de
+    descritores de cada simulado sai das colunas respondidas por qualquer aluno
+    do simulado, não de uma linha específica. `recomendacoes` traz, por
+    componente, a lista de descritores a reforçar de cada aluno.
+    """
+    itens = colunas_descritores(df)
+    with medir('matriz_esparsa', linhas=len(df)) as registro:
+        valores = df[itens].to_numpy(dtype=float, na_value=np.nan)
+        linhas, colunas = np.nonzero(~np.isnan(valores))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(linhas, minlength=len(df)))])
+
+        forma = (len(df), len(itens))
+        respostas = sparse.csr_matrix((valores[linhas, colunas].astype(np.int8), colunas, indptr), shape=forma)
+        respondidas = sparse.csr_matrix((np.ones(len(colunas), dtype=np.int8), colunas, indptr), shape=forma)
+        registro['bytes'] = respostas.data.nbytes + respostas.indices.nbytes + respostas.indptr.nbytes
+
+        chaves = df[COLUNAS_CHAVE].reset_index(drop=True)
+        itens_por_simulado = {}
+        for (componente, simulado), grupo in chaves.groupby(['Componentes', 'Simulados'], sort=False):
+            cobertos = np.unique(respondidas[grupo.index.to_numpy()].indices)
+            itens_por_simulado[(componente, simulado)] = [itens[i] for i in cobertos]
+
+    with medir('recomendacoes', linhas=len(df)):
+        recomendacoes = {}
+        for componente in chaves['Componentes'].unique():
+            alunos, dominio = dominio_por_aluno(respostas, respondidas, chaves, componente)
+            recomendacoes[componente] = recomendar(dominio, alunos, itens, pre_requisitos=PRE_REQUISITOS.get(componente))
+
+    return {
+        'respostas': respostas,
+        'respondidas': respondidas,
+        'itens': itens,
+        'chaves': chaves,
+        'itens_por_simulado': itens_por_simulado,
+        'recomendacoes': recomendacoes,
+    }
+
+
+def dominio_por_aluno(respostas, respondidas, chaves, componente):
+    """
+    Acertos sobre respondidas de cada aluno em cada descritor, somando todos os
+    simulados do componente (NaN: descritor nunca respondido pelo aluno).
+    """
+    linhas = np.flatnonzero((chaves['Componentes'] == componente).to_numpy())
+    codigos, alunos = pd.factorize(chaves['Aluno'].to_numpy()[linhas])
+    # Soma das linhas de cada aluno como um produto esparso (aluno x linha da planilha)
+    agrupador = sparse.csr_matrix((np.ones(len(linhas)), (codigos, linhas)), shape=(len(alunos), len(chaves)))
+    acertos = (agrupador @ respostas).toarray()
+    feitas = (agrupador @ respondidas).toarray()
+    dominio = np.full(acertos.shape, np.nan)
+    np.divide(acertos, feitas, out=dominio, where=feitas > 0)
+    return list(alunos), dominio
+
+
+def selecionar_linhas(base, simulado, componente):
+    """Posições das linhas de um simulado e componente."""
+    chaves = base['chaves']
+    return np.flatnonzero((chaves['Simulados'] == simulado).to_numpy() & (chaves['Componentes'] == componente).to_numpy())
+
+
+def agregar_alunos(base, linhas, num_itens):
+    """
+    Acertos e percentual de cada aluno, somando só as células armazenadas.
+
+    O percentual usa o total de descritores do simulado, como nas páginas:
+    descritor sem resposta conta como erro.
+    """
+    acertos = np.asarray(base['respostas'][linhas].sum(axis=1)).ravel()
+    respondidas = np.asarray(base['respondidas'][linhas].sum(axis=1)).ravel()
+    return pd.DataFrame({
+        'Nomes': base['chaves']['Aluno'].to_numpy()[linhas],
+        'Acertos': acertos,
+        'Respondidas': respondidas,
+        'Porcentagem': acertos / num_itens * 100 if num_itens else np.zeros(len(linhas)),
+    })
+
+
+def agregar_descritores(base, linhas, itens):
+    """Acertos e percentual (sobre os alunos do simulado) de cada descritor avaliado."""
+    posicoes = [base['itens'].index(i) for i in itens]
+    acertos = np.asarray(base['respostas'][linhas][:, posicoes].sum(axis=0)).ravel()
+    respondidas = np.asarray(base['respondidas'][linhas][:, posicoes].sum(axis=0)).ravel()
+    return pd.DataFrame({
+        'Descritor': list(itens),
+        'Acertos': acertos,
+        'Respondidas': respondidas,
+        'Porcentagem': acertos / len(linhas) * 100 if len(linhas) else np.zeros(len(itens)),
+    })
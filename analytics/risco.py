@@ -0,0 +1,173 @@
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+META = 6
+JANELA_RECENTE = 3
+CHAVES_ALUNO = ['Aluno', 'Turma', 'Componente']
+
+# Peso de cada componente (já normalizado entre 0 e 1) no índice de risco
+PESOS_RISCO = {
+    'distancia_meta': 0.40,
+    'zeros': 0.25,
+    'queda': 0.20,
+    'volatilidade': 0.15,
+}
+
+# Índice >= 60: risco alto; >= 35: médio
+LIMITES_RISCO = [35, 60]
+ROTULOS_RISCO = ['Baixo', 'Médio', 'Alto']
+
+
+def colunas_simulados(df):
+    """Colunas Sim1..SimN na ordem numérica."""
+    colunas = [c for c in df.columns if c.startswith('Sim') and c[3:].isdigit()]
+    return sorted(colunas, key=lambda c: int(c[3:]))
+
+
+def _estado_inicial(num_alunos):
+    """Acumuladores por aluno; cada mês novo é dobrado sobre eles."""
+    zeros = np.zeros(num_alunos)
+    return {
+        'meses': 0,
+        'n': zeros.copy(), 'soma_x': zeros.copy(), 'soma_x2': zeros.copy(),
+        'soma_y': zeros.copy(), 'soma_xy': zeros.copy(),
+        'media': zeros.copy(), 'm2': zeros.copy(),
+        'zeros_seguidos': zeros.copy(), 'maior_sequencia_zeros': zeros.copy(),
+        'recentes': np.full((num_alunos, JANELA_RECENTE), np.nan),
+        'ultima': np.full(num_alunos, np.nan),
+    }
+
+
+def acumular_mes(estado, notas, x):
+    """
+    Incorpora um mês (vetor com a nota de todos os alunos) aos acumuladores.
+
+    Notas ausentes não entram nas somas. Zero conta como falta e alimenta a
+    sequência de zeros.
+    """
+    notas = np.asarray(notas, dtype=float)
+    valido = ~np.isnan(notas)
+    y = np.where(valido, notas, 0.0)
+
+    estado['n'] += valido
+    estado['soma_x'] += valido * x
+    estado['soma_x2'] += valido * x ** 2
+    estado['soma_y'] += y
+    estado['soma_xy'] += y * x
+
+    # Welford para a variância sem guardar o histórico
+    delta = np.where(valido, y - estado['media'], 0.0)
+    estado['media'] += np.divide(delta, estado['n'], out=np.zeros_like(delta), where=estado['n'] > 0)
+    estado['m2'] += delta * np.where(valido, y - estado['media'], 0.0)
+
+    zerado = valido & (y == 0)
+    estado['zeros_seguidos'] = np.where(zerado, estado['zeros_seguidos'] + 1, np.where(valido, 0, estado['zeros_seguidos']))
+    estado['maior_sequencia_zeros'] = np.maximum(estado['maior_sequencia_zeros'], estado['zeros_seguidos'])
+
+    recentes = np.roll(estado['recentes'], -1, axis=1)
+    recentes[:, -1] = notas
+    estado['recentes'] = np.where(valido[:, None], recentes, estado['recentes'])
+    estado['ultima'] = np.where(valido, notas, estado['ultima'])
+    estado['meses'] += 1
+    return estado
+
+
+def atributos(estado, meta=META):
+    """Atributos de risco de todos os alunos a partir dos acumuladores."""
+    n = estado['n']
+    denominador = n * estado['soma_x2'] - estado['soma_x'] ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inclinacao = np.where(
+            (n >= 2) & (denominador > 0),
+            (n * estado['soma_xy'] - estado['soma_x'] * estado['soma_y']) / denominador,
+            0.0
+        )
+        volatilidade = np.where(n >= 2, np.sqrt(estado['m2'] / (n - 1)), 0.0)
+        media_recente = np.nanmean(estado['recentes'], axis=1)
+    media_recente = np.where(np.isnan(media_recente), 0.0, media_recente)
+
+    return pd.DataFrame({
+        'Tendência': inclinacao,
+        'Volatilidade': volatilidade,
+        'Zeros seguidos': estado['zeros_seguidos'].astype(int),
+        'Maior sequência de zeros': estado['maior_sequencia_zeros'].astype(int),
+        'Média recente': media_recente,
+        'Distância da meta': np.clip(meta - media_recente, 0, None),
+        'Última nota': estado['ultima'],
+    })
+
+
+def indice_risco(tabela, meta=META):
+    """Índice de 0 a 100: soma ponderada dos componentes normalizados, numa passada."""
+    componentes = {
+        'distancia_meta': np.clip(tabela['Distância da meta'] / meta, 0, 1),
+        'zeros': np.clip(np.maximum(tabela['Zeros seguidos'], tabela['Maior sequência de zeros'] / 2) / 2, 0, 1),
+        'queda': np.clip(-tabela['Tendência'], 0, 1),
+        'volatilidade': np.clip(tabela['Volatilidade'] / 3, 0, 1),
+    }
+    return 100 * sum(PESOS_RISCO[nome] * valor for nome, valor in componentes.items())
+
+
+def _assinatura(df, colunas):
+    """Impressão digital dos alunos e dos meses já processados."""
+    resumo = hashlib.sha1(pd.util.hash_pandas_object(df[CHAVES_ALUNO + colunas], index=False).to_numpy().tobytes())
+    return resumo.hexdigest()
+
+
+@st.cache_resource
+def _tabelas_materializadas():
+    """Estado e ranking da última atualização de cada escola, compartilhados entre sessões."""
+    return {'trava': threading.Lock(), 'particoes': {}}
+
+
+def atualizar_ranking(df, meta=META, particao=None):
+    """
+    Ranking de risco da escola inteira, atualizado de forma incremental.
+
+    Se os alunos e os meses já processados não mudaram, só os meses novos são
+    acumulados; qualquer outra mudança refaz tudo a partir do primeiro mês.
+    Cada `particao` (escola e ano) tem o seu estado.
+    """
+    colunas = colunas_simulados(df)
+    tabelas = _tabelas_materializadas()
+    # Sessões simultâneas não podem acumular o mesmo mês duas vezes
+    with tabelas['trava']:
+        materializada = tabelas['particoes'].setdefault(particao, {})
+        estado = materializada.get('estado')
+        processadas = materializada.get('colunas', [])
+
+        reaproveita = (
+            estado is not None
+            and colunas[:len(processadas)] == processadas
+            and materializada.get('assinatura') == _assinatura(df, processadas)
+        )
+        if reaproveita and len(processadas) == len(colunas):
+            return materializada['ranking']
+
+        with medir('ranking_risco', linhas=len(df)):
+            if not reaproveita:
+                estado, processadas = _estado_inicial(len(df)), []
+            novas = colunas[len(processadas):]
+            for coluna in novas:
+                acumular_mes(estado, df[coluna].to_numpy(dtype=float, na_value=np.nan), int(coluna[3:]))
+
+            tabela = pd.concat([df[CHAVES_ALUNO].reset_index(drop=True), atributos(estado, meta)], axis=1)
+            tabela['Risco'] = indice_risco(tabela, meta).round(1)
+            tabela['Nível'] = pd.Categorical.from_codes(
+                np.digitize(tabela['Risco'], LIMITES_RISCO), categories=ROTULOS_RISCO
+            )
+            ranking = tabela.sort_values('Risco', ascending=False, kind='stable').reset_index(drop=True)
+
+        materializada.update({
+            'estado': estado,
+            'colunas': colunas,
+            'assinatura': _assinatura(df, colunas),
+            'ranking': ranking,
+        })
+        return ranking
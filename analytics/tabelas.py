@@ -0,0 +1,95 @@
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib import colormaps, colors
+
+from analytics.faixas import SUFIXO_FAIXA, codigos_faixas
+from analytics.instrumentacao import medir
+
+TAMANHO_PAGINA = 50
+
+# CSS de cada faixa de LIMITES_DESEMPENHO
+ESTILOS_DESEMPENHO = np.array([
+    'background-color: #fdeaea; color: #a94442; border-left: 5px solid #dc3545;',
+    'background-color: #fff8e1; color: #8c6c0a; border-left: 5px solid #ffc107;',
+    'background-color: #e9f5ee; color: #1e663a; border-left: 5px solid #28a745; font-weight: 600;',
+], dtype=object)
+
+
+def estilos_gradiente(cmap, limites, vmin=0, vmax=100):
+    """Gera o CSS de cada faixa amostrando o colormap no centro da faixa."""
+    bordas = [vmin] + list(limites) + [vmax]
+    mapa = colormaps[cmap]
+    estilos = []
+    for inicio, fim in zip(bordas[:-1], bordas[1:]):
+        r, g, b, _ = mapa(((inicio + fim) / 2 - vmin) / (vmax - vmin))
+        texto = '#000000' if (0.299 * r + 0.587 * g + 0.114 * b) > 0.5 else '#ffffff'
+        estilos.append(f'background-color: {colors.to_hex((r, g, b))}; color: {texto};')
+    return np.array(estilos, dtype=object)
+
+
+def _estilizar_pagina(pagina, codigos_pagina, faixas):
+    """Monta a matriz de CSS da página a partir dos códigos de faixa pré-calculados."""
+    css = pd.DataFrame('', index=pagina.index, columns=pagina.columns)
+    for (colunas, _, estilos), codigos in zip(faixas, codigos_pagina):
+        # O índice -1 (valor ausente) cai no '' acrescentado ao final
+        css[colunas] = np.append(estilos, '')[codigos]
+    return css
+
+
+def renderizar_tabela_paginada(df, chave, faixas=(), formato=None, coluna_busca=None,
+                               tamanho_pagina=TAMANHO_PAGINA, propriedades=None, **kwargs):
+    """
+    Exibe apenas a página visível da tabela, com busca e ordenação no servidor.
+
+    `faixas` é uma lista de (colunas, limites, estilos). Os códigos vêm das colunas
+    anexadas por `anexar_faixas` (ocultas na exibição) ou são calculados de uma vez
+    para a tabela inteira; só a página visível recebe o CSS.
+    """
+    faixas = [(list(colunas), limites, estilos) for colunas, limites, estilos in faixas]
+    codigos = [codigos_faixas(df, colunas, limites) for colunas, limites, _ in faixas]
+    df = df[[c for c in df.columns if not str(c).endswith(SUFIXO_FAIXA)]]
+
+    posicoes = np.arange(len(df))
+
+    if len(df) > tamanho_pagina:
+        col_busca, col_ordem, col_sentido, col_pagina = st.columns([2, 2, 1, 1])
+
+        if coluna_busca is not None:
+            termo = col_busca.text_input("Buscar:", key=f"{chave}_busca")
+            if termo:
+                nomes = df[coluna_busca].astype(str).str.contains(termo, case=False, regex=False)
+                posicoes = posicoes[nomes.to_numpy()]
+
+        coluna_ordem = col_ordem.selectbox("Ordenar por:", ["(original)"] + list(df.columns), key=f"{chave}_ordem")
+        decrescente = col_sentido.toggle("Decrescente", value=True, key=f"{chave}_sentido")
+        if coluna_ordem != "(original)":
+            chaves = pd.Series(df[coluna_ordem].to_numpy()[posicoes])
+            ordem = chaves.sort_values(ascending=not decrescente, kind='stable', na_position='last').index
+            posicoes = posicoes[ordem.to_numpy()]
+
+        total = len(posicoes)
+        num_paginas = max(1, math.ceil(total / tamanho_pagina))
+        if st.session_state.get(f"{chave}_pagina", 1) > num_paginas:
+            st.session_state[f"{chave}_pagina"] = 1
+        pagina_atual = col_pagina.number_input("Página:", 1, num_paginas, key=f"{chave}_pagina")
+
+        inicio = (pagina_atual - 1) * tamanho_pagina
+        posicoes = posicoes[inicio:inicio + tamanho_pagina]
+        st.caption(f"Mostrando {len(posicoes)} de {total} linhas · página {pagina_atual} de {num_paginas}")
+
+    pagina = df.iloc[posicoes]
+    styler = pagina.style
+    if propriedades:
+        styler = styler.set_properties(**propriedades)
+    if faixas:
+        codigos_pagina = [c[posicoes] for c in codigos]
+        styler = styler.apply(lambda _: _estilizar_pagina(pagina, codigos_pagina, faixas), axis=None)
+    if formato:
+        styler = styler.format(formato)
+
+    with medir('render_tabela', linhas=len(pagina)):
+        st.dataframe(styler, **kwargs)
+    return pagina
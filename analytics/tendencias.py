@@ -0,0 +1,327 @@
+import hashlib
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from scipy import sparse
+
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import medir
+
+JANELA_PADRAO = 3
+
+
+def numero_simulado(nome):
+    """Posição do simulado na linha do tempo ('Simulado 7' -> 7)."""
+    encontrado = re.search(r'\d+', str(nome))
+    return int(encontrado.group()) if encontrado else 0
+
+
+def inclinacoes_mqp(y, pesos, x):
+    """
+    Inclinação por mínimos quadrados ponderados de todas as séries de uma vez.
+
+    `y` e `pesos` têm forma (..., S) e `x` tem S posições; séries com menos de
+    dois pontos recebem NaN. Não há laço por descritor.
+    """
+    y = np.where(pesos > 0, np.nan_to_num(y), 0.0)
+    x = np.asarray(x, dtype=float)
+    s0 = pesos.sum(axis=-1)
+    s1 = (pesos * x).sum(axis=-1)
+    s2 = (pesos * x ** 2).sum(axis=-1)
+    t0 = (pesos * y).sum(axis=-1)
+    t1 = (pesos * x * y).sum(axis=-1)
+    return _inclinacao_estatisticas(s0, s1, s2, t0, t1)
+
+
+def _inclinacao_estatisticas(s0, s1, s2, t0, t1):
+    """Inclinação a partir das somas suficientes do ajuste linear."""
+    denominador = s0 * s2 - s1 ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inclinacao = (s0 * t1 - s1 * t0) / denominador
+    return np.where((s0 >= 2) & (np.abs(denominador) > 1e-12), inclinacao, np.nan)
+
+
+def medias_moveis(y, pesos, janela=JANELA_PADRAO):
+    """Média móvel das últimas `janela` posições ignorando as não avaliadas (somas acumuladas)."""
+    y = np.where(pesos > 0, np.nan_to_num(y), 0.0)
+    soma = np.cumsum(y * pesos, axis=-1)
+    contagem = np.cumsum(pesos, axis=-1)
+    soma[..., janela:] = soma[..., janela:] - soma[..., :-janela]
+    contagem[..., janela:] = contagem[..., janela:] - contagem[..., :-janela]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = soma / contagem
+    return np.where(pesos > 0, media, np.nan)
+
+
+@st.cache_resource
+def _repositorio_tendencias():
+    """
+    Séries já calculadas por escola e componente; sobrevivem aos reruns e às
+    sessões. A trava protege tanto a atualização quanto a leitura dos registros.
+    """
+    return {'trava': threading.RLock(), 'registros': {}}
+
+
+def _novo_registro(itens):
+    num_itens = len(itens)
+    vazio = sparse.csr_matrix((0, num_itens))
+    return {
+        'itens': list(itens),
+        'alunos': [],
+        'indice_alunos': {},
+        'simulados': {},
+        # Somas suficientes do ajuste linear de cada aluno x descritor
+        'estatisticas': {nome: vazio.copy() for nome in ('s0', 's1', 's2', 't0', 't1')},
+        'inclinacao_alunos': np.zeros((0, num_itens), dtype=np.float32),
+        'inclinacao_turma': np.full(num_itens, np.nan),
+    }
+
+
+def _assinatura(base, linhas):
+    """Impressão digital das respostas de um simulado, para detectar mudanças."""
+    respostas = base['respostas'][linhas]
+    resumo = hashlib.sha1()
+    resumo.update(respostas.data.tobytes())
+    resumo.update(respostas.indices.tobytes())
+    resumo.update(respostas.indptr.tobytes())
+    resumo.update('|'.join(base['chaves']['Aluno'].to_numpy()[linhas]).encode('utf-8'))
+    return resumo.hexdigest()
+
+
+def _redimensionar(matriz, num_linhas):
+    """Acrescenta linhas vazias ao final de uma CSR (alunos novos)."""
+    faltam = num_linhas - matriz.shape[0]
+    if faltam <= 0:
+        return matriz
+    indptr = np.concatenate([matriz.indptr, np.full(faltam, matriz.indptr[-1])])
+    return sparse.csr_matrix((matriz.data, matriz.indices, indptr), shape=(num_linhas, matriz.shape[1]))
+
+
+def _contribuicao(simulado, num_alunos):
+    """Parcelas de um simulado nas somas suficientes de cada aluno x descritor."""
+    acertos = _redimensionar(simulado['acertos'], num_alunos).astype(float)
+    respondidas = _redimensionar(simulado['respondidas'], num_alunos).astype(float)
+    x = simulado['x']
+    return {'s0': respondidas, 's1': x * respondidas, 's2': x ** 2 * respondidas, 't0': acertos, 't1': x * acertos}
+
+
+def atualizar_tendencias(base, componente, particao=None):
+    """
+    Atualiza as séries do componente só com os simulados novos ou alterados.
+
+    Cada simulado guarda suas respostas por aluno; ao mudar, a parcela antiga é
+    subtraída das somas suficientes e a nova é somada. As inclinações só são
+    recalculadas nos descritores que esse simulado avalia. `particao` (escola e
+    ano) separa as séries de escolas diferentes. Quem lê o registro devolvido
+    deve segurar `_repositorio_tendencias()['trava']`.
+    """
+    repositorio = _repositorio_tendencias()
+    # Sessões simultâneas não podem somar o mesmo simulado duas vezes
+    with repositorio['trava']:
+        # As colunas de descritores fazem parte da chave: com um descritor novo
+        # as matrizes mudam de largura, então o registro antigo sai e a série é refeita
+        chave = (particao, componente, tuple(base['itens']))
+        registros = repositorio['registros']
+        if chave not in registros:
+            for antiga in [c for c in registros if c[:2] == chave[:2]]:
+                del registros[antiga]
+            registros[chave] = _novo_registro(base['itens'])
+        registro = registros[chave]
+        chaves = base['chaves']
+        do_componente = chaves['Componentes'] == componente
+
+        atuais = {}
+        for simulado in pd.unique(chaves.loc[do_componente, 'Simulados']):
+            linhas = np.flatnonzero((do_componente & (chaves['Simulados'] == simulado)).to_numpy())
+            atuais[simulado] = (linhas, _assinatura(base, linhas))
+
+        alterados = [s for s, (_, assinatura) in atuais.items()
+                     if registro['simulados'].get(s, {}).get('assinatura') != assinatura]
+        removidos = [s for s in registro['simulados'] if s not in atuais]
+        if not alterados and not removidos:
+            return registro
+
+        with medir('atualizacao_tendencias') as medicao:
+            afetados = set()
+            for simulado in alterados + removidos:
+                antigo = registro['simulados'].pop(simulado, None)
+                if antigo is None:
+                    continue
+                afetados.update(antigo['descritores'])
+                parcela = _contribuicao(antigo, len(registro['alunos']))
+                for nome, valor in parcela.items():
+                    registro['estatisticas'][nome] = registro['estatisticas'][nome] - valor
+
+            for simulado in alterados:
+                linhas, assinatura = atuais[simulado]
+                nomes = chaves['Aluno'].to_numpy()[linhas]
+                for nome in nomes:
+                    if nome not in registro['indice_alunos']:
+                        registro['indice_alunos'][nome] = len(registro['alunos'])
+                        registro['alunos'].append(nome)
+
+                # Reordena as linhas do simulado pelo índice global de alunos
+                posicoes = np.array([registro['indice_alunos'][n] for n in nomes], dtype=np.int64)
+                reordenacao = sparse.csr_matrix(
+                    (np.ones(len(linhas)), (posicoes, np.arange(len(linhas)))),
+                    shape=(len(registro['alunos']), len(linhas))
+                )
+                respondidas = (reordenacao @ base['respondidas'][linhas]).tocsr()
+                novo = {
+                    'assinatura': assinatura,
+                    'x': numero_simulado(simulado),
+                    'acertos': (reordenacao @ base['respostas'][linhas]).tocsr(),
+                    'respondidas': respondidas,
+                    'descritores': [registro['itens'][i] for i in np.unique(respondidas.indices)],
+                }
+                registro['simulados'][simulado] = novo
+                afetados.update(novo['descritores'])
+
+                num_alunos = len(registro['alunos'])
+                parcela = _contribuicao(novo, num_alunos)
+                for nome, valor in parcela.items():
+                    registro['estatisticas'][nome] = _redimensionar(registro['estatisticas'][nome], num_alunos) + valor
+
+            _recalcular_inclinacoes(registro, [registro['itens'].index(d) for d in sorted(afetados)])
+            medicao['linhas'] = len(afetados)
+
+        return registro
+
+
+def _recalcular_inclinacoes(registro, colunas):
+    """Recalcula as inclinações de alunos e turma apenas nas colunas afetadas."""
+    num_alunos = len(registro['alunos'])
+    inclinacoes = registro['inclinacao_alunos']
+    if inclinacoes.shape[0] < num_alunos:
+        extra = np.full((num_alunos - inclinacoes.shape[0], inclinacoes.shape[1]), np.nan, dtype=np.float32)
+        inclinacoes = np.vstack([inclinacoes, extra])
+    if not colunas:
+        registro['inclinacao_alunos'] = inclinacoes
+        return
+
+    estatisticas = {
+        nome: _redimensionar(matriz, num_alunos)[:, colunas].toarray()
+        for nome, matriz in registro['estatisticas'].items()
+    }
+    # Respostas 0/1 viram pontos percentuais por simulado
+    inclinacoes[:, colunas] = 100 * _inclinacao_estatisticas(**estatisticas)
+    registro['inclinacao_alunos'] = inclinacoes
+
+    serie = serie_turma(registro)
+    dominio = serie['dominio'][colunas]
+    registro['inclinacao_turma'][colunas] = inclinacoes_mqp(dominio, (~np.isnan(dominio)).astype(float), serie['x'])
+
+
+def serie_turma(registro):
+    """Domínio da turma (% de acerto) por descritor x simulado, na ordem dos simulados."""
+    simulados = sorted(registro['simulados'], key=lambda s: registro['simulados'][s]['x'])
+    acertos = np.column_stack([
+        np.asarray(registro['simulados'][s]['acertos'].sum(axis=0)).ravel() for s in simulados
+    ]) if simulados else np.zeros((len(registro['itens']), 0))
+    respondidas = np.column_stack([
+        np.asarray(registro['simulados'][s]['respondidas'].sum(axis=0)).ravel() for s in simulados
+    ]) if simulados else np.zeros((len(registro['itens']), 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dominio = np.where(respondidas > 0, 100 * acertos / respondidas, np.nan)
+    return {
+        'simulados': simulados,
+        'x': [registro['simulados'][s]['x'] for s in simulados],
+        'dominio': dominio,
+    }
+
+
+def serie_aluno(registro, aluno):
+    """Acertos (0 ou 100) do aluno por descritor x simulado; NaN onde não foi avaliado."""
+    serie = serie_turma(registro)
+    posicao = registro['indice_alunos'].get(aluno)
+    dominio = np.full_like(serie['dominio'], np.nan)
+    if posicao is None:
+        return {**serie, 'dominio': dominio}
+    for j, simulado in enumerate(serie['simulados']):
+        dados = registro['simulados'][simulado]
+        if posicao >= dados['respondidas'].shape[0]:
+            continue
+        respondidas = dados['respondidas'][posicao].toarray().ravel() > 0
+        acertos = dados['acertos'][posicao].toarray().ravel()
+        dominio[respondidas, j] = 100 * acertos[respondidas]
+    return {**serie, 'dominio': dominio}
+
+
+def tabela_tendencias(registro, serie, inclinacoes, janela=JANELA_PADRAO):
+    """Resumo por descritor: simulados avaliados, último domínio, média móvel e inclinação."""
+    dominio = serie['dominio']
+    pesos = (~np.isnan(dominio)).astype(float)
+    moveis = medias_moveis(dominio, pesos, janela)
+    ultimo = pd.DataFrame(dominio).ffill(axis=1).iloc[:, -1].to_numpy() if dominio.shape[1] else np.full(len(dominio), np.nan)
+    ultima_movel = pd.DataFrame(moveis).ffill(axis=1).iloc[:, -1].to_numpy() if dominio.shape[1] else ultimo
+    tabela = pd.DataFrame({
+        'Descritor': registro['itens'],
+        'Simulados': pesos.sum(axis=1).astype(int),
+        'Último (%)': ultimo,
+        f'Média móvel ({janela})': ultima_movel,
+        'Tendência (p.p./simulado)': inclinacoes,
+    })
+    return tabela[tabela['Simulados'] > 0]
+
+
+def renderizar_tendencias(base, componente, chave, janela=JANELA_PADRAO, particao=None):
+    """Seção de tendências: trajetória da turma ou de um aluno em todos os simulados."""
+    trava = _repositorio_tendencias()['trava']
+    with trava:
+        registro = atualizar_tendencias(base, componente, particao)
+        vazio = not registro['simulados']
+        alunos = sorted(registro['alunos'])
+    if vazio:
+        st.info("Nenhum simulado disponível para o componente selecionado.")
+        return
+
+    alvo = st.selectbox("Trajetória de:", ["Turma"] + alunos, key=f"{chave}_alvo")
+    # Outra sessão pode atualizar o registro; a leitura é feita sob a mesma trava
+    with trava:
+        itens = list(registro['itens'])
+        if alvo == "Turma":
+            serie = serie_turma(registro)
+            inclinacoes = registro['inclinacao_turma'].copy()
+        else:
+            serie = serie_aluno(registro, alvo)
+            inclinacoes = registro['inclinacao_alunos'][registro['indice_alunos'][alvo]].copy()
+        tabela = tabela_tendencias(registro, serie, inclinacoes, janela)
+
+    col_tabela, col_grafico = st.columns([1, 2])
+    with col_tabela:
+        st.dataframe(
+            tabela.sort_values('Tendência (p.p./simulado)', na_position='last').style.format({
+                'Último (%)': '{:.0f}%', f'Média móvel ({janela})': '{:.1f}%', 'Tendência (p.p./simulado)': '{:+.1f}'
+            }, na_rep='-'),
+            hide_index=True, use_container_width=True, height=400
+        )
+
+    with col_grafico:
+        descritores = st.multiselect(
+            "Descritores no gráfico:",
+            options=tabela['Descritor'].tolist(),
+            default=tabela.nsmallest(3, 'Tendência (p.p./simulado)')['Descritor'].tolist(),
+            key=f"{chave}_descritores_{alvo}"
+        )
+        pesos = (~np.isnan(serie['dominio'])).astype(float)
+        moveis = medias_moveis(serie['dominio'], pesos, janela)
+        fig = go.Figure()
+        for descritor in descritores:
+            i = itens.index(descritor)
+            avaliados = pesos[i] > 0
+            x = np.asarray(serie['simulados'], dtype=object)[avaliados]
+            fig.add_trace(go.Scatter(x=x, y=serie['dominio'][i][avaliados], mode='markers', name=descritor,
+                                     legendgroup=descritor))
+            fig.add_trace(go.Scatter(x=x, y=moveis[i][avaliados], mode='lines', name=f'{descritor} (média móvel)',
+                                     legendgroup=descritor, line=dict(dash='dot')))
+        fig.update_layout(
+            title=f"Trajetória por descritor - {alvo}",
+            yaxis_title="Domínio (%)", yaxis_range=[-5, 105],
+            xaxis={'type': 'category', 'categoryorder': 'array', 'categoryarray': serie['simulados']},
+            height=400, template='plotly_white'
+        )
+        plotly_chart_medido(fig, use_container_width=True, key=f"{chave}_grafico")
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from analytics.instrumentacao import medir
+
+# Escala SAEB: transformação linear da proficiência (média 250, desvio 50)
+MEDIA_SAEB = 250
+DESVIO_SAEB = 50
+
+# Prioris que mantêm finitas as estimativas de quem acerta ou erra tudo
+DESVIO_PRIORI_THETA = 1.0
+DESVIO_PRIORI_DIFICULDADE = 2.0
+DESVIO_PRIORI_DISCRIMINACAO = 0.5
+DISCRIMINACAO_MINIMA = 0.05
+
+MAX_ITERACOES = 100
+TOLERANCIA = 1e-3
+PASSO_MAXIMO = 1.0
+
+
+def observacoes_respostas(df, colunas_itens, coluna_aluno='Aluno', colunas_prova=('Simulados',)):
+    """
+    Converte a planilha larga (aluno x descritor, 0/1/NaN) em observações esparsas.
+
+    Cada item é a combinação prova + descritor (o D05 do Simulado 1 e o do
+    Simulado 2 são itens diferentes). Só as respostas existentes entram.
+    """
+    colunas_prova = list(colunas_prova)
+    valores = df[list(colunas_itens)].to_numpy(dtype=float, na_value=np.nan)
+    linhas, colunas = np.nonzero(~np.isnan(valores))
+
+    alunos, aluno_idx = np.unique(df[coluna_aluno].astype(str).to_numpy(), return_inverse=True)
+    provas = df[colunas_prova].astype(str).agg(' | '.join, axis=1).to_numpy()
+    rotulos_itens = pd.Series(provas[linhas]) + ' | ' + pd.Series(np.asarray(colunas_itens, dtype=object)[colunas])
+    itens, item_idx = np.unique(rotulos_itens.to_numpy(dtype=str), return_inverse=True)
+
+    return {
+        'aluno': aluno_idx[linhas].astype(np.int32),
+        'item': item_idx.astype(np.int32),
+        'resposta': valores[linhas, colunas].astype(np.float64),
+        'alunos': alunos.tolist(),
+        'itens': itens.tolist(),
+    }
+
+
+def _valores_iniciais(rotulos, anterior, padrao):
+    """Reaproveita os parâmetros do ajuste anterior para os rótulos já conhecidos."""
+    valores = np.full(len(rotulos), padrao, dtype=float)
+    if anterior:
+        posicoes = pd.Index(rotulos).get_indexer(list(anterior))
+        conhecidos = posicoes >= 0
+        valores[posicoes[conhecidos]] = np.asarray(list(anterior.values()), dtype=float)[conhecidos]
+    return valores
+
+
+def _logistica(z):
+    """Probabilidade de acerto, sem overflow para |z| grande."""
+    return 0.5 * (1 + np.tanh(0.5 * z))
+
+
+def _newton(gradiente, hessiana):
+    """Passo de Newton por parâmetro, limitado para evitar saltos nas primeiras iterações."""
+    return np.clip(gradiente / hessiana, -PASSO_MAXIMO, PASSO_MAXIMO)
+
+
+def calibrar(obs, modelo='rasch', anterior=None, max_iteracoes=MAX_ITERACOES, tolerancia=TOLERANCIA):
+    """
+    Estima dificuldade (e discriminação no 2PL) dos itens e proficiência dos alunos.
+
+    Máxima verossimilhança conjunta com prioris normais (MAP), alternando passos
+    de Newton para alunos e itens. Gradientes e hessianas são somas por aluno
+    ou por item calculadas com np.bincount sobre as observações, sem montar a
+    matriz densa. `anterior` é o dicionário de um ajuste anterior: alunos e
+    itens já conhecidos partem dos valores dele (warm start).
+    """
+    aluno, item, y = obs['aluno'], obs['item'], obs['resposta']
+    n_alunos, n_itens = len(obs['alunos']), len(obs['itens'])
+    anterior = anterior or {}
+
+    theta = _valores_iniciais(obs['alunos'], anterior.get('theta'), 0.0)
+    a = _valores_iniciais(obs['itens'], anterior.get('discriminacao'), 1.0)
+    # Os itens são ajustados na forma de regressão logística (a * theta + c), côncava em (a, c)
+    c = -a * _valores_iniciais(obs['itens'], anterior.get('dificuldade'), 0.0)
+
+    var_theta = DESVIO_PRIORI_THETA ** 2
+    var_c = DESVIO_PRIORI_DIFICULDADE ** 2
+    var_a = DESVIO_PRIORI_DISCRIMINACAO ** 2
+
+    convergiu = False
+    iteracao = 0
+    for iteracao in range(1, max_iteracoes + 1):
+        theta_anterior, c_anterior = theta.copy(), c.copy()
+
+        # Proficiências
+        p = _logistica(a[item] * theta[aluno] + c[item])
+        grad = np.bincount(aluno, a[item] * (y - p), n_alunos) - theta / var_theta
+        hess = -np.bincount(aluno, a[item] ** 2 * p * (1 - p), n_alunos) - 1 / var_theta
+        theta -= _newton(grad, hess)
+
+        # Itens
+        p = _logistica(a[item] * theta[aluno] + c[item])
+        residuo, peso = y - p, p * (1 - p)
+        grad_c = np.bincount(item, residuo, n_itens) - c / var_c
+        hess_cc = -np.bincount(item, peso, n_itens) - 1 / var_c
+
+        if modelo == '2pl':
+            # Newton conjunto em (a, c) com a hessiana 2 x 2 de cada item resolvida à mão
+            theta_obs = theta[aluno]
+            grad_a = np.bincount(item, residuo * theta_obs, n_itens) - (a - 1) / var_a
+            hess_aa = -np.bincount(item, peso * theta_obs ** 2, n_itens) - 1 / var_a
+            hess_ac = -np.bincount(item, peso * theta_obs, n_itens)
+            determinante = hess_aa * hess_cc - hess_ac ** 2
+            passo_a = (hess_cc * grad_a - hess_ac * grad_c) / determinante
+            passo_c = (hess_aa * grad_c - hess_ac * grad_a) / determinante
+            a = np.maximum(a - np.clip(passo_a, -PASSO_MAXIMO, PASSO_MAXIMO), DISCRIMINACAO_MINIMA)
+            c -= np.clip(passo_c, -PASSO_MAXIMO, PASSO_MAXIMO)
+
+            if n_alunos > 1:
+                # Fixa média 0 e desvio 1 das proficiências; sem isso a escala deriva
+                # (proficiências encolhendo e discriminações crescendo)
+                media, desvio = theta.mean(), theta.std()
+                theta = (theta - media) / desvio
+                c += a * media
+                a *= desvio
+        else:
+            c -= _newton(grad_c, hess_cc)
+
+        mudanca = max(np.abs(theta - theta_anterior).max(initial=0), np.abs(c - c_anterior).max(initial=0))
+        if mudanca < tolerancia:
+            convergiu = True
+            break
+
+    p = _logistica(a[item] * theta[aluno] + c[item])
+    informacao = np.bincount(aluno, a[item] ** 2 * p * (1 - p), n_alunos) + 1 / var_theta
+
+    return {
+        'modelo': modelo,
+        'theta': dict(zip(obs['alunos'], theta)),
+        'erro_padrao': dict(zip(obs['alunos'], 1 / np.sqrt(informacao))),
+        'dificuldade': dict(zip(obs['itens'], -c / a)),
+        'discriminacao': dict(zip(obs['itens'], a)),
+        'iteracoes': iteracao,
+        'convergiu': convergiu,
+    }
+
+
+def escala_saeb(theta):
+    """Converte a proficiência para a escala SAEB."""
+    return MEDIA_SAEB + DESVIO_SAEB * np.asarray(theta, dtype=float)
+
+
+@st.cache_data(show_spinner="Calibrando itens (TRI)...")
+def calibrar_componente(df, colunas_itens, componente, modelo='rasch', particao=None):
+    """
+    Calibra todos os simulados de um componente e devolve alunos e itens em tabelas.
+
+    O 2PL parte da solução Rasch dos mesmos dados, então o resultado depende só
+    das entradas, e não de quem calibrou antes. `particao` (escola e ano)
+    separa as entradas do cache.
+    """
+    df = df[df['Componentes'] == componente]
+    with medir('calibracao_tri', linhas=len(df)):
+        obs = observacoes_respostas(df, colunas_itens)
+        anterior = calibrar(obs, modelo='rasch') if modelo == '2pl' else None
+        ajuste = calibrar(obs, modelo=modelo, anterior=anterior)
+
+    theta = pd.Series(ajuste['theta'])
+    alunos = pd.DataFrame({
+        'Aluno': theta.index,
+        'Proficiência (SAEB)': escala_saeb(theta.to_numpy()).round(1),
+        'Erro padrão': (DESVIO_SAEB * pd.Series(ajuste['erro_padrao'])).round(1).to_numpy(),
+    })
+    itens = pd.Series(ajuste['dificuldade']).rename_axis('Item').reset_index(name='Dificuldade (SAEB)')
+    itens[['Simulado', 'Descritor']] = itens['Item'].str.split(' | ', n=1, expand=True, regex=False)
+    itens['Dificuldade (SAEB)'] = escala_saeb(itens['Dificuldade (SAEB)']).round(1)
+    itens['Discriminação'] = np.round(list(ajuste['discriminacao'].values()), 2)
+
+    return {
+        'alunos': alunos,
+        'itens': itens[['Simulado', 'Descritor', 'Dificuldade (SAEB)', 'Discriminação']],
+        'iteracoes': ajuste['iteracoes'],
+        'convergiu': ajuste['convergiu'],
+    }
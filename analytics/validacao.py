@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from analytics.armazenamento import RAIZ
+from analytics.instrumentacao import medir
+from analytics.memoria import compartilhado, visao
+
+PASTA_QUARENTENA = os.path.join(RAIZ, 'quarentena')
+
+# Zero com média das demais notas do aluno acima disso (fração do máximo) é suspeito
+LIMITE_HISTORICO = 0.6
+MINIMO_NOTAS_HISTORICO = 2
+
+ACAO_REMOVIDA = 'linha removida'
+ACAO_ANULADO = 'valor anulado'
+ACAO_VERIFICAR = 'mantido (verificar)'
+
+
+def _converter_numerico(coluna):
+    """Converte para número aceitando vírgula decimal; texto vira NaN."""
+    if coluna.dtype.kind in 'iufb':
+        return coluna.astype(float)
+    return pd.to_numeric(coluna.astype(str).str.strip().str.replace(',', '.', regex=False), errors='coerce')
+
+
+def _matriz_maximos(df, colunas, maximos, coluna_grupo):
+    """
+    Máximo de cada célula: um por coluna ou, com `coluna_grupo`, um por grupo e
+    coluna. Com `maximos` None não há limite conhecido (NaN).
+    """
+    if maximos is None:
+        return np.full((len(df), len(colunas)), np.nan)
+    if coluna_grupo is None:
+        linha = np.array([maximos.get(c, np.nan) if isinstance(maximos, dict) else maximos for c in colunas], dtype=float)
+        return np.broadcast_to(linha, (len(df), len(colunas)))
+    tabela = pd.DataFrame(maximos).T.reindex(columns=colunas)
+    return tabela.reindex(df[coluna_grupo].to_numpy()).to_numpy(dtype=float, na_value=np.nan)
+
+
+def _registros(mascara, df, colunas, brutos, chaves, motivo, acao):
+    """Linhas do relatório para as células marcadas numa máscara (n x k)."""
+    linhas, posicoes = np.nonzero(mascara)
+    return pd.DataFrame({
+        'Linha': df.index.to_numpy()[linhas],
+        'Registro': df[chaves].astype(str).agg(' / '.join, axis=1).to_numpy()[linhas],
+        'Coluna': np.asarray(colunas, dtype=object)[posicoes],
+        'Valor': brutos.to_numpy()[linhas, posicoes],
+        'Motivo': motivo,
+        'Ação': acao,
+    })
+
+
+@compartilhado
+def validar_notas(df, colunas, maximos, fonte, chaves, coluna_grupo=None, limite_historico=LIMITE_HISTORICO):
+    """
+    Valida as notas na entrada, numa passada vetorizada sobre a matriz de notas.
+
+    - texto em coluna numérica (ex.: 'CIÊNCiAS'): valor anulado;
+    - nota negativa ou acima do máximo do simulado: valor anulado (as demais
+      notas do aluno continuam nas análises); com `maximos` None só as
+      negativas, e o histórico usa a maior nota de cada coluna como referência;
+    - aluno repetido (mesmas `chaves`): ocorrências extras removidas;
+    - zero destoante do histórico do aluno: mantido, mas listado para conferência.
+
+    Devolve o DataFrame limpo e o relatório de quarentena, que também é gravado
+    em `quarentena/<fonte>.csv`. Como o cache das agregações depende do DataFrame
+    limpo, corrigir a planilha muda o snapshot e força o recálculo. O resultado
+    é o mesmo para todas as sessões; cada chamada recebe uma visão dele.
+    """
+    colunas = [c for c in colunas if c in df.columns]
+    if not colunas:
+        # Sem colunas de nota (ex.: arquivo lido com o separador errado) não há o que validar
+        return visao(df), pd.DataFrame(columns=['Fonte', 'Linha', 'Registro', 'Coluna', 'Valor', 'Motivo', 'Ação'])
+    with medir('validacao', linhas=len(df)):
+        brutos = df[colunas]
+        valores = brutos.apply(_converter_numerico)
+        numeros = valores.to_numpy(dtype=float, na_value=np.nan)
+        maximos_celula = _matriz_maximos(df, colunas, maximos, coluna_grupo)
+
+        texto = brutos.notna().to_numpy() & np.isnan(numeros)
+        with np.errstate(invalid='ignore'):
+            negativo = numeros < 0
+            acima = numeros > maximos_celula
+
+            # Média das outras notas (não zeradas) do aluno, como fração do máximo
+            referencia = maximos_celula if maximos is not None else np.broadcast_to(
+                np.fmax.reduce(numeros, axis=0, initial=-np.inf), numeros.shape)
+            fracao = numeros / referencia
+            positivas = ~np.isnan(fracao) & (numeros > 0)
+            contagem = positivas.sum(axis=1)
+            media = np.where(positivas, fracao, 0.0).sum(axis=1) / np.maximum(contagem, 1)
+        zero_suspeito = (numeros == 0) & ((contagem >= MINIMO_NOTAS_HISTORICO) & (media >= limite_historico))[:, None]
+
+        duplicado = df.duplicated(chaves, keep='first').to_numpy()
+        anular = texto | negativo | acima
+
+        relatorio = pd.concat([
+            _registros(texto, df, colunas, brutos, chaves, 'Texto em coluna numérica', ACAO_ANULADO),
+            _registros(negativo, df, colunas, brutos, chaves, 'Nota negativa', ACAO_ANULADO),
+            _registros(acima, df, colunas, brutos, chaves, 'Nota acima do máximo', ACAO_ANULADO),
+            _registros(duplicado[:, None], df, ['(linha)'], pd.DataFrame({'(linha)': [''] * len(df)}), chaves,
+                       'Aluno duplicado', ACAO_REMOVIDA),
+            _registros(zero_suspeito, df, colunas, brutos, chaves, 'Zero inconsistente com o histórico', ACAO_VERIFICAR),
+        ], ignore_index=True)
+        relatorio.insert(0, 'Fonte', fonte)
+
+        limpo = visao(df)
+        limpo[colunas] = valores.where(~anular)
+        limpo = limpo[~duplicado]
+
+    gravar_quarentena(relatorio, fonte)
+    return limpo, relatorio
+
+
+def gravar_quarentena(relatorio, fonte):
+    """Grava (ou apaga, se não houver ocorrências) o relatório de quarentena da fonte."""
+    caminho = os.path.join(PASTA_QUARENTENA, f"{fonte}.csv")
+    try:
+        if relatorio.empty:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+            return
+        os.makedirs(PASTA_QUARENTENA, exist_ok=True)
+        relatorio.to_csv(caminho, index=False, encoding='utf-8-sig')
+    except OSError:
+        # Em ambientes somente leitura o relatório continua disponível na tela
+        pass
+
+
+def exibir_quarentena(relatorio):
+    """Aviso na barra lateral com as ocorrências encontradas na validação."""
+    if relatorio.empty:
+        return
+    removidas = relatorio.loc[relatorio['Ação'] == ACAO_REMOVIDA, 'Linha'].nunique()
+    with st.sidebar.expander(f"⚠️ Qualidade dos dados: {len(relatorio)} ocorrência(s)", expanded=False):
+        st.caption(f"{removidas} linha(s) fora das análises. Relatório em {PASTA_QUARENTENA}/.")
+        st.dataframe(relatorio.drop(columns=['Fonte']), hide_index=True, use_container_width=True)
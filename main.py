@@ -1,6 +1,11 @@
 import streamlit as st
 
 import os
+
+from analytics.instrumentacao import iniciar_execucao, exibir_diagnostico
+from analytics.api import iniciar_em_segundo_plano
+from analytics.armazenamento import selecionar_particao, nome_escola
+
 # Configurações da página
 try:
     st.set_page_config(
@@ -12,6 +17,19 @@ try:
 except Exception as e:
     st.warning(f"Erro na configuração da página: {str(e)}")
 
+iniciar_execucao('Início')
+
+
+# API de consulta no mesmo processo (só com HD_ANALYTICS_API_PORTA definida)
+@st.cache_resource
+def iniciar_api():
+    return iniciar_em_segundo_plano()
+
+
+iniciar_api()
+
+escola, ano = selecionar_particao()
+
 # CSS personalizado com fallback
 custom_css = """
 <style>
@@ -50,10 +68,10 @@ st.markdown(custom_css, unsafe_allow_html=True)
 # Sidebar de navegação
 with st.sidebar:
     try:
-        st.markdown("""
+        st.markdown(f"""
         <div style="text-align: center; margin-bottom: 30px;">
             <h1 style="color: #2c3e50; font-size: 24px;">HD Analytics</h1>
-            <h2 style="color: #3498db; font-size: 18px;">Escola Estadual Helena Dionysio</h2>
+            <h2 style="color: #3498db; font-size: 18px;">{nome_escola(escola)}</h2>
         </div>
         """, unsafe_allow_html=True)
 
@@ -139,9 +157,9 @@ try:
 
     # Rodapé
     st.markdown("---")
-    st.markdown("""
+    st.markdown(f"""
     <div style="text-align: center; color: #6B7280; font-size: 14px;">
-        <p>Escola Estadual Helena Dionysio - Recomposição da Aprendizagem - Plano de Ação</p>
+        <p>{nome_escola(escola)} - Recomposição da Aprendizagem - Plano de Ação</p>
         <p>© 2025 HD Analytic - Todos os direitos reservados</p>
     </div>
     """, unsafe_allow_html=True)
@@ -150,7 +168,7 @@ except Exception as e:
     st.error(f"Ocorreu um erro inesperado: {str(e)}")
     st.info("Por favor, recarregue a página ou tente novamente mais tarde.")
 
-
+exibir_diagnostico()
 
 
 
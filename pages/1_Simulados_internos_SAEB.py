@@ -4,6 +4,16 @@ import plotly.express as px
 import plotly.graph_objects as go
 import re
 
+from analytics.armazenamento import selecionar_particao, nome_escola, caminho_dados, fonte_dados
+from analytics.distribuicoes import resumir_grupos, figura_boxplot
+from analytics.fluxo import versao_arquivos
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import iniciar_execucao, medir, cronometrado, exibir_diagnostico
+from analytics.mapa_calor import renderizar_mapa_calor
+from analytics.paineis import abas_preguicosas, conteudo_painel
+from analytics.ranking import indice_ranking, top, entre_notas
+from analytics.validacao import validar_notas, exibir_quarentena
+
 # Configurações da página com estilo moderno
 st.set_page_config(
     page_title="SAEB Analytics",
@@ -12,6 +22,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('Simulados internos SAEB')
+
+escola, ano = selecionar_particao()
+
 # CSS personalizado para melhorar a aparência
 st.markdown("""
 <style>
@@ -52,32 +66,34 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Função para calcular porcentagens - agora genérica
-def calcular_porcentagens(df, disciplina):
-    # Dicionário de divisores por disciplina
-    DIVISORES = {
-        "Matemática": {
-            'Sim1': 10, 'Sim2': 10, 'Sim3': 12,
-            'Sim4': 15, 'Sim5': 18, 'Sim6': 18,
-            'Sim7': 20, 'Sim8': 16, 'Sim9': 26,
-            'Sim10': 16,'Sim11':18,'Sim12': 16,
-            'Sim13': 16,'Sim14': 23,'Sim15': 16,
-            'Sim16': 24,'Sim17': 25, 'Sim18':15,
-            'Sim19':26,'Sim20':22,'Sim21':19
-
-        },
-        "Português": {
-            'Sim1': 10, 'Sim2': 10, 'Sim3': 10,
-            'Sim4': 15, 'Sim5': 18, 'Sim6': 18,
-            'Sim7': 14, 'Sim8': 16, 'Sim9': 26,
-            'Sim10': 16, 'Sim11': 18, 'Sim12': 16,
-            'Sim13': 16,'Sim14': 16,'Sim15': 16,
-            'Sim16': 15,'Sim17': 15, 'Sim18':15, 
-            'Sim19':29,'Sim20': 22,'Sim21':22
-
-        }
+# Dicionário de divisores por disciplina
+DIVISORES = {
+    "Matemática": {
+        'Sim1': 10, 'Sim2': 10, 'Sim3': 12,
+        'Sim4': 15, 'Sim5': 18, 'Sim6': 18,
+        'Sim7': 20, 'Sim8': 16, 'Sim9': 26,
+        'Sim10': 16,'Sim11':18,'Sim12': 16,
+        'Sim13': 16,'Sim14': 23,'Sim15': 16,
+        'Sim16': 24,'Sim17': 25, 'Sim18':15,
+        'Sim19':26,'Sim20':22,'Sim21':19
+
+    },
+    "Português": {
+        'Sim1': 10, 'Sim2': 10, 'Sim3': 10,
+        'Sim4': 15, 'Sim5': 18, 'Sim6': 18,
+        'Sim7': 14, 'Sim8': 16, 'Sim9': 26,
+        'Sim10': 16, 'Sim11': 18, 'Sim12': 16,
+        'Sim13': 16,'Sim14': 16,'Sim15': 16,
+        'Sim16': 15,'Sim17': 15, 'Sim18':15, 
+        'Sim19':29,'Sim20': 22,'Sim21':22
+
     }
+}
 
+
+# Função para calcular porcentagens - agora genérica
+@cronometrado('calcular_porcentagens')
+def calcular_porcentagens(df, disciplina):
     # Encontra automaticamente todas as colunas de simulado
     colunas_sim = [col for col in df.columns if re.match(r'Sim\d+', col)]
 
@@ -91,10 +107,10 @@ def calcular_porcentagens(df, disciplina):
 
 # Sidebar moderna
 with st.sidebar:
-    st.markdown("""
+    st.markdown(f"""
     <div style="text-align: center; margin-bottom: 20px;">
         <h1 style="color: #2c3e50; font-size: 24px;">Relatório Parcial SAEB 2025</h1>
-        <h2 style="color: #3498db; font-size: 18px;">Escola Estadual Helena Dionysio</h2>
+        <h2 style="color: #3498db; font-size: 18px;">{nome_escola(escola)}</h2>
     </div>
     """, unsafe_allow_html=True)
 
@@ -104,7 +120,9 @@ with st.sidebar:
     #st.page_link("pages/1_SAEB_Metodologia.py", label="📈 Desempenho percentual")
 
     # Carregar dados
-    df = pd.read_csv("pages/Dados_simples_simulados.csv", sep=",")
+    with medir('carga_csv') as registro:
+        df = pd.read_csv(caminho_dados('simulados_internos', escola, ano), sep=",")
+        registro['linhas'] = len(df)
 
     # Corrigir nome da coluna Componente
     df['Componente'] = df['Componente'].replace({
@@ -112,6 +130,12 @@ with st.sidebar:
         'Portugues': 'Português'
     })
 
+    # Valida as notas contra os divisores antes de qualquer agregação
+    df, quarentena = validar_notas(
+        df, [col for col in df.columns if re.fullmatch(r'Sim\d+', col)], DIVISORES,
+        fonte_dados('simulados_internos', escola, ano), chaves=['Aluno', 'Componente'], coluna_grupo='Componente'
+    )
+
     # Seleção de componente
     componente_selecionada = st.selectbox("Componente Curricular", ["Matemática", "Português"])
     df = df[df["Componente"] == componente_selecionada]
@@ -238,51 +262,31 @@ fig1.update_layout(
     margin=dict(l=40, r=40, t=40, b=40)
 )
 
-st.plotly_chart(fig1, use_container_width=True)
+plotly_chart_medido(fig1, use_container_width=True)
 
 ## Seção 3: Mapa de Calor Interativo
 st.markdown("### 👥 Desempenho Individual por Simulado")
 
-# Gráfico de heatmap aprimorado
-df_melted = df.melt(id_vars=['Aluno'],
-                    value_vars=simulados,
-                    var_name='Simulado',
-                    value_name='Porcentagem')
-
-df_melted['Simulado'] = df_melted['Simulado'].str.replace('Porcentagem ', '')
-
-fig2 = px.density_heatmap(
-    df_melted,
-    x='Simulado',
-    y='Aluno',
-    z='Porcentagem',
-    color_continuous_scale='Viridis',
-    template='plotly_white',
-    labels={'Porcentagem': 'Acertos (%)'},
-    height=600
-)
-
-# Adicionar anotações para valores
-fig2.update_traces(
-    hovertemplate="<b>%{y}</b><br>%{x}<br>%{z:.1f}%<extra></extra>",
-    showscale=True
-)
-
-fig2.update_layout(
-    xaxis_title="Simulado",
-    yaxis_title="Aluno",
-    yaxis={'categoryorder': 'total ascending'},
-    coloraxis_colorbar=dict(title="% Acertos")
+# Mapa de calor agregado no servidor (faixas de alunos em turmas grandes)
+renderizar_mapa_calor(
+    df,
+    'Aluno',
+    simulados,
+    chave='mapa_calor_simulados',
+    rotulos_x=[sim.replace('Porcentagem ', '') for sim in simulados],
+    escala='Viridis'
 )
 
-st.plotly_chart(fig2, use_container_width=True)
-
 ## Seção 4: Top Alunos com Gráfico de Medalhas
 st.markdown("### 🏆 Top 5 Alunos")
 
+# Versão dos dados: identifica os índices de ranking e os painéis guardados
+versao_dados = (escola, ano, componente_selecionada, versao_arquivos(caminho_dados('simulados_internos', escola, ano)))
+
 # Calcular média por aluno
 df['Média Aluno'] = df[simulados].mean(axis=1)
-top_alunos = df.nlargest(5, 'Média Aluno')[['Aluno', 'Média Aluno']].round(2)
+ranking_medias = indice_ranking((escola, ano, componente_selecionada), 'Média Aluno', df['Média Aluno'], versao=versao_dados)
+top_alunos = df.loc[top(ranking_medias, 5), ['Aluno', 'Média Aluno']].round(2)
 
 # Criar gráfico de medalhas
 fig3 = go.Figure()
@@ -311,60 +315,69 @@ fig3.update_layout(
     margin=dict(l=100, r=40, t=40, b=40)
 )
 
-st.plotly_chart(fig3, use_container_width=True)
+plotly_chart_medido(fig3, use_container_width=True)
 
 ## Seção 5: Alunos acima de 60% em Abas Estilizadas
 st.markdown("### ✅ Alunos com Desempenho Acima de 60%")
 
-# Criar abas para cada simulado
-tabs = st.tabs([sim.replace('Porcentagem ', '') for sim in simulados])
+# Abas preguiçosas: só a aba aberta monta a tabela e o gráfico, guardados por versão dos dados
+
 
-for sim, tab in zip(simulados, tabs):
+def montar_aba_acima_60(sim):
+    """Tabela estilizada e gráfico de barras dos alunos com 60% ou mais no simulado."""
+    indice = indice_ranking((escola, ano, componente_selecionada), sim, df[sim], versao=versao_dados)
+    df_filtrado = df.loc[entre_notas(indice, 60, 100)].sort_values(sim, ascending=False, kind='stable')
+    tabela = (
+        df_filtrado[['Aluno', sim]].style
+        .background_gradient(cmap='Blues', subset=[sim])
+        .format({sim: "{:.1f}%"})
+    )
+    fig = None
+    if not df_filtrado.empty:
+        fig = px.bar(
+            df_filtrado,
+            y='Aluno',
+            x=sim,
+            orientation='h',
+            title=f'Desempenho no {sim.replace("Porcentagem ", "")}',
+            color=sim,
+            color_continuous_scale='Blues',
+            labels={sim: 'Porcentagem de Acertos (%)'},
+            height=400
+        )
+
+        fig.update_layout(
+            template='plotly_white',
+            yaxis={'categoryorder': 'total ascending'},
+            showlegend=False,
+            coloraxis_showscale=False
+        )
+
+        fig.update_traces(
+            hovertemplate='<b>%{y}</b><br>%{x:.1f}%<extra></extra>',
+            texttemplate='%{x:.1f}%',
+            textposition='inside'
+        )
+    return len(df_filtrado), tabela, fig
+
+
+rotulos_abas = [sim.replace('Porcentagem ', '') for sim in simulados]
+for sim, (tab, aberta) in zip(simulados, abas_preguicosas(rotulos_abas, chave='abas_acima_60')):
+    if not aberta:
+        continue
     with tab:
         col_sim, col_graph = st.columns([1, 2])
-
-        # Filtro para alunos acima de 60%
-        df_filtrado = df[df[sim] >= 60].sort_values(sim, ascending=False)
+        linhas, tabela, fig = conteudo_painel(f'saeb_acima_60_{sim}', versao_dados, lambda: montar_aba_acima_60(sim))
 
         # Tabela estilizada
         with col_sim:
-            st.dataframe(
-                df_filtrado[['Aluno', sim]].style
-                .background_gradient(cmap='Blues', subset=[sim])
-                .format({sim: "{:.1f}%"}),
-                height=400,
-                use_container_width=True
-            )
+            with medir('render_tabela', linhas=linhas):
+                st.dataframe(tabela, height=400, use_container_width=True)
 
         # Gráfico de barras
         with col_graph:
-            if not df_filtrado.empty:
-                fig = px.bar(
-                    df_filtrado,
-                    y='Aluno',
-                    x=sim,
-                    orientation='h',
-                    title=f'Desempenho no {sim.replace("Porcentagem ", "")}',
-                    color=sim,
-                    color_continuous_scale='Blues',
-                    labels={sim: 'Porcentagem de Acertos (%)'},
-                    height=400
-                )
-
-                fig.update_layout(
-                    template='plotly_white',
-                    yaxis={'categoryorder': 'total ascending'},
-                    showlegend=False,
-                    coloraxis_showscale=False
-                )
-
-                fig.update_traces(
-                    hovertemplate='<b>%{y}</b><br>%{x:.1f}%<extra></extra>',
-                    texttemplate='%{x:.1f}%',
-                    textposition='inside'
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
+            if fig is not None:
+                plotly_chart_medido(fig, use_container_width=True)
             else:
                 st.warning(f"Nenhum aluno atingiu 60% no {sim.replace('Porcentagem ', '')}", icon="⚠️")
 
@@ -372,29 +385,28 @@ for sim, tab in zip(simulados, tabs):
 if 'Componente' in df.columns and len(df['Componente'].unique()) > 1:
     st.markdown("### 📚 Comparação entre Componentes")
 
-    fig_comp = px.box(
-        df,
-        x='Componente',
-        y=simulados[0],
-        color='Componente',
-        points="all",
-        template='plotly_white',
-        labels={simulados[0]: 'Porcentagem de Acertos (%)'},
+    # Quartis e atípicos por componente calculados no servidor
+    fig_comp = figura_boxplot(
+        resumir_grupos(df, simulados[0], 'Componente'),
+        nome_valor='Porcentagem de Acertos (%)',
         height=500
     )
 
     fig_comp.update_layout(
         xaxis_title="Componente Curricular",
-        showlegend=False
+        yaxis_title='Porcentagem de Acertos (%)'
     )
 
 
-    st.plotly_chart(fig_comp, use_container_width=True)
+    plotly_chart_medido(fig_comp, use_container_width=True)
+
+exibir_quarentena(quarentena)
+exibir_diagnostico()
 
 st.markdown("---")
-st.markdown("""
+st.markdown(f"""
 <div style="text-align: center; color: #6B7280; font-size: 14px;">
-    <p>Escola Estadual Helena Dionysio - Recomposição da Aprendizagem - Plano de Ação</p>
+    <p>{nome_escola(escola)} - Recomposição da Aprendizagem - Plano de Ação</p>
     <p>© 2025 HD Analytic - Todos os direitos reservados</p>
 </div>
 """, unsafe_allow_html=True)
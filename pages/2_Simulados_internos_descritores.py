@@ -3,6 +3,17 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 
+from analytics.exportacao import renderizar_exportacao, tabelas_descritores
+from analytics.armazenamento import selecionar_particao, nome_escola, caminho_dados, fonte_dados
+from analytics.graficos import plotly_chart_medido, plotly_chart_otimizado, exibir_payloads
+from analytics.instrumentacao import iniciar_execucao, medir, exibir_diagnostico
+from analytics.faixas import LIMITES_GRADIENTE
+from analytics.respostas import construir_respostas, selecionar_linhas, agregar_alunos, agregar_descritores, colunas_descritores
+from analytics.tendencias import renderizar_tendencias
+from analytics.tri import calibrar_componente
+from analytics.validacao import validar_notas, exibir_quarentena
+from analytics.tabelas import renderizar_tabela_paginada, estilos_gradiente
+
 
 def per_aluno(A, B):
     p = (A / B) * 100
@@ -22,6 +33,10 @@ st.set_page_config(
     }
 )
 
+iniciar_execucao('Simulados internos - descritores')
+
+escola, ano = selecionar_particao()
+
 # CSS personalizado para melhorar a aparência
 st.markdown("""
 <style>
@@ -44,10 +59,10 @@ st.markdown("""
 
 # Sidebar melhorada
 with st.sidebar:
-    st.markdown("""
+    st.markdown(f"""
     <div style="text-align: center; margin-bottom: 20px;">
         <h1 style="color: #2c3e50; font-size: 24px;">Simulados SAEB 2025</h1>
-        <h2 style="color: #3498db; font-size: 18px;">Escola Estadual Helena Dionysio</h2>
+        <h2 style="color: #3498db; font-size: 18px;">{nome_escola(escola)}</h2>
     </div>
     """, unsafe_allow_html=True)
 
@@ -59,14 +74,22 @@ with st.sidebar:
 
     with st.container():
         st.markdown("### Configurações do Relatório")
-        df = pd.read_csv("pages/descritores2.csv", sep=",")
+        with medir('carga_csv') as registro:
+            df = pd.read_csv(caminho_dados('descritores', escola, ano), sep=",")
+            registro['linhas'] = len(df)
+        # Respostas fora de 0/1 e alunos repetidos no mesmo simulado ficam em quarentena
+        df, quarentena = validar_notas(
+            df, colunas_descritores(df), 1, fonte_dados('descritores', escola, ano), chaves=['Aluno', 'Componentes', 'Simulados']
+        )
+        df_completo = df
         salas_distintas = df["Simulados"].unique().tolist()
         salas_selecionadas = st.selectbox("Selecione o Simulado", salas_distintas)
         componente_selecionada = st.radio("Componente Curricular", ["Matematica", "Portugues"])
 
         if componente_selecionada:
-            df = df[df["Simulados"] == salas_selecionadas]
-            df = df[df["Componentes"] == componente_selecionada]
+            with medir('limpeza', linhas=len(df)):
+                df = df[df["Simulados"] == salas_selecionadas]
+                df = df[df["Componentes"] == componente_selecionada]
 
     st.markdown("---")
     st.markdown("### Links Importantes")
@@ -96,27 +119,20 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-# Processamento dos dados (mantido igual)
-df1 = df.iloc[:, 3:38]
-num_NaN = df1.iloc[1].isna().sum()
-Num_descritores_contemplados = len(df1.columns) - num_NaN
+# Processamento dos dados: respostas em matriz esparsa, somando só as células respondidas
+base_respostas = construir_respostas(df_completo)
+linhas_selecionadas = selecionar_linhas(base_respostas, salas_selecionadas, componente_selecionada)
+descritores_avaliados = base_respostas['itens_por_simulado'].get((componente_selecionada, salas_selecionadas), [])
+Num_descritores_contemplados = len(descritores_avaliados)
 
-df_alunos = df.iloc[:, 0]
-Num_descritores = len(df1.columns) - num_NaN
-Num_alunos = len(df_alunos)
-df_analise_alunos = pd.DataFrame()
-df_descritores = pd.DataFrame()
+Num_alunos = len(linhas_selecionadas)
 
-df2 = df1.sum(axis=1)
-df_analise_alunos['Nomes'] = df_alunos
-df_analise_alunos['Porcentagem'] = (df2 / Num_descritores_contemplados) * 100
+with medir('agregacao', linhas=Num_alunos):
+    df_analise_alunos = agregar_alunos(base_respostas, linhas_selecionadas, Num_descritores_contemplados)[['Nomes', 'Porcentagem']]
 
-df_acima_de_60 = df_analise_alunos[df_analise_alunos['Porcentagem'] >= 60]
+    df_acima_de_60 = df_analise_alunos[df_analise_alunos['Porcentagem'] >= 60]
 
-df_descritores['Descritor'] = df1.columns.tolist()
-df_descritores['Porcentagem'] = df1.sum(axis=0).tolist()
-df_descritores['Porcentagem'] = (df_descritores['Porcentagem'] / Num_alunos) * 100
-df_descritores_mean = df_descritores[df_descritores['Porcentagem'] != 0.0]
+    df_descritores_mean = agregar_descritores(base_respostas, linhas_selecionadas, descritores_avaliados)[['Descritor', 'Porcentagem']]
 
 # Gráficos interativos com Plotly
 st.markdown("## 📊 Desempenho dos Alunos")
@@ -130,7 +146,7 @@ fig_alunos = px.bar(df_analise_alunos,
                     height=500)
 fig_alunos.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
 fig_alunos.update_layout(xaxis_tickangle=-45, yaxis_range=[0, 100])
-st.plotly_chart(fig_alunos, use_container_width=True)
+plotly_chart_otimizado(fig_alunos, 'Desempenho dos Alunos', use_container_width=True)
 
 st.markdown(f"## 📈 Desempenho por Descritor - {salas_selecionadas}")
 fig_descritores = px.bar(df_descritores_mean.sort_values('Porcentagem', ascending=True),
@@ -144,7 +160,7 @@ fig_descritores = px.bar(df_descritores_mean.sort_values('Porcentagem', ascendin
                          height=600)
 fig_descritores.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
 fig_descritores.update_layout(yaxis={'categoryorder': 'total ascending'}, xaxis_range=[0, 100])
-st.plotly_chart(fig_descritores, use_container_width=True)
+plotly_chart_medido(fig_descritores, use_container_width=True)
 
 # Métricas em colunas
 st.markdown("## 📌 Indicadores Principais")
@@ -166,27 +182,81 @@ b.metric("Média dos Alunos",
 
 # Tabelas com estilo
 st.markdown(f"## 🏆 Melhores Alunos - {salas_selecionadas}")
-st.dataframe(
-    df_acima_de_60.round(2).style
-    .background_gradient(cmap='Greens', subset=['Porcentagem'])
-    .format({'Porcentagem': '{:.1f}%'}),
+renderizar_tabela_paginada(
+    df_acima_de_60.round(2),
+    chave='tabela_melhores_alunos',
+    faixas=[(['Porcentagem'], LIMITES_GRADIENTE, estilos_gradiente('Greens', LIMITES_GRADIENTE))],
+    formato={'Porcentagem': '{:.1f}%'},
+    coluna_busca='Nomes',
     use_container_width=True,
     height=400
 )
 
 st.markdown(f"## 📋 Descritores por Desempenho - {salas_selecionadas}")
-st.dataframe(
-    df_descritores_mean.sort_values('Porcentagem', ascending=False).round(2).style
-    .background_gradient(cmap='Purples', subset=['Porcentagem'])
-    .format({'Porcentagem': '{:.1f}%'}),
+renderizar_tabela_paginada(
+    df_descritores_mean.sort_values('Porcentagem', ascending=False).round(2),
+    chave='tabela_descritores',
+    faixas=[(['Porcentagem'], LIMITES_GRADIENTE, estilos_gradiente('Purples', LIMITES_GRADIENTE))],
+    formato={'Porcentagem': '{:.1f}%'},
     use_container_width=True,
     height=400
 )
 
+simulados_componente = [s for c, s in base_respostas['itens_por_simulado'] if c == componente_selecionada]
+renderizar_exportacao(
+    'exportacao_descritores',
+    {
+        salas_selecionadas: lambda: tabelas_descritores(base_respostas, componente_selecionada, [salas_selecionadas]),
+        'Todos os simulados': lambda: tabelas_descritores(base_respostas, componente_selecionada, simulados_componente),
+    },
+    nome=f"Descritores_{componente_selecionada}",
+    titulo=f"Descritores - {componente_selecionada}"
+)
+
+# Tendências de cada descritor em todos os simulados do componente
+st.markdown(f"## 📈 Tendência dos Descritores - {componente_selecionada}")
+renderizar_tendencias(base_respostas, componente_selecionada, chave='tendencias', particao=(escola, ano))
+
+# Proficiência (TRI) calibrada com todos os simulados do componente
+st.markdown(f"## 🎯 Proficiência na Escala SAEB - {componente_selecionada}")
+modelo_tri = st.radio("Modelo TRI", ["Rasch", "2PL"], horizontal=True, key='modelo_tri')
+tri = calibrar_componente(df_completo, colunas_descritores(df_completo), componente_selecionada, modelo_tri.lower(),
+                          particao=(escola, ano))
+if not tri['convergiu']:
+    st.warning(f"A calibração não convergiu em {tri['iteracoes']} iterações; as estimativas são aproximadas.")
+
+col_prof, col_itens = st.columns(2)
+with col_prof:
+    st.markdown("#### Alunos")
+    renderizar_tabela_paginada(
+        tri['alunos'].sort_values('Proficiência (SAEB)', ascending=False),
+        chave='tabela_proficiencia',
+        formato={'Proficiência (SAEB)': '{:.1f}', 'Erro padrão': '{:.1f}'},
+        coluna_busca='Aluno',
+        hide_index=True,
+        use_container_width=True,
+        height=400
+    )
+with col_itens:
+    st.markdown(f"#### Itens - {salas_selecionadas}")
+    itens_simulado = tri['itens'][tri['itens']['Simulado'] == salas_selecionadas]
+    renderizar_tabela_paginada(
+        itens_simulado.drop(columns='Simulado').sort_values('Dificuldade (SAEB)'),
+        chave='tabela_itens_tri',
+        formato={'Dificuldade (SAEB)': '{:.1f}', 'Discriminação': '{:.2f}'},
+        hide_index=True,
+        use_container_width=True,
+        height=400
+    )
+
+exibir_payloads()
+exibir_quarentena(quarentena)
+exibir_diagnostico()
+
 st.markdown("---")
-st.markdown("""
+st.markdown(f"""
 <div style="text-align: center; color: #6B7280; font-size: 14px;">
-    <p>Escola Estadual Helena Dionysio - Recomposição da Aprendizagem - Plano de Ação</p>
+    <p>{nome_escola(escola)} - Recomposição da Aprendizagem - Plano de Ação</p>
     <p>© 2025 HD Analytic - Todos os direitos reservados</p>
 </div>
 """, unsafe_allow_html=True)
@@ -3,6 +3,17 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from analytics.armazenamento import selecionar_particao, nome_escola, caminho_dados, fonte_dados
+from analytics.fatos import construir_fatos, fatia
+from analytics.fluxo import criar_fluxo, definir, no, obter, versao_arquivos
+from analytics.graficos import plotly_chart_medido, plotly_chart_otimizado, exibir_payloads
+from analytics.instrumentacao import iniciar_execucao, medir, exibir_diagnostico
+from analytics.memoria import visao
+from analytics.faixas import LIMITES_GRADIENTE
+from analytics.risco import atualizar_ranking, LIMITES_RISCO
+from analytics.validacao import validar_notas, exibir_quarentena
+from analytics.tabelas import renderizar_tabela_paginada, estilos_gradiente, ESTILOS_DESEMPENHO
+
 # Configuração da página
 st.set_page_config(
     page_title="SAEB Analytics - Relatório Mensal",
@@ -11,6 +22,72 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('Simulados mensais')
+
+escola, ano = selecionar_particao()
+
+# Cálculos da página e suas entradas: um widget só refaz o que depende dele
+fluxo = criar_fluxo('mensais')
+
+
+@no(fluxo, 'dados', ['particao', 'versao_dados'])
+def carregar_dados(particao, versao_dados):
+    """Planilha validada, com notas vazias como zero, e a tabela de fatos."""
+    escola, ano = particao
+    with medir('carga_csv') as registro:
+        df = pd.read_csv(caminho_dados('mensais', escola, ano), sep=',')
+        registro['linhas'] = len(df)
+
+    # Notas negativas, texto e alunos repetidos ficam em quarentena; o valor de
+    # cada simulado mensal varia (até 20 pontos), então não há máximo fixo
+    colunas_notas = [col for col in df.columns if col.startswith('Sim')]
+    df, quarentena = validar_notas(
+        df, colunas_notas, None, fonte_dados('mensais', escola, ano), chaves=['Aluno', 'Turma', 'Componente']
+    )
+
+    # Converter colunas de notas para numérico (tratando possíveis erros)
+    for col in colunas_notas:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # Converter Turma para string para evitar problemas de ordenação
+    df['Turma'] = df['Turma'].astype(str)
+
+    # Formato longo (componente, turma, simulado, aluno, nota) montado uma vez por versão dos dados
+    fatos = construir_fatos(df, colunas_notas, dimensoes=('Componente', 'Turma'))
+    return df, quarentena, fatos
+
+
+@no(fluxo, 'filtrado', ['dados', 'componente', 'turma'])
+def filtrar_turma(dados, componente, turma):
+    """Alunos da turma e componente escolhidos, só com as colunas de simulados."""
+    df = dados[0]
+    with medir('limpeza', linhas=len(df)):
+        df_filtrado = df[(df["Turma"] == turma) & (df["Componente"] == componente)]
+    colunas_simulados = [col for col in df_filtrado.columns if col.startswith('Sim')]
+    return df_filtrado[['Aluno'] + colunas_simulados], colunas_simulados
+
+
+@no(fluxo, 'metricas', ['filtrado'])
+def calcular_metricas(filtrado):
+    """Médias, desvios, alunos na meta e notas em porcentagem da turma."""
+    df_filtrado, colunas_simulados = filtrado
+    with medir('agregacao', linhas=len(df_filtrado)):
+        df_porcentagem = visao(df_filtrado)
+        for col in colunas_simulados:
+            df_porcentagem[col] = (df_filtrado[col] * 10).round(1)
+        return {
+            'medias': df_filtrado[colunas_simulados].mean().round(1),
+            'desvios': df_filtrado[colunas_simulados].std().round(1),
+            'alunos_acima_60': (df_filtrado[colunas_simulados] >= 6).sum(),
+            'porcentagem': df_porcentagem,
+        }
+
+
+@no(fluxo, 'ranking_risco', ['dados', 'particao'])
+def calcular_ranking_risco(dados, particao):
+    """Ranking de risco da escola inteira."""
+    return atualizar_ranking(dados[0], particao=particao)
+
 # CSS personalizado
 st.markdown("""
 <style>
@@ -44,10 +121,10 @@ st.markdown("""
 
 # Sidebar
 with st.sidebar:
-    st.markdown("""
+    st.markdown(f"""
     <div style="text-align: center; margin-bottom: 20px;">
         <h1 style="color: #2c3e50; font-size: 24px;">Simulados SAEB 2025</h1>
-        <h2 style="color: #3498db; font-size: 18px;">Escola Estadual Helena Dionysio</h2>
+        <h2 style="color: #3498db; font-size: 18px;">{nome_escola(escola)}</h2>
     </div>
     """, unsafe_allow_html=True)
 
@@ -56,17 +133,11 @@ with st.sidebar:
     #st.page_link("pages/2_SAEB_Descritores.py", label="📊 Relatório SAEB Descritores")
     #st.page_link("pages/1_SAEB_Metodologia.py", label="📈 Desempenho percentual")
 
-    # Carregar dados
+    # Carregar dados (só relido quando a partição ou o arquivo mudam)
     try:
-        df = pd.read_csv("pages/todos.csv", sep=',')
-
-        # Converter colunas de notas para numérico (tratando possíveis erros)
-        for col in df.columns:
-            if col.startswith('Sim'):
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        # Converter Turma para string para evitar problemas de ordenação
-        df['Turma'] = df['Turma'].astype(str)
+        definir(fluxo, 'particao', (escola, ano))
+        definir(fluxo, 'versao_dados', versao_arquivos(caminho_dados('mensais', escola, ano)))
+        df, quarentena, fatos = obter(fluxo, 'dados')
 
     except Exception as e:
         st.error(f"Erro ao carregar ou processar o arquivo: {str(e)}")
@@ -81,6 +152,9 @@ with st.sidebar:
         turmas_disponiveis = sorted(df["Turma"].unique(), key=lambda x: (len(x), x))
         turma_selecionada = st.selectbox("Turma:", turmas_disponiveis)
 
+    definir(fluxo, 'componente', componente_selecionada)
+    definir(fluxo, 'turma', turma_selecionada)
+
     # Rodapé
     st.markdown("---")
     st.markdown("""
@@ -91,26 +165,19 @@ with st.sidebar:
     """, unsafe_allow_html=True)
 
 # Filtrar dados
-df_filtrado = df[(df["Turma"] == turma_selecionada) & (df["Componente"] == componente_selecionada)]
+df_filtrado, colunas_simulados = obter(fluxo, 'filtrado')
 
 # Verificar se há dados
 if df_filtrado.empty:
     st.warning("Nenhum dado encontrado para os filtros selecionados.")
     st.stop()
 
-# Processar dados
-colunas_simulados = [col for col in df_filtrado.columns if col.startswith('Sim')]
-df_filtrado = df_filtrado[['Aluno'] + colunas_simulados]
-
-# Calcular métricas
-medias = df_filtrado[colunas_simulados].mean().round(1)
-desvios = df_filtrado[colunas_simulados].std().round(1)
-alunos_acima_60 = (df_filtrado[colunas_simulados] >= 6).sum()
-
-# Converter para porcentagem
-df_porcentagem = df_filtrado.copy()
-for col in colunas_simulados:
-    df_porcentagem[col] = (df_filtrado[col] * 10).round(1)
+# Calcular métricas e converter para porcentagem
+metricas = obter(fluxo, 'metricas')
+medias = metricas['medias']
+desvios = metricas['desvios']
+alunos_acima_60 = metricas['alunos_acima_60']
+df_porcentagem = metricas['porcentagem']
 
 # Header
 st.markdown(f"""
@@ -128,7 +195,7 @@ with col1:
     st.markdown("<span style='color: red; font-weight: bold;'>Em caso de nota zero e você tem frequência no dia do simulado. Por favor, entrar em contato com o professor da disciplina da sua série.</span>", unsafe_allow_html=True)
     # Gráfico de barras agrupadas
     fig = px.bar(
-        df_filtrado.melt(id_vars='Aluno', var_name='Simulado', value_name='Nota'),
+        fatia(fatos, componente_selecionada, turma_selecionada),
         x='Aluno',
         y='Nota',
         color='Simulado',
@@ -145,7 +212,7 @@ with col1:
         xaxis_tickangle=-45,
         legend_title_text='Simulados'
     )
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart_otimizado(fig, 'Notas por Simulado', use_container_width=True)
 
 with col2:
     st.markdown("### 📊 Métricas de Desempenho")
@@ -205,14 +272,16 @@ fig_evolucao.update_layout(
     plot_bgcolor='rgba(0,0,0,0)',
     paper_bgcolor='rgba(0,0,0,0)'
 )
-st.plotly_chart(fig_evolucao, use_container_width=True)
+plotly_chart_medido(fig_evolucao, use_container_width=True)
 
 # Tabela de alunos
 st.markdown("### 📋 Lista Completa de Alunos")
-st.dataframe(
-    df_porcentagem.style
-    .background_gradient(cmap='Blues', subset=colunas_simulados)
-    .format({col: "{:.1f}%" for col in colunas_simulados}),
+renderizar_tabela_paginada(
+    df_porcentagem,
+    chave='tabela_alunos_mensal',
+    faixas=[(colunas_simulados, LIMITES_GRADIENTE, estilos_gradiente('Blues', LIMITES_GRADIENTE))],
+    formato={col: "{:.1f}%" for col in colunas_simulados},
+    coluna_busca='Aluno',
     use_container_width=True,
     height=500,
     column_config={
@@ -222,44 +291,86 @@ st.dataframe(
     hide_index=True
 )
 
-# Análise individual por aluno
-st.markdown("### 🔍 Análise Individual por Aluno")
-aluno_selecionado = st.selectbox("Selecione um aluno:", df_filtrado['Aluno'].unique())
-
-if aluno_selecionado:
-    dados_aluno = df_filtrado[df_filtrado['Aluno'] == aluno_selecionado].iloc[0]
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.markdown(f"#### Desempenho de {aluno_selecionado}")
-        fig_aluno = px.bar(
-            x=colunas_simulados,
-            y=dados_aluno[colunas_simulados].values,
-            labels={'x': 'Simulado', 'y': 'Nota'},
-            text_auto=True,
-            color=colunas_simulados,
-            color_discrete_sequence=px.colors.qualitative.Pastel
-        )
-        fig_aluno.update_layout(showlegend=False)
-        fig_aluno.add_hline(y=6, line_dash="dash", line_color="red", annotation_text="Meta")
-        st.plotly_chart(fig_aluno, use_container_width=True)
-
-    with col2:
-        st.markdown("#### Notas Detalhadas")
-        for simulado, nota in dados_aluno[colunas_simulados].items():
-            st.metric(
-                label=simulado,
-                value=f"{nota:.1f}",
-                delta=f"{(nota - 6):.1f} vs meta" if nota else None,
-                delta_color="inverse" if nota and nota < 6 else "normal"
-
+# Análise individual por aluno: trocar o aluno só reexecuta esta seção
+@st.fragment
+def analise_individual():
+    df_filtrado, colunas_simulados = obter(fluxo, 'filtrado')
+    st.markdown("### 🔍 Análise Individual por Aluno")
+    aluno_selecionado = st.selectbox("Selecione um aluno:", df_filtrado['Aluno'].unique())
+
+    if aluno_selecionado:
+        dados_aluno = df_filtrado[df_filtrado['Aluno'] == aluno_selecionado].iloc[0]
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown(f"#### Desempenho de {aluno_selecionado}")
+            fig_aluno = px.bar(
+                x=colunas_simulados,
+                y=dados_aluno[colunas_simulados].values,
+                labels={'x': 'Simulado', 'y': 'Nota'},
+                text_auto=True,
+                color=colunas_simulados,
+                color_discrete_sequence=px.colors.qualitative.Pastel
             )
+            fig_aluno.update_layout(showlegend=False)
+            fig_aluno.add_hline(y=6, line_dash="dash", line_color="red", annotation_text="Meta")
+            plotly_chart_medido(fig_aluno, use_container_width=True)
+
+        with col2:
+            st.markdown("#### Notas Detalhadas")
+            for simulado, nota in dados_aluno[colunas_simulados].items():
+                st.metric(
+                    label=simulado,
+                    value=f"{nota:.1f}",
+                    delta=f"{(nota - 6):.1f} vs meta" if nota else None,
+                    delta_color="inverse" if nota and nota < 6 else "normal"
+
+                )
+
+
+analise_individual()
+
+
+# Alerta precoce: ranking de risco da escola inteira
+@st.fragment
+def alunos_em_risco():
+    st.markdown("### 🚨 Alunos em Risco - Todas as Turmas")
+    ranking_risco = obter(fluxo, 'ranking_risco')
+    componente_risco = st.selectbox("Componente do ranking:", ["Todos", "Matemática", "Português"], key='componente_risco')
+    if componente_risco != "Todos":
+        ranking_risco = ranking_risco[ranking_risco['Componente'] == componente_risco]
+
+    col_alto, col_medio, col_baixo = st.columns(3)
+    contagem_niveis = ranking_risco['Nível'].value_counts()
+    col_alto.metric("Risco alto", int(contagem_niveis.get('Alto', 0)))
+    col_medio.metric("Risco médio", int(contagem_niveis.get('Médio', 0)))
+    col_baixo.metric("Risco baixo", int(contagem_niveis.get('Baixo', 0)))
+
+    renderizar_tabela_paginada(
+        ranking_risco,
+        chave='tabela_risco',
+        faixas=[(['Risco'], LIMITES_RISCO, ESTILOS_DESEMPENHO[::-1])],
+        formato={
+            'Tendência': '{:+.2f}', 'Volatilidade': '{:.2f}', 'Média recente': '{:.1f}',
+            'Distância da meta': '{:.1f}', 'Última nota': '{:.1f}', 'Risco': '{:.1f}'
+        },
+        coluna_busca='Aluno',
+        hide_index=True,
+        use_container_width=True
+    )
+
+
+alunos_em_risco()
+
+exibir_payloads()
+exibir_quarentena(quarentena)
+exibir_diagnostico()
 
 st.markdown("---")
-st.markdown("""
+st.markdown(f"""
 <div style="text-align: center; color: #6B7280; font-size: 14px;">
-    <p>Escola Estadual Helena Dionysio - Recomposição da Aprendizagem - Plano de Ação</p>
+    <p>{nome_escola(escola)} - Recomposição da Aprendizagem - Plano de Ação</p>
     <p>© 2025 HD Analytic - Todos os direitos reservados</p>
 </div>
 """, unsafe_allow_html=True)
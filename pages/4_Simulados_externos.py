@@ -4,6 +4,17 @@ import plotly.express as px
 import plotly.graph_objects as go
 import re
 
+from analytics.agregacao import agregar_rede, finalizar, padronizar_externos
+from analytics.armazenamento import selecionar_particao, nome_escola, caminho_dados, fonte_dados, escolas, particoes
+from analytics.distribuicoes import resumir_grupos, figura_boxplot
+from analytics.fatos import construir_fatos, fatos_alunos
+from analytics.fluxo import versao_arquivos
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import iniciar_execucao, medir, cronometrado, exibir_diagnostico
+from analytics.mapa_calor import renderizar_mapa_calor
+from analytics.paineis import abas_preguicosas, conteudo_painel
+from analytics.ranking import indice_ranking, top, entre_notas
+
 # Configurações da página com estilo moderno
 st.set_page_config(
     page_title="SAEB Analytics",
@@ -12,6 +23,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('Simulados externos')
+
+escola, ano = selecionar_particao()
+
 # CSS personalizado para melhorar a aparência
 st.markdown("""
 <style>
@@ -52,22 +67,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Função para processar os dados do CSV
+@cronometrado('limpeza')
 def processar_dados(df):
-    # Renomear colunas para padronização
-    df.columns = ['Aluno', 'SAEB ACERTA BRASIL', 'CAEd 1', 'CAEd 2']
-    
-    # Converter vírgulas para pontos e transformar em float
-    for col in df.columns[1:]:
-        df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
-    
-    return df
+    # Renomear colunas e converter vírgulas para pontos (mesma rotina da agregação da rede)
+    return padronizar_externos(df)
 
 # Sidebar moderna
 with st.sidebar:
-    st.markdown("""
+    st.markdown(f"""
     <div style="text-align: center; margin-bottom: 20px;">
         <h1 style="color: #2c3e50; font-size: 24px;">Relatório Parcial SAEB 2025</h1>
-        <h2 style="color: #3498db; font-size: 18px;">Escola Estadual Helena Dionysio</h2>
+        <h2 style="color: #3498db; font-size: 18px;">{nome_escola(escola)}</h2>
     </div>
     """, unsafe_allow_html=True)
 
@@ -77,7 +87,9 @@ with st.sidebar:
     #st.page_link("pages/1_SAEB_Metodologia.py", label="📈 Desempenho percentual")
 
     # Carregar dados
-    df = pd.read_csv("pages/Simulados_ - CAED-.csv", sep=",")
+    with medir('carga_csv') as registro:
+        df = pd.read_csv(caminho_dados('simulados_externos', escola, ano), sep=",")
+        registro['linhas'] = len(df)
     
     # Processar dados
     df = processar_dados(df)
@@ -117,6 +129,8 @@ col1, col2, col3, col4 = st.columns(4)
 
 # Calcular estatísticas
 simulados = ['SAEB ACERTA BRASIL', 'CAEd 1', 'CAEd 2']
+# Formato longo (simulado, aluno, porcentagem) usado pelos gráficos abaixo
+fatos = construir_fatos(df, simulados, nome_valor='Porcentagem')
 medias = df[simulados].mean()
 media_geral = medias.mean().round(1)
 melhor_simulado = medias.idxmax()
@@ -204,49 +218,30 @@ fig1.update_layout(
     margin=dict(l=40, r=40, t=40, b=40)
 )
 
-st.plotly_chart(fig1, use_container_width=True)
+plotly_chart_medido(fig1, use_container_width=True)
 
 ## Seção 3: Mapa de Calor Interativo
 st.markdown("### 👥 Desempenho Individual por Simulado")
 
-# Gráfico de heatmap aprimorado
-df_melted = df.melt(id_vars=['Aluno'],
-                    value_vars=simulados,
-                    var_name='Simulado',
-                    value_name='Porcentagem')
-
-fig2 = px.density_heatmap(
-    df_melted,
-    x='Simulado',
-    y='Aluno',
-    z='Porcentagem',
-    color_continuous_scale='Viridis',
-    template='plotly_white',
-    labels={'Porcentagem': 'Acertos (%)'},
-    height=600
+# Mapa de calor agregado no servidor (faixas de alunos em turmas grandes)
+renderizar_mapa_calor(
+    df,
+    'Aluno',
+    simulados,
+    chave='mapa_calor_externos',
+    escala='Viridis'
 )
 
-# Adicionar anotações para valores
-fig2.update_traces(
-    hovertemplate="<b>%{y}</b><br>%{x}<br>%{z:.1f}%<extra></extra>",
-    showscale=True
-)
-
-fig2.update_layout(
-    xaxis_title="Simulado",
-    yaxis_title="Aluno",
-    yaxis={'categoryorder': 'total ascending'},
-    coloraxis_colorbar=dict(title="% Acertos")
-)
-
-st.plotly_chart(fig2, use_container_width=True)
-
 ## Seção 4: Top Alunos com Gráfico de Medalhas
 st.markdown("### 🏆 Top 5 Alunos")
 
+# Versão dos dados: identifica os índices de ranking e os painéis guardados
+versao_dados = (escola, ano, versao_arquivos(caminho_dados('simulados_externos', escola, ano)))
+
 # Calcular média por aluno
 df['Média Aluno'] = df[simulados].mean(axis=1)
-top_alunos = df.nlargest(5, 'Média Aluno')[['Aluno', 'Média Aluno']].round(2)
+ranking_medias = indice_ranking((escola, ano), 'Média Aluno', df['Média Aluno'], versao=versao_dados)
+top_alunos = df.loc[top(ranking_medias, 5), ['Aluno', 'Média Aluno']].round(2)
 
 # Criar gráfico de medalhas
 fig3 = go.Figure()
@@ -275,60 +270,68 @@ fig3.update_layout(
     margin=dict(l=100, r=40, t=40, b=40)
 )
 
-st.plotly_chart(fig3, use_container_width=True)
+plotly_chart_medido(fig3, use_container_width=True)
 
 ## Seção 5: Alunos acima de 60% em Abas Estilizadas
 st.markdown("### ✅ Alunos com Desempenho Acima de 60%")
 
-# Criar abas para cada simulado
-tabs = st.tabs(simulados)
+# Abas preguiçosas: só a aba aberta monta a tabela e o gráfico, guardados por versão dos dados
+
 
-for sim, tab in zip(simulados, tabs):
+def montar_aba_acima_60(sim):
+    """Tabela estilizada e gráfico de barras dos alunos com 60% ou mais no simulado."""
+    indice = indice_ranking((escola, ano), sim, df[sim], versao=versao_dados)
+    df_filtrado = df.loc[entre_notas(indice, 60, 100)].sort_values(sim, ascending=False, kind='stable')
+    tabela = (
+        df_filtrado[['Aluno', sim]].style
+        .background_gradient(cmap='Blues', subset=[sim])
+        .format({sim: "{:.1f}%"})
+    )
+    fig = None
+    if not df_filtrado.empty:
+        fig = px.bar(
+            df_filtrado,
+            y='Aluno',
+            x=sim,
+            orientation='h',
+            title=f'Desempenho no {sim}',
+            color=sim,
+            color_continuous_scale='Blues',
+            labels={sim: 'Porcentagem de Acertos (%)'},
+            height=400
+        )
+
+        fig.update_layout(
+            template='plotly_white',
+            yaxis={'categoryorder': 'total ascending'},
+            showlegend=False,
+            coloraxis_showscale=False
+        )
+
+        fig.update_traces(
+            hovertemplate='<b>%{y}</b><br>%{x:.1f}%<extra></extra>',
+            texttemplate='%{x:.1f}%',
+            textposition='inside'
+        )
+    return len(df_filtrado), tabela, fig
+
+
+for sim, (tab, aberta) in zip(simulados, abas_preguicosas(simulados, chave='abas_acima_60')):
+    if not aberta:
+        continue
     with tab:
         col_sim, col_graph = st.columns([1, 2])
-
-        # Filtro para alunos acima de 60%
-        df_filtrado = df[df[sim] >= 60].sort_values(sim, ascending=False)
+        linhas, tabela, fig = conteudo_painel(f'externos_acima_60_{sim}', versao_dados, lambda: montar_aba_acima_60(sim))
 
         # Tabela estilizada
         with col_sim:
-            st.dataframe(
-                df_filtrado[['Aluno', sim]].style
-                .background_gradient(cmap='Blues', subset=[sim])
-                .format({sim: "{:.1f}%"}),
-                height=400,
-                use_container_width=True
-            )
+            with medir('render_tabela', linhas=linhas):
+                st.dataframe(tabela, height=400, use_container_width=True)
 
         # Gráfico de barras
         with col_graph:
-            if not df_filtrado.empty:
-                fig = px.bar(
-                    df_filtrado,
-                    y='Aluno',
-                    x=sim,
-                    orientation='h',
-                    title=f'Desempenho no {sim}',
-                    color=sim,
-                    color_continuous_scale='Blues',
-                    labels={sim: 'Porcentagem de Acertos (%)'},
-                    height=400
-                )
-
-                fig.update_layout(
-                    template='plotly_white',
-                    yaxis={'categoryorder': 'total ascending'},
-                    showlegend=False,
-                    coloraxis_showscale=False
-                )
-
-                fig.update_traces(
-                    hovertemplate='<b>%{y}</b><br>%{x:.1f}%<extra></extra>',
-                    texttemplate='%{x:.1f}%',
-                    textposition='inside'
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
+            if fig is not None:
+                plotly_chart_medido(fig, use_container_width=True)
             else:
                 st.warning(f"Nenhum aluno atingiu 60% no {sim}", icon="⚠️")
 
@@ -339,20 +342,12 @@ st.markdown("### 📊 Evolução Individual dos Alunos")
 alunos_selecionados = st.multiselect(
     "Selecione os alunos para análise detalhada:",
     options=df['Aluno'].unique(),
-    default=df.nlargest(3, 'Média Aluno')['Aluno'].tolist()
+    default=df.loc[top(ranking_medias, 3), 'Aluno'].tolist()
 )
 
 if alunos_selecionados:
-    df_selecionados = df[df['Aluno'].isin(alunos_selecionados)]
-    df_melted_selecionados = df_selecionados.melt(
-        id_vars=['Aluno'], 
-        value_vars=simulados, 
-        var_name='Simulado', 
-        value_name='Porcentagem'
-    )
-    
     fig_evolucao = px.line(
-        df_melted_selecionados,
+        fatos_alunos(fatos['tabela'], alunos_selecionados),
         x='Simulado',
         y='Porcentagem',
         color='Aluno',
@@ -367,7 +362,7 @@ if alunos_selecionados:
         yaxis_range=[0, 100]
     )
     
-    st.plotly_chart(fig_evolucao, use_container_width=True)
+    plotly_chart_medido(fig_evolucao, use_container_width=True)
 else:
     st.info("Selecione pelo menos um aluno para visualizar a evolução individual.")
 
@@ -388,26 +383,30 @@ for sim in simulados:
 estatisticas.index = ['Mínimo', 'Máximo', 'Média', 'Mediana', 'Desvio Padrão']
 
 # Exibir tabela
-st.dataframe(estatisticas.style.format("{:.2f}%"), use_container_width=True)
+with medir('render_tabela', linhas=len(estatisticas)):
+    st.dataframe(estatisticas.style.format("{:.2f}%"), use_container_width=True)
+
+# Mesmas estatísticas somando todas as escolas da rede no ano
+escolas_rede = [e for e in escolas() if particoes('simulados_externos', e, ano)]
+if len(escolas_rede) > 1:
+    with st.expander(f"🌐 Estatísticas da rede ({len(escolas_rede)} escolas)"):
+        estatisticas_rede, por_escola = agregar_rede('simulados_externos', ano, escolas_rede)
+        st.dataframe(estatisticas_rede[simulados].style.format("{:.2f}%"), use_container_width=True)
+
+        # Média de cada escola, calculada a partir dos agregados parciais
+        medias_escolas = pd.DataFrame({
+            nome_escola(e): finalizar(parcial).loc['Média'] for e, parcial in por_escola.items()
+        }).T.reindex(columns=simulados)
+        st.dataframe(medias_escolas.style.format("{:.2f}%"), use_container_width=True)
+        st.caption("Mediana da rede aproximada por histograma (faixas de 0,1 ponto percentual).")
 
 ## Seção 8: Gráfico de Estatísticas Descritivas
 st.markdown("### 📊 Visualização das Estatísticas Descritivas")
 
-# Preparar dados para o gráfico
-estatisticas_melted = estatisticas.reset_index().melt(
-    id_vars='index', 
-    value_vars=simulados, 
-    var_name='Simulado', 
-    value_name='Valor'
-)
-estatisticas_melted.rename(columns={'index': 'Estatística'}, inplace=True)
-
-# Criar gráfico de barras agrupadas
+# Criar gráfico de barras agrupadas direto da tabela larga (uma série por estatística)
 fig_estatisticas = px.bar(
-    estatisticas_melted,
-    x='Simulado',
-    y='Valor',
-    color='Estatística',
+    estatisticas.T.rename_axis('Simulado').rename_axis('Estatística', axis=1),
+    y=list(estatisticas.index),
     barmode='group',
     title='Estatísticas Descritivas por Simulado',
     labels={'Valor': 'Valor (%)', 'Simulado': 'Simulado'},
@@ -429,44 +428,32 @@ fig_estatisticas.update_layout(
     uniformtext_mode='hide'
 )
 
-st.plotly_chart(fig_estatisticas, use_container_width=True)
+plotly_chart_medido(fig_estatisticas, use_container_width=True)
 
 ## Seção 9: Boxplot de Distribuição
 st.markdown("### 📦 Distribuição de Notas por Simulado")
 
-# Criar boxplot
-fig_boxplot = px.box(
-    df.melt(value_vars=simulados, var_name='Simulado', value_name='Porcentagem'),
-    x='Simulado',
-    y='Porcentagem',
-    color='Simulado',
+# Criar boxplot com quartis e atípicos calculados no servidor (um resumo por simulado)
+fig_boxplot = figura_boxplot(
+    resumir_grupos(fatos['tabela'], 'Porcentagem', 'Simulado'),
+    nome_valor='Nota (%)',
     title='Distribuição de Notas por Simulado',
-    template='plotly_white',
     height=500
 )
 
 fig_boxplot.update_layout(
     xaxis_title="Simulado",
-    yaxis_title="Porcentagem de Acertos (%)",
-    showlegend=False
+    yaxis_title="Porcentagem de Acertos (%)"
 )
 
-# Adicionar pontos individuais
-fig_boxplot.add_trace(go.Scatter(
-    x=df.melt(value_vars=simulados, var_name='Simulado', value_name='Porcentagem')['Simulado'],
-    y=df.melt(value_vars=simulados, var_name='Simulado', value_name='Porcentagem')['Porcentagem'],
-    mode='markers',
-    marker=dict(color='rgba(0,0,0,0.3)', size=5),
-    name='Alunos',
-    hovertemplate='<b>%{x}</b><br>Nota: %{y:.1f}%<extra></extra>'
-))
+plotly_chart_medido(fig_boxplot, use_container_width=True)
 
-st.plotly_chart(fig_boxplot, use_container_width=True)
+exibir_diagnostico()
 
 st.markdown("---")
-st.markdown("""
+st.markdown(f"""
 <div style="text-align: center; color: #6B7280; font-size: 14px;">
-    <p>Escola Estadual Helena Dionysio - Recomposição da Aprendizagem - Plano de Ação</p>
+    <p>{nome_escola(escola)} - Recomposição da Aprendizagem - Plano de Ação</p>
     <p>© 2025 HD Analytic - Todos os direitos reservados</p>
 </div>
 """, unsafe_allow_html=True)
@@ -5,6 +5,17 @@ import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime
 
+from analytics.exportacao import renderizar_exportacao
+from analytics.fluxo import versao_arquivos
+from analytics.armazenamento import selecionar_particao, nome_escola, caminho_dados, fonte_dados
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import iniciar_execucao, medir, cronometrado, exibir_diagnostico
+from analytics.memoria import compartilhado, visao
+from analytics.persistencia import persistente
+from analytics.ranking import indice_ranking, top
+from analytics.tabelas import renderizar_tabela_paginada, estilos_gradiente
+from analytics.validacao import validar_notas, exibir_quarentena
+
 # Configurações da página
 st.set_page_config(
     page_title="Dashboard LAM - Análise de Simulados",
@@ -13,6 +24,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('Simulados LAM')
+
+escola, ano = selecionar_particao()
+
 # CSS personalizado moderno
 st.markdown("""
 <style>
@@ -166,9 +181,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Carregar dados
-@st.cache_data
-def load_data():
-    df = pd.read_csv("pages/Simulados_ - LAM.csv")
+@compartilhado
+@persistente
+def load_data(caminho):
+    df = pd.read_csv(caminho)
     df.columns = ['Aluno', 'Série', 'Turma', 'S1', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7']
     return df
 
@@ -178,13 +194,15 @@ SIMULADOS = list(MAX_SCORES.keys())
 SIMULADOS_PERCENT = [f'{s}_%' for s in SIMULADOS]
 
 # Funções auxiliares
+@cronometrado('calcular_porcentagens')
 def calcular_porcentagens(df):
     """Calcula porcentagens baseadas nas pontuações máximas"""
-    df_percent = df.copy()
+    df_percent = visao(df)
     for sim, max_score in MAX_SCORES.items():
         df_percent[f'{sim}_%'] = (df[sim] / max_score) * 100
     return df_percent
 
+@cronometrado('agregacao')
 def calcular_estatisticas_simulados(df_percent):
     """Calcula estatísticas para cada simulado"""
     estatisticas = []
@@ -261,31 +279,35 @@ def criar_grafico_comparativo(df_estatisticas):
     return fig
 
 def formatar_tabela(df):
-    """Formata a tabela com gradientes de cores"""
-    def format_table(styler):
-        return (styler
-            .format({
-                'Média': '{:.1f}%',
-                'Desvio Padrão': '{:.1f}%',
-                '% Acima de 60%': '{:.1f}%'
-            })
-            .background_gradient(subset=['Média', '% Acima de 60%'], cmap='RdYlGn', vmin=0, vmax=100)
-            .background_gradient(subset=['Desvio Padrão'], cmap='RdYlGn_r', vmin=0, vmax=30)
-            .set_properties(**{
-                'background-color': '#1e293b',
-                'color': 'white',
-                'border': '1px solid #334155'
-            })
-            .set_table_styles([
-                {'selector': 'th', 'props': [('background-color', '#2563eb'), ('color', 'white'), ('font-weight', 'bold')]},
-                {'selector': 'tr:hover', 'props': [('background-color', '#334155')]}
-            ])
-        )
-    
-    return format_table(df.style)
+    """Exibe a tabela com faixas de cores calculadas de forma vetorizada"""
+    limites_percentual = [20, 40, 60, 80]
+    limites_desvio = [6, 12, 18, 24]
+    renderizar_tabela_paginada(
+        df,
+        chave='tabela_simulados_lam',
+        faixas=[
+            (['Média', '% Acima de 60%'], limites_percentual, estilos_gradiente('RdYlGn', limites_percentual)),
+            (['Desvio Padrão'], limites_desvio, estilos_gradiente('RdYlGn_r', limites_desvio, vmax=30)),
+        ],
+        formato={
+            'Média': '{:.1f}%',
+            'Desvio Padrão': '{:.1f}%',
+            '% Acima de 60%': '{:.1f}%'
+        },
+        propriedades={
+            'background-color': '#1e293b',
+            'color': 'white',
+            'border': '1px solid #334155'
+        },
+        use_container_width=True,
+        height=300
+    )
 
 # Carregar e processar dados
-df = load_data()
+with medir('carga_csv') as registro:
+    df = load_data(caminho_dados('lam', escola, ano))
+    registro['linhas'] = len(df)
+df, quarentena = validar_notas(df, SIMULADOS, MAX_SCORES, fonte_dados('lam', escola, ano), chaves=['Aluno'])
 df_percent = calcular_porcentagens(df)
 df_percent['Media_Geral_%'] = df_percent[SIMULADOS_PERCENT].mean(axis=1)
 
@@ -349,7 +371,8 @@ with col4:
 st.markdown('<div class="section-header"><h3>🏆 Top 3 Alunos - Destaques</h3></div>', unsafe_allow_html=True)
 
 # Identificar top 3 alunos
-top3_alunos = df_percent.nlargest(3, 'Media_Geral_%')
+versao_dados = versao_arquivos(caminho_dados('lam', escola, ano))
+top3_alunos = df_percent.loc[top(indice_ranking((escola, ano), 'Media_Geral_%', df_percent['Media_Geral_%'], versao=versao_dados), 3)]
 
 col5, col6, col7 = st.columns(3)
 medalhas = ["🥇", "🥈", "🥉"]
@@ -396,7 +419,7 @@ df_estatisticas = calcular_estatisticas_simulados(df_percent)
 
 # Gráfico comparativo entre simulados
 fig_comparativo_simulados = criar_grafico_comparativo(df_estatisticas)
-st.plotly_chart(fig_comparativo_simulados, use_container_width=True)
+plotly_chart_medido(fig_comparativo_simulados, use_container_width=True)
 
 # Identificar simulados com melhor e pior desempenho
 melhor_simulado = df_estatisticas.loc[df_estatisticas['Média'].idxmax()]
@@ -447,20 +470,31 @@ with col10:
 # Tabela detalhada por simulado
 st.markdown("### 📋 Estatísticas Detalhadas por Simulado")
 
-df_display = df_estatisticas.copy()
+df_display = visao(df_estatisticas)
 df_display = df_display[['Simulado', 'Max_Score', 'Média', 'Desvio_Padrao', 'Acima_60', 'Percent_Acima_60']]
 df_display.columns = ['Simulado', 'Pontuação Máx', 'Média', 'Desvio Padrão', 'Acima de 60%', '% Acima de 60%']
 
-st.dataframe(
-    formatar_tabela(df_display),
-    use_container_width=True,
-    height=300
+formatar_tabela(df_display)
+
+renderizar_exportacao(
+    'exportacao_lam',
+    {
+        'Turma LAM': lambda: {
+            'Estatísticas por simulado': df_display,
+            'Notas dos alunos (%)': df_percent[['Aluno', 'Turma'] + SIMULADOS_PERCENT + ['Media_Geral_%']].round(1),
+        },
+    },
+    nome="Simulados_LAM",
+    titulo="Simulados LAM"
 )
 
+exibir_quarentena(quarentena)
+exibir_diagnostico()
+
 st.markdown("---")
-st.markdown("""
+st.markdown(f"""
 <div style="text-align: center; color: #6B7280; font-size: 14px;">
-    <p>Escola Estadual Helena Dionysio - Recomposição da Aprendizagem - Plano de Ação</p>
+    <p>{nome_escola(escola)} - Recomposição da Aprendizagem - Plano de Ação</p>
     <p>© 2025 HD Analytic - Todos os direitos reservados</p>
 </div>
 """, unsafe_allow_html=True)
@@ -4,7 +4,14 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime
-import scipy.stats as stats
+
+from analytics.armazenamento import selecionar_particao, caminho_dados, fonte_dados
+from analytics.estatisticas import comparar_edicoes, parear_edicoes
+from analytics.fluxo import criar_fluxo, definir, no, obter, versao_arquivos
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import iniciar_execucao, cronometrado, exibir_diagnostico
+from analytics.mapa_calor import renderizar_mapa_calor
+from analytics.validacao import validar_notas, exibir_quarentena
 
 # Configurações da página
 st.set_page_config(
@@ -14,6 +21,14 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('Comparativo PPR 1ED x 2ED')
+
+escola, ano = selecionar_particao()
+TURMA = "9º Ano A"
+
+# Cálculos da página e suas entradas: trocar o aluno não recalcula a turma
+fluxo = criar_fluxo('comparativo_ppr')
+
 # CSS personalizado para um visual mais moderno e atraente
 st.markdown("""
 <style>
@@ -73,11 +88,14 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_and_clean_data():
-    """Carrega e limpa os dados dos dois arquivos CSV."""
+@no(fluxo, 'dados', ['particao', 'versao_dados'])
+@cronometrado('carga_csv')
+def load_and_clean_data(particao, versao_dados):
+    """Carrega e limpa os dados dos dois arquivos CSV (a quarentena volta junto)."""
+    escola, ano = particao
     try:
-        df_1ed = pd.read_csv('pages/PPR_9A.csv', sep=';', decimal=',', encoding='utf-8-sig')
-        df_2ed = pd.read_csv('pages/PPR_9A_2ED.csv', sep=';', decimal=',', encoding='utf-8-sig')
+        df_1ed = pd.read_csv(caminho_dados('prova_parana_1ed', escola, ano, turma=TURMA), sep=';', decimal=',', encoding='utf-8-sig')
+        df_2ed = pd.read_csv(caminho_dados('prova_parana_2ed', escola, ano, turma=TURMA), sep=';', decimal=',', encoding='utf-8-sig')
 
         for df in [df_1ed, df_2ed]:
             df.columns = df.columns.str.strip()
@@ -88,6 +106,11 @@ def load_and_clean_data():
         disciplinas_1ed = [col for col in disciplinas if col in df_1ed.columns]
         disciplinas_2ed = [col for col in disciplinas if col in df_2ed.columns]
 
+        # Percentuais acima de 100, texto nas notas (ex.: 'CIÊNCiAS') e alunos repetidos
+        df_1ed, quarentena_1ed = validar_notas(df_1ed, disciplinas_1ed + ['percAcertosAluno'], 100, fonte_dados('prova_parana_1ed', escola, ano, turma=TURMA), chaves=['Aluno'])
+        df_2ed, quarentena_2ed = validar_notas(df_2ed, disciplinas_2ed + ['percAcertosAluno'], 100, fonte_dados('prova_parana_2ed', escola, ano, turma=TURMA), chaves=['Aluno'])
+        quarentena = pd.concat([quarentena_1ed, quarentena_2ed], ignore_index=True)
+
         for col in disciplinas_1ed + ['percAcertosAluno']:
             if col in df_1ed.columns:
                 df_1ed[col] = pd.to_numeric(df_1ed[col].astype(str).str.replace(',', '.'), errors='coerce')
@@ -96,17 +119,20 @@ def load_and_clean_data():
             if col in df_2ed.columns:
                 df_2ed[col] = pd.to_numeric(df_2ed[col].astype(str).str.replace(',', '.'), errors='coerce')
 
-        return df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed
+        return df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed, quarentena
 
-    except FileNotFoundError:
-        st.error("❌ Arquivos CSV não encontrados! Certifique-se de que 'PPR_9A.csv' e 'PPR_9A_2ED.csv' estão na mesma pasta.")
+    except FileNotFoundError as e:
+        st.error(f"❌ Arquivos CSV não encontrados! {e}")
         st.stop()
     except Exception as e:
         st.error(f"Ocorreu um erro ao carregar os dados: {e}")
         st.stop()
 
-def calcular_estatisticas(df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed):
+@no(fluxo, 'estatisticas', ['dados'])
+@cronometrado('calcular_estatisticas')
+def calcular_estatisticas(dados):
     """Calcula um dicionário de estatísticas comparativas."""
+    df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed, _ = dados
     stats_dict = {}
     disciplinas_comuns = sorted(list(set(disciplinas_1ed) & set(disciplinas_2ed)))
     stats_dict['disciplinas_comuns'] = disciplinas_comuns
@@ -126,20 +152,18 @@ def calcular_estatisticas(df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed):
     alunos_comuns = sorted(list(set(df_1ed['Aluno']) & set(df_2ed['Aluno'])))
     stats_dict['alunos_comuns'] = alunos_comuns
 
-    notas_1ed, notas_2ed = [], []
-    for aluno in alunos_comuns:
-        notas_1ed.append(df_1ed.loc[df_1ed['Aluno'] == aluno, 'percAcertosAluno'].iloc[0])
-        notas_2ed.append(df_2ed.loc[df_2ed['Aluno'] == aluno, 'percAcertosAluno'].iloc[0])
+    # Testes pareados, d de Cohen e IC bootstrap de todas as disciplinas de uma vez
+    comparacoes = comparar_edicoes(df_1ed, df_2ed, disciplinas_comuns + ['percAcertosAluno'])
+    stats_dict['comparacoes'] = comparacoes
+    geral = comparacoes.set_index('Disciplina').loc['percAcertosAluno']
 
-    stats_dict['alunos_melhoraram'] = sum(n2 > n1 for n1, n2 in zip(notas_1ed, notas_2ed))
+    notas_1ed, notas_2ed, _, _ = parear_edicoes(df_1ed, df_2ed, ['percAcertosAluno'])
+    stats_dict['alunos_melhoraram'] = int((notas_2ed > notas_1ed).sum())
     stats_dict['percent_melhoraram'] = (stats_dict['alunos_melhoraram'] / len(alunos_comuns)) * 100 if alunos_comuns else 0
 
-    if len(notas_1ed) > 1 and len(notas_2ed) > 1:
-        stats_dict['t_test'] = stats.ttest_rel(notas_1ed, notas_2ed)
-        stats_dict['cohen_d'] = (np.mean(notas_2ed) - np.mean(notas_1ed)) / np.sqrt((np.std(notas_1ed, ddof=1)**2 + np.std(notas_2ed, ddof=1)**2) / 2)
-    else:
-        stats_dict['t_test'] = type('obj', (), {'pvalue': 1.0})
-        stats_dict['cohen_d'] = 0
+    stats_dict['t_test'] = type('obj', (), {'pvalue': geral['p-valor']})
+    stats_dict['cohen_d'] = geral['Cohen d']
+    stats_dict['ic_evolucao'] = (geral['IC inferior'], geral['IC superior'])
         
     return stats_dict
 
@@ -244,28 +268,49 @@ def criar_grafico_radar_individual_2ed(df_2ed, stats_dict, aluno):
     )
     return fig
 
-def criar_grafico_heatmap_evolucao(df_1ed, df_2ed, stats_dict):
-    """Cria um heatmap mostrando a evolução individual por disciplina."""
-    dados_heatmap = []
-    for aluno in stats_dict['alunos_comuns']:
-        evolucoes_aluno = [
-            df_2ed.loc[df_2ed['Aluno'] == aluno, d].iloc[0] - df_1ed.loc[df_1ed['Aluno'] == aluno, d].iloc[0]
-            for d in stats_dict['disciplinas_comuns']
-        ]
-        dados_heatmap.append(evolucoes_aluno)
-
-    fig = px.imshow(
-        dados_heatmap, x=stats_dict['disciplinas_comuns'], y=stats_dict['alunos_comuns'],
-        color_continuous_scale='RdYlGn', aspect='auto',
-        title="🔥 Mapa de Calor da Evolução (2ª Edição - 1ª Edição)",
-        labels=dict(x="Disciplina", y="Aluno", color="Variação (%)")
+@no(fluxo, 'evolucao', ['dados', 'estatisticas'])
+def calcular_evolucao_individual(dados, stats_dict):
+    """Calcula a variação (2ª Edição - 1ª Edição) de cada aluno em cada disciplina."""
+    df_1ed, df_2ed = dados[:2]
+    disciplinas = stats_dict['disciplinas_comuns']
+    alunos = stats_dict['alunos_comuns']
+    notas_1ed = df_1ed.drop_duplicates('Aluno').set_index('Aluno').loc[alunos, disciplinas]
+    notas_2ed = df_2ed.drop_duplicates('Aluno').set_index('Aluno').loc[alunos, disciplinas]
+    return (notas_2ed - notas_1ed).reset_index()
+
+@st.fragment
+def analise_individual():
+    """Seção 3: trocar o aluno só reexecuta esta seção, com os dados já calculados."""
+    df_1ed, df_2ed = obter(fluxo, 'dados')[:2]
+    stats_dict = obter(fluxo, 'estatisticas')
+    st.markdown('<div class="section-header"><h3>Aluno: Análise Individual Comparativa</h3></div>', unsafe_allow_html=True)
+    aluno_selecionado = st.selectbox(
+        "Selecione um aluno para uma análise detalhada:",
+        options=stats_dict['alunos_comuns'],
+        index=0
     )
-    fig.update_layout(template='plotly_dark', height=max(400, len(stats_dict['alunos_comuns']) * 20))
-    return fig
+    if aluno_selecionado:
+        # Layout atualizado com os dois gráficos de radar individuais
+        col_i1, col_i2 = st.columns(2)
+        with col_i1:
+            plotly_chart_medido(criar_grafico_radar_individual_1ed(df_1ed, stats_dict, aluno_selecionado), use_container_width=True)
+        with col_i2:
+            plotly_chart_medido(criar_grafico_radar_individual_2ed(df_2ed, stats_dict, aluno_selecionado), use_container_width=True)
 
 def main():
-    df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed = load_and_clean_data()
-    stats_dict = calcular_estatisticas(df_1ed, df_2ed, disciplinas_1ed, disciplinas_2ed)
+    try:
+        versao_dados = versao_arquivos(
+            caminho_dados('prova_parana_1ed', escola, ano, turma=TURMA),
+            caminho_dados('prova_parana_2ed', escola, ano, turma=TURMA),
+        )
+    except FileNotFoundError as e:
+        st.error(f"❌ Arquivos CSV não encontrados! {e}")
+        st.stop()
+    definir(fluxo, 'particao', (escola, ano))
+    definir(fluxo, 'versao_dados', versao_dados)
+    quarentena = obter(fluxo, 'dados')[-1]
+    exibir_quarentena(quarentena)
+    stats_dict = obter(fluxo, 'estatisticas')
 
     # --- HEADER ---
     st.markdown("""
@@ -318,28 +363,16 @@ def main():
 
     # --- SEÇÃO 2: ANÁLISE GERAL DA TURMA ---
     st.markdown('<div class="section-header"><h3>Turma: Análise Geral do Desempenho</h3></div>', unsafe_allow_html=True)
-    st.plotly_chart(criar_grafico_barras_comparativo(stats_dict), use_container_width=True)
+    plotly_chart_medido(criar_grafico_barras_comparativo(stats_dict), use_container_width=True)
     
     col_r1, col_r2 = st.columns(2)
     with col_r1:
-        st.plotly_chart(criar_grafico_radar_turma(stats_dict, edicao=1), use_container_width=True)
+        plotly_chart_medido(criar_grafico_radar_turma(stats_dict, edicao=1), use_container_width=True)
     with col_r2:
-        st.plotly_chart(criar_grafico_radar_turma(stats_dict, edicao=2), use_container_width=True)
+        plotly_chart_medido(criar_grafico_radar_turma(stats_dict, edicao=2), use_container_width=True)
 
     # --- SEÇÃO 3: ANÁLISE INDIVIDUAL ---
-    st.markdown('<div class="section-header"><h3>Aluno: Análise Individual Comparativa</h3></div>', unsafe_allow_html=True)
-    aluno_selecionado = st.selectbox(
-        "Selecione um aluno para uma análise detalhada:",
-        options=stats_dict['alunos_comuns'],
-        index=0
-    )
-    if aluno_selecionado:
-        # Layout atualizado com os dois gráficos de radar individuais
-        col_i1, col_i2 = st.columns(2)
-        with col_i1:
-            st.plotly_chart(criar_grafico_radar_individual_1ed(df_1ed, stats_dict, aluno_selecionado), use_container_width=True)
-        with col_i2:
-            st.plotly_chart(criar_grafico_radar_individual_2ed(df_2ed, stats_dict, aluno_selecionado), use_container_width=True)
+    analise_individual()
 
     # --- SEÇÃO 4: ANÁLISE SAEB E ESTATÍSTICA ---
     st.markdown('<div class="section-header"><h3>🔍 Análise SAEB e Veredito Estatístico</h3></div>', unsafe_allow_html=True)
@@ -369,11 +402,36 @@ def main():
             st.success("A melhora geral da turma é **estatisticamente significativa**.")
         else:
             st.warning("A variação geral da turma **não é estatisticamente significativa**.")
+        ic_inf, ic_sup = stats_dict['ic_evolucao']
+        st.caption(f"IC 95% (bootstrap) da evolução média: {ic_inf:+.1f} a {ic_sup:+.1f} p.p.")
+
+    st.markdown("#### 📑 Significância por Disciplina")
+    tabela_sig = stats_dict['comparacoes'].drop(columns=['Grupo', 't'])
+    tabela_sig['Disciplina'] = tabela_sig['Disciplina'].replace({'percAcertosAluno': 'GERAL'})
+    st.dataframe(
+        tabela_sig.style.format({
+            'Média 1ª Ed.': '{:.1f}%', 'Média 2ª Ed.': '{:.1f}%', 'Diferença': '{:+.1f}',
+            'IC inferior': '{:+.1f}', 'IC superior': '{:+.1f}', 'p-valor': '{:.4f}', 'Cohen d': '{:.2f}'
+        }),
+        hide_index=True, use_container_width=True
+    )
 
     # --- SEÇÃO 5: MAPA DE CALOR ---
     st.markdown('<div class="section-header"><h3>🔥 Mapa de Calor da Evolução Individual</h3></div>', unsafe_allow_html=True)
     st.info("O mapa abaixo mostra a variação de desempenho de cada aluno em cada disciplina. **Verde** significa melhora, e **vermelho** significa piora.")
-    st.plotly_chart(criar_grafico_heatmap_evolucao(df_1ed, df_2ed, stats_dict), use_container_width=True)
+    renderizar_mapa_calor(
+        obter(fluxo, 'evolucao'),
+        'Aluno',
+        stats_dict['disciplinas_comuns'],
+        chave='mapa_calor_evolucao',
+        escala='RdYlGn',
+        template='plotly_dark',
+        rotulo_cor='Variação (%)',
+        titulo="🔥 Mapa de Calor da Evolução (2ª Edição - 1ª Edição)",
+        zmid=0
+    )
+
+    exibir_diagnostico()
 
 if __name__ == "__main__":
     main()
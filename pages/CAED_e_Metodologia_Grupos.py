@@ -6,6 +6,16 @@ import os
 import plotly.graph_objects as go
 import plotly.express as px
 
+from analytics.agrupamento import agrupar_homogeneos, habilidades_frageis
+from analytics.armazenamento import selecionar_particao, particoes, caminho_dados
+from analytics.fluxo import versao_arquivos
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import iniciar_execucao, medir, cronometrado, exibir_diagnostico
+from analytics.memoria import compartilhado
+from analytics.paineis import conteudo_painel
+from analytics.persistencia import persistente
+from analytics.recomendacao import recomendar, tabela_recomendacoes
+
 # --- Configuração da Página e Estilo ---
 st.set_page_config(
     page_title="Painel de Recomposição - CESB Analytics",
@@ -13,6 +23,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('CAEd e metodologia de grupos')
+
+escola, ano = selecionar_particao()
+
 # --- CSS para uma apresentação mais elegante ---
 st.markdown("""
 <style>
@@ -128,9 +142,13 @@ DESCRICOES_HABILIDADES = {
     }
 }
 
+# Nos grupos homogêneos, as habilidades foco contam esse tanto na semelhança entre alunos
+PESO_HABILIDADE_FOCO = 2
+
 # --- Funções Utilitárias ---
 
-@st.cache_data
+@compartilhado
+@persistente
 def carregar_dados(nome_arquivo):
     """Carrega um arquivo CSV com tratamento de erros e encoding."""
     try:
@@ -153,6 +171,16 @@ def carregar_dados(nome_arquivo):
         st.error(f"Erro ao carregar o arquivo '{nome_arquivo}': {e}")
         return None
 
+@compartilhado
+def recomendacoes_habilidades(nome_arquivo, versao, aluno_col, turma_col, habilidades_cols):
+    """Habilidades a reforçar de cada aluno da avaliação, montadas uma vez por versão do arquivo."""
+    df = carregar_dados(nome_arquivo)
+    # Nota 0, 1 ou 2 (acima de 2 conta como domínio pleno) vira domínio entre 0 e 1
+    notas = df[list(habilidades_cols)].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    dominio = np.clip(notas, 0, 2) / 2
+    return recomendar(dominio, df[aluno_col].tolist(), [h.strip() for h in habilidades_cols],
+                      turmas=df[turma_col].astype(str).to_numpy())
+
 def encontrar_colunas_info(df):
     """Encontra as colunas de aluno e turma no DataFrame."""
     aluno_col, turma_col = None, None
@@ -172,6 +200,7 @@ def get_descricao_habilidade(codigo, avaliacao_selecionada):
 
 # --- Lógica de Geração de Grupos ---
 
+@cronometrado('formar_grupos_heterogeneos')
 def formar_grupos_heterogeneos(alunos_df, habilidades_selecionadas, max_por_grupo, aluno_col):
     """Forma grupos heterogêneos priorizando um núcleo com diferentes níveis de domínio."""
     if alunos_df.empty or not habilidades_selecionadas:
@@ -216,6 +245,13 @@ def formar_grupos_heterogeneos(alunos_df, habilidades_selecionadas, max_por_grup
             
     return [g for g in grupos if g]
 
+def montar_grupos_homogeneos(df_filtrado, habilidades_cols, habilidades_foco, avaliacao_selecionada, max_por_grupo):
+    """Agrupa os alunos que não dominam as mesmas habilidades e lista as habilidades frágeis de cada grupo."""
+    pesos = {hab: PESO_HABILIDADE_FOCO for hab in habilidades_foco}
+    grupos = agrupar_homogeneos(df_filtrado, habilidades_cols, max_por_grupo, pesos)
+    frageis = habilidades_frageis(grupos, DESCRICOES_HABILIDADES.get(avaliacao_selecionada, {}))
+    return grupos, frageis
+
 def analisar_composicao_grupos(grupos):
     """Cria um DataFrame com a composição de cada grupo."""
     composicao = []
@@ -238,16 +274,8 @@ def analisar_composicao_grupos(grupos):
 
 # --- Funções para Renderizar as Páginas ---
 
-def render_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, turmas_selecionadas, turma_col):
-    """Renderiza a página de Visão Geral com estatísticas agregadas."""
-    st.header("📈 Visão Geral da Turma")
-    st.markdown("Análise consolidada do desempenho nas habilidades, destacando pontos fortes e de atenção.")
-
-    if not habilidades_cols:
-        st.warning("Nenhuma coluna de habilidade (H01, H02, etc.) foi encontrada no arquivo carregado.")
-        return
-
-    st.subheader("Habilidades com Maior e Menor Domínio")
+def montar_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, turmas_selecionadas, turma_col):
+    """Tabela de domínio por habilidade e gráfico comparativo por turma (None sem dados)."""
     dominio_por_habilidade = []
     for hab in habilidades_cols:
         # Domínio é considerado quando a pontuação é maior que 0
@@ -259,17 +287,7 @@ def render_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, tur
         })
     
     df_dominio = pd.DataFrame(dominio_por_habilidade).sort_values("Domínio (%)", ascending=False)
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        st.write("**✅ Top 5 - Maior Domínio**")
-        st.dataframe(df_dominio.head(5), hide_index=True, use_container_width=True)
-    with col2:
-        st.write("**❌ Top 5 - Menor Domínio**")
-        st.dataframe(df_dominio.tail(5).sort_values("Domínio (%)", ascending=True), hide_index=True, use_container_width=True)
 
-    # --- INÍCIO DA ALTERAÇÃO ---
-    st.subheader("Comparativo de Desempenho por Habilidade e Turma")
     desempenho_data = []
     for turma in turmas_selecionadas:
         df_turma = df_filtrado[df_filtrado[turma_col] == turma]
@@ -278,6 +296,7 @@ def render_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, tur
             desempenho_data.append({"Turma": turma, "Habilidade": hab, "Domínio (%)": dominio})
     
     df_desempenho = pd.DataFrame(desempenho_data)
+    fig = None
     if not df_desempenho.empty:
         fig = px.bar(
             df_desempenho,
@@ -298,11 +317,39 @@ def render_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, tur
             textangle=0, 
             textposition='outside' # Garante que o texto fique fora da barra
         )
-        st.plotly_chart(fig, use_container_width=True)
-    # --- FIM DA ALTERAÇÃO ---
+    return df_dominio, fig
+
+
+def render_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, turmas_selecionadas, turma_col, versao):
+    """Renderiza a página de Visão Geral com estatísticas agregadas."""
+    st.header("📈 Visão Geral da Turma")
+    st.markdown("Análise consolidada do desempenho nas habilidades, destacando pontos fortes e de atenção.")
+
+    if not habilidades_cols:
+        st.warning("Nenhuma coluna de habilidade (H01, H02, etc.) foi encontrada no arquivo carregado.")
+        return
+
+    # Montada uma vez por versão dos dados e filtro de turmas; voltar a esta página não refaz as contas
+    df_dominio, fig = conteudo_painel(
+        'caed_visao_geral', (versao, tuple(turmas_selecionadas)),
+        lambda: montar_visao_geral(df_filtrado, habilidades_cols, avaliacao_selecionada, turmas_selecionadas, turma_col)
+    )
+
+    st.subheader("Habilidades com Maior e Menor Domínio")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**✅ Top 5 - Maior Domínio**")
+        st.dataframe(df_dominio.head(5), hide_index=True, use_container_width=True)
+    with col2:
+        st.write("**❌ Top 5 - Menor Domínio**")
+        st.dataframe(df_dominio.tail(5).sort_values("Domínio (%)", ascending=True), hide_index=True, use_container_width=True)
+
+    st.subheader("Comparativo de Desempenho por Habilidade e Turma")
+    if fig is not None:
+        plotly_chart_medido(fig, use_container_width=True)
 
 
-def render_analise_individual(df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col):
+def render_analise_individual(df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col, recomendacoes):
     """Renderiza a página de Análise Individual com o gráfico de radar."""
     st.header("🧑‍🎓 Análise Individual por Aluno")
     
@@ -336,7 +383,7 @@ def render_analise_individual(df_filtrado, habilidades_cols, avaliacao_seleciona
             title=f"Radar de Desempenho - {aluno_selecionado}",
             height=500
         )
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart_medido(fig, use_container_width=True)
         
         # Detalhes das habilidades em colunas
         col1, col2, col3 = st.columns(3)
@@ -353,10 +400,57 @@ def render_analise_individual(df_filtrado, habilidades_cols, avaliacao_seleciona
             for hab in [h for h in habilidades_cols if aluno_data.get(h, 0) >= 2]:
                  st.write(f"**{hab}**: {get_descricao_habilidade(hab, avaliacao_selecionada)}")
 
-def render_gerador_grupos(df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col):
+        # Lista guardada com os dados em cache: aqui só é lida
+        st.subheader("🎯 Próximas Habilidades a Reforçar")
+        tabela_reforco = tabela_recomendacoes(
+            recomendacoes, aluno_selecionado, DESCRICOES_HABILIDADES.get(avaliacao_selecionada, {}), rotulo='Habilidade'
+        )
+        if tabela_reforco.empty:
+            st.success("O aluno domina plenamente todas as habilidades avaliadas.")
+        else:
+            st.caption("Ordem de prioridade pelos erros do aluno e pela dificuldade da habilidade na turma.")
+            st.dataframe(tabela_reforco.drop(columns='Pré-requisito de'), hide_index=True, use_container_width=True)
+
+def render_grupos_homogeneos(df_filtrado, habilidades_cols, habilidades_foco, avaliacao_selecionada, aluno_col, max_por_grupo, versao):
+    """Grupos de recuperação: alunos com as mesmas habilidades frágeis, com a descrição de cada uma."""
+    grupos, frageis = conteudo_painel(
+        'caed_grupos_homogeneos', (versao, tuple(df_filtrado.index), tuple(habilidades_foco), max_por_grupo),
+        lambda: montar_grupos_homogeneos(df_filtrado, habilidades_cols, habilidades_foco, avaliacao_selecionada, max_por_grupo)
+    )
+    rotulos = grupos['rotulos'] + 1
+
+    st.markdown("---")
+    st.subheader("📊 Habilidades Frágeis por Grupo")
+    resumo = pd.DataFrame({'Alunos': rotulos.value_counts().sort_index()})
+    resumo['Habilidades frágeis'] = frageis.groupby('Grupo')['Habilidade'].agg(', '.join)
+    resumo = resumo.fillna({'Habilidades frágeis': '—'}).rename_axis('Grupo')
+    with medir('render_tabela', linhas=len(resumo)):
+        st.dataframe(resumo, use_container_width=True)
+
+    st.subheader("📋 Detalhes dos Grupos Formados")
+    medias = df_filtrado[habilidades_cols].mean(axis=1)
+    num_colunas = 2
+    colunas = st.columns(num_colunas)
+    for i, (grupo, membros) in enumerate(rotulos.groupby(rotulos)):
+        with colunas[i % num_colunas]:
+            with st.expander(f"Grupo {grupo} ({len(membros)} alunos)", expanded=True):
+                st.markdown("**🧑‍🎓 Integrantes:**")
+                for indice in medias.loc[membros.index].sort_values(ascending=False).index:
+                    st.markdown(f"- **{df_filtrado.at[indice, aluno_col]}** (média {medias[indice]:.2f})")
+                frageis_grupo = frageis[frageis['Grupo'] == grupo]
+                if frageis_grupo.empty:
+                    st.success("Nenhuma habilidade sem domínio compartilhada pela maioria do grupo.")
+                else:
+                    st.markdown("**❌ Habilidades a retomar:**")
+                    for linha in frageis_grupo.to_dict('records'):
+                        st.write(f"**{linha['Habilidade']}** ({linha['Sem domínio (%)']:.0f}% sem domínio): {linha['Descrição']}")
+
+
+def render_gerador_grupos(df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col, versao):
     """Renderiza a página do Gerador de Grupos."""
     st.header("👥 Gerador de Grupos Pedagógicos")
-    st.markdown("Selecione as **habilidades foco** para criar grupos de trabalho heterogêneos e equilibrados.")
+    st.markdown("Selecione as **habilidades foco** para criar grupos de trabalho heterogêneos e equilibrados, "
+                "ou grupos homogêneos de recuperação com os alunos que não dominam as mesmas habilidades.")
     
     if not habilidades_cols:
         st.warning("Nenhuma coluna de habilidade (H01, H02, etc.) foi encontrada para formar grupos.")
@@ -371,7 +465,20 @@ def render_gerador_grupos(df_filtrado, habilidades_cols, avaliacao_selecionada,
     habilidades_selecionadas = [opcoes_habilidades[desc] for desc in habilidades_formatadas]
     
     max_alunos_por_grupo = st.slider("Máximo de alunos por grupo:", 2, 8, 4)
-    
+    tipo_grupo = st.radio(
+        "Tipo de grupo:",
+        ["Heterogêneos (trabalho em pares)", "Homogêneos (recuperação)"],
+        horizontal=True
+    )
+
+    if tipo_grupo.startswith("Homogêneos"):
+        if df_filtrado.empty:
+            st.warning("Nenhum aluno selecionado no filtro de turmas.")
+        else:
+            render_grupos_homogeneos(df_filtrado, habilidades_cols, habilidades_selecionadas, avaliacao_selecionada,
+                                     aluno_col, max_alunos_por_grupo, versao)
+        return
+
     if st.button("🚀 Gerar Grupos", type="primary", use_container_width=True):
         if not habilidades_selecionadas:
             st.error("Por favor, selecione pelo menos uma habilidade foco.")
@@ -388,10 +495,11 @@ def render_gerador_grupos(df_filtrado, habilidades_cols, avaliacao_selecionada,
                 st.markdown("---")
                 st.subheader("📊 Composição dos Grupos")
                 composicao_df = analisar_composicao_grupos(grupos)
-                st.dataframe(
-                    composicao_df.style.background_gradient(cmap='Greens'),
-                    use_container_width=True
-                )
+                with medir('render_tabela', linhas=len(composicao_df)):
+                    st.dataframe(
+                        composicao_df.style.background_gradient(cmap='Greens'),
+                        use_container_width=True
+                    )
 
                 st.subheader("📋 Detalhes dos Grupos Formados")
                 num_colunas = 2 
@@ -419,7 +527,7 @@ def render_gerador_grupos(df_filtrado, habilidades_cols, avaliacao_selecionada,
                                 title_text='<b>Desempenho Médio do Grupo</b>', yaxis_range=[0, 2.1], height=300,
                                 margin=dict(l=20, r=20, t=40, b=20), title_font_size=16
                             )
-                            st.plotly_chart(fig, use_container_width=True, key=f"chart_{i}")
+                            plotly_chart_medido(fig, use_container_width=True, key=f"chart_{i}")
 
 
 # --- Aplicação Principal ---
@@ -433,15 +541,23 @@ def main():
         "CAED 1 - Português 9º Ano": "CAED1_9_portugues",
         "CAED 2 - Português 9º Ano": "CAED2_9_portugues",
     }
+    # Só as avaliações catalogadas para a escola e o ano selecionados
+    provas_disponiveis = {particao['prova'] for particao in particoes('caed_habilidades', escola, ano)}
+    mapa_avaliacoes = {rotulo: prova for rotulo, prova in mapa_avaliacoes.items() if prova in provas_disponiveis}
+    if not mapa_avaliacoes:
+        st.info("Nenhuma avaliação CAEd cadastrada para esta escola e ano.")
+        return
     
     avaliacao_label = st.sidebar.selectbox(
         "Selecione a Avaliação:",
         options=list(mapa_avaliacoes.keys())
     )
     avaliacao_selecionada = mapa_avaliacoes[avaliacao_label]
-    nome_arquivo = f"{avaliacao_selecionada}.csv"
+    nome_arquivo = caminho_dados('caed_habilidades', escola, ano, prova=avaliacao_selecionada)
     
-    df = carregar_dados(nome_arquivo)
+    with medir('carga_csv') as registro:
+        df = carregar_dados(nome_arquivo)
+        registro['linhas'] = len(df) if df is not None else 0
 
     if df is not None:
         aluno_col, turma_col = encontrar_colunas_info(df)
@@ -477,15 +593,21 @@ def main():
 
         # --- Renderiza a página selecionada ---
         if not df_filtrado.empty:
+            versao = (nome_arquivo, versao_arquivos(nome_arquivo))
             if pagina_selecionada == "Visão Geral":
-                paginas[pagina_selecionada](df_filtrado, habilidades_cols, avaliacao_selecionada, turmas_selecionadas, turma_col)
+                paginas[pagina_selecionada](df_filtrado, habilidades_cols, avaliacao_selecionada, turmas_selecionadas, turma_col, versao)
+            elif pagina_selecionada == "Gerador de Grupos":
+                paginas[pagina_selecionada](df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col, versao)
             else: 
-                paginas[pagina_selecionada](df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col)
+                recomendacoes = recomendacoes_habilidades(nome_arquivo, versao, aluno_col, turma_col, tuple(habilidades_cols))
+                paginas[pagina_selecionada](df_filtrado, habilidades_cols, avaliacao_selecionada, aluno_col, recomendacoes)
         else:
             st.warning("Nenhum aluno corresponde aos filtros selecionados. Por favor, ajuste o filtro de turmas na barra lateral.")
     else:
         st.warning(f"Não foi possível carregar os dados. Verifique se o arquivo **{nome_arquivo}** está na mesma pasta do seu script.")
 
+    exibir_diagnostico()
+
     # --- Rodapé ---
     st.markdown("---")
     st.markdown("""
@@ -5,6 +5,20 @@ import plotly.graph_objects as go
 import numpy as np
 import os
 
+from analytics.armazenamento import selecionar_particao, particoes, caminho_dados, fonte_dados
+from analytics.distribuicoes import resumir_grupos, figura_histograma, figura_boxplot
+from analytics.exportacao import renderizar_exportacao
+from analytics.faixas import anexar_faixas, coluna_faixa, LIMITES_DESEMPENHO, SUFIXO_FAIXA
+from analytics.fluxo import versao_arquivos
+from analytics.graficos import plotly_chart_medido
+from analytics.instrumentacao import iniciar_execucao, medir, exibir_diagnostico
+from analytics.memoria import compartilhado
+from analytics.paineis import abas_preguicosas, conteudo_painel
+from analytics.persistencia import persistente
+from analytics.ranking import indice_ranking, top, posicao, posicoes, percentil
+from analytics.tabelas import renderizar_tabela_paginada, ESTILOS_DESEMPENHO
+from analytics.validacao import validar_notas, exibir_quarentena
+
 # --- Configurações da Página e Estilo ---
 st.set_page_config(
     page_title="Análise de Desempenho - Prova Paraná",
@@ -13,6 +27,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+iniciar_execucao('Prova Paraná 1ª edição')
+
+escola, ano = selecionar_particao()
+
 # --- CSS Aprimorado para uma Apresentação Elegante ---
 st.markdown("""
 <style>
@@ -85,17 +103,21 @@ st.markdown("""
 
 
 # --- Configuração Centralizada das Turmas ---
+COLUNAS_NAO_DISCIPLINAS = ['ALUNO', 'TURMA', 'ESCOLA', 'PERCACERTOSALUNO', 'PERCACERTOSGERAL', 'PRESENCA']
+
+# Turmas da escola e do ano selecionados, conforme o catálogo de partições
 TURMAS_CONFIG = {
-    "6º Ano A": {"arquivo": "PPR_6A.csv"},
-    "7º Ano A": {"arquivo": "PPR_7A.csv"},
-    "7º Ano B": {"arquivo": "PPR_7B.csv"},
-    "8º Ano A": {"arquivo": "PPR_8A.csv"},
-    "9º Ano A": {"arquivo": "PPR_9A.csv"},
+    particao["turma"]: {
+        "arquivo": caminho_dados('prova_parana_1ed', escola, ano, turma=particao["turma"]),
+        "fonte": fonte_dados('prova_parana_1ed', escola, ano, turma=particao["turma"]),
+    }
+    for particao in particoes('prova_parana_1ed', escola, ano)
 }
 
 # --- Funções do Aplicativo ---
 
-@st.cache_data
+@compartilhado
+@persistente
 def carregar_dados(nome_arquivo):
     """
     Carrega os dados da turma usando um método robusto para encontrar o arquivo e limpar os nomes das colunas.
@@ -122,16 +144,19 @@ def carregar_dados(nome_arquivo):
         st.error(f"Ocorreu um erro ao ler o arquivo '{nome_arquivo}': {e}")
         return None
 
+@compartilhado
+@persistente
 def processar_dados(df):
-    """Processa o DataFrame para calcular percentuais e identificar disciplinas."""
-    colunas_nao_disciplinas = ['ALUNO', 'TURMA', 'ESCOLA', 'PERCACERTOSALUNO', 'PERCACERTOSGERAL', 'PRESENCA']
-    disciplinas = [col for col in df.columns if col not in colunas_nao_disciplinas]
+    """Processa o DataFrame para calcular percentuais, faixas de desempenho e disciplinas."""
+    disciplinas = [col for col in df.columns if col not in COLUNAS_NAO_DISCIPLINAS]
     
     for col in disciplinas:
         df[col] = pd.to_numeric(df[col], errors='coerce')
     
     if disciplinas:
         df['PERCACERTOSALUNO'] = df[disciplinas].mean(axis=1)
+        # Faixas calculadas uma vez por snapshot, junto com os dados em cache
+        df = anexar_faixas(df, disciplinas + ['PERCACERTOSALUNO'], LIMITES_DESEMPENHO)
     
     return df, disciplinas
 
@@ -144,7 +169,7 @@ def renderizar_metricas_gerais(df, disciplina_selecionada):
     media_geral = dados_disciplina.mean()
     mediana_geral = dados_disciplina.median()
     num_alunos = df.shape[0]
-    aprovados = sum(dados_disciplina >= 60)
+    aprovados = int((df[coluna_faixa(disciplina_selecionada)] >= 1).sum())
     perc_aprovados = (aprovados / num_alunos) * 100 if num_alunos > 0 else 0
 
     col1, col2, col3, col4 = st.columns(4)
@@ -165,32 +190,61 @@ def renderizar_metricas_gerais(df, disciplina_selecionada):
         st.metric(label="Total de Alunos", value=num_alunos)
         st.markdown('</div>', unsafe_allow_html=True)
 
-def renderizar_graficos_distribuicao(df, disciplina_selecionada):
+def ranking_geral(df, turma):
+    """Índice de ranking pelo percentual geral de acertos (sem nota conta como zero)."""
+    return indice_ranking(TURMAS_CONFIG[turma]["fonte"], 'PERCACERTOSALUNO', df['PERCACERTOSALUNO'].fillna(0),
+                          versao=versao_turma(turma))
+
+def versao_turma(turma):
+    """Versão dos dados de uma turma, para os painéis guardados na sessão."""
+    arquivo = TURMAS_CONFIG[turma]["arquivo"]
+    return arquivo, versao_arquivos(arquivo)
+
+def montar_distribuicao(df, disciplina_selecionada, turma):
+    """Ranking da disciplina e figuras de distribuição (sem figuras se não houver notas)."""
+    # Ordem mantida pelo índice da turma; alunos sem nota ficam no fim
+    indice = indice_ranking(TURMAS_CONFIG[turma]["fonte"], disciplina_selecionada, df[disciplina_selecionada],
+                            versao=versao_turma(turma))
+    ordem = top(indice, len(df))
+    ordem += df.index[df[disciplina_selecionada].isna()].tolist()
+    df_ranking = df.loc[ordem, ['ALUNO', disciplina_selecionada]].reset_index(drop=True)
+    df_ranking.index += 1
+
+    # Faixas e quartis calculados aqui; o navegador recebe só o resumo
+    resumo = resumir_grupos(df, disciplina_selecionada).get('Todos')
+    if resumo is None:
+        return df_ranking, None, None
+    fig_hist = figura_histograma(resumo, nome_valor=disciplina_selecionada, title=f"Distribuição em {disciplina_selecionada}", height=400)
+    fig_box = figura_boxplot({disciplina_selecionada: resumo}, cores=['#4e73df'], nome_valor=disciplina_selecionada, title=f"Dispersão das Notas em {disciplina_selecionada}", height=400)
+    return df_ranking, fig_hist, fig_box
+
+def renderizar_graficos_distribuicao(df, disciplina_selecionada, turma):
     """Exibe os gráficos de distribuição e ranking de alunos."""
     st.markdown('<h3 class="section-title">📊 Visualizações de Desempenho</h3>', unsafe_allow_html=True)
+    df_ranking, fig_hist, fig_box = conteudo_painel(
+        f'ppr_distribuicao_{disciplina_selecionada}', versao_turma(turma),
+        lambda: montar_distribuicao(df, disciplina_selecionada, turma)
+    )
     
     col1, col2 = st.columns([1, 2])
 
     with col1:
         st.markdown("##### Ranking de Alunos")
-        df_ranking = df[['ALUNO', disciplina_selecionada]].sort_values(by=disciplina_selecionada, ascending=False).reset_index(drop=True)
-        df_ranking.index += 1
-        st.dataframe(df_ranking.style.format({disciplina_selecionada: "{:.1f}%"}), height=400, use_container_width=True)
+        with medir('render_tabela', linhas=len(df_ranking)):
+            st.dataframe(df_ranking.style.format({disciplina_selecionada: "{:.1f}%"}), height=400, use_container_width=True)
 
     with col2:
-        tab1, tab2 = st.tabs(["Distribuição de Notas", "Box Plot Comparativo"])
-        
-        with tab1:
-            fig_hist = px.histogram(df, x=disciplina_selecionada, nbins=10, title=f"Distribuição em {disciplina_selecionada}", color_discrete_sequence=['#4e73df'])
-            fig_hist.update_layout(bargap=0.1, template="plotly_white", showlegend=False, height=400)
-            st.plotly_chart(fig_hist, use_container_width=True)
-        
-        with tab2:
-            fig_box = px.box(df, y=disciplina_selecionada, title=f"Dispersão das Notas em {disciplina_selecionada}", color_discrete_sequence=['#4e73df'])
-            fig_box.update_layout(template="plotly_white", showlegend=False, height=400)
-            st.plotly_chart(fig_box, use_container_width=True)
+        if fig_hist is None:
+            st.info(f"Sem notas de {disciplina_selecionada} nesta turma.")
+            return
+
+        abas = abas_preguicosas(["Distribuição de Notas", "Box Plot Comparativo"], chave='abas_distribuicao')
+        for (aba, aberta), fig in zip(abas, [fig_hist, fig_box]):
+            if aberta:
+                with aba:
+                    plotly_chart_medido(fig, use_container_width=True)
 
-def renderizar_analise_individual(df, disciplinas):
+def renderizar_analise_individual(df, disciplinas, turma):
     """Exibe a análise detalhada por aluno com o elogiado gráfico de radar."""
     st.markdown('<h3 class="section-title">👤 Análise de Desempenho Individual</h3>', unsafe_allow_html=True)
     
@@ -204,6 +258,9 @@ def renderizar_analise_individual(df, disciplinas):
         st.markdown(f"##### Resumo de **{aluno_selecionado}**")
         media_aluno = dados_aluno.mean()
         st.metric("Média Geral do Aluno", f"{media_aluno:.1f}%" if pd.notna(media_aluno) else "N/A")
+        indice = ranking_geral(df, turma)
+        linha = df.index[df['ALUNO'] == aluno_selecionado][0]
+        st.caption(f"Posição na turma: {posicao(indice, linha)}º (percentil {percentil(indice, linha):.0f})")
         
         if pd.notna(media_aluno):
             melhor_disc = dados_aluno.idxmax()
@@ -219,42 +276,80 @@ def renderizar_analise_individual(df, disciplinas):
             fig_radar.add_trace(go.Scatterpolar(r=media_turma.values, theta=disciplinas, fill='toself', name='Média da Turma', line_color='rgba(231, 74, 59, 0.7)'))
 
         fig_radar.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 100])), showlegend=True, height=500, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5), title=f"Radar Comparativo: {aluno_selecionado} vs. Média da Turma")
-        st.plotly_chart(fig_radar, use_container_width=True)
+        plotly_chart_medido(fig_radar, use_container_width=True)
 
-def renderizar_tabela_detalhada(df, disciplinas):
+def preparar_turma(turma):
+    """Carrega, valida e processa o CSV de uma turma; devolve None se o arquivo não existir."""
+    with medir('carga_csv') as registro:
+        df = carregar_dados(TURMAS_CONFIG[turma]["arquivo"])
+        registro['linhas'] = len(df) if df is not None else 0
+    if df is None:
+        return None, [], None
+    # Percentuais acima de 100, texto (ex.: 'CIÊNCiAS') e alunos repetidos
+    colunas_notas = [col for col in df.columns if col not in COLUNAS_NAO_DISCIPLINAS or col == 'PERCACERTOSALUNO']
+    df, quarentena = validar_notas(df, colunas_notas, 100, TURMAS_CONFIG[turma]["fonte"], chaves=['ALUNO'])
+    with medir('limpeza', linhas=len(df)):
+        df, disciplinas = processar_dados(df)
+    return df, disciplinas, quarentena
+
+def montar_tabela_detalhada(df, disciplinas, turma):
+    """Tabela completa da turma ordenada pelo ranking, com as colunas de faixa ao final."""
+    ranking = posicoes(ranking_geral(df, turma))
+    df_display = df.loc[ranking.index]
+    colunas_para_formatar = disciplinas + ['PERCACERTOSALUNO']
+    df_display['RANKING'] = ranking.to_numpy()
+    
+    colunas_ordenadas = ['RANKING', 'ALUNO'] + colunas_para_formatar + [coluna_faixa(c) for c in colunas_para_formatar]
+    return df_display[colunas_ordenadas]
+
+def tabelas_exportacao(turmas):
+    """Tabela detalhada de cada turma, sem as colunas internas de faixa."""
+    tabelas = {}
+    for turma in turmas:
+        df, disciplinas, _ = preparar_turma(turma)
+        if df is not None and disciplinas:
+            tabela = montar_tabela_detalhada(df, disciplinas, turma)
+            tabelas[turma] = tabela[[c for c in tabela.columns if not c.endswith(SUFIXO_FAIXA)]]
+    return tabelas
+
+def renderizar_tabela_detalhada(df, disciplinas, turma_selecionada):
     """Exibe a tabela completa com formatação condicional elegante e legível."""
     st.markdown('<h3 class="section-title">📋 Dados Completos da Turma</h3>', unsafe_allow_html=True)
 
-    def style_performance(val):
-        try:
-            val_num = float(val)
-            if val_num >= 80:
-                style = 'background-color: #e9f5ee; color: #1e663a; border-left: 5px solid #28a745; font-weight: 600;'
-            elif val_num >= 60:
-                style = 'background-color: #fff8e1; color: #8c6c0a; border-left: 5px solid #ffc107;'
-            else:
-                style = 'background-color: #fdeaea; color: #a94442; border-left: 5px solid #dc3545;'
-            return style
-        except (ValueError, TypeError):
-            return ''
-
-    df_display = df.copy()
     colunas_para_formatar = disciplinas + ['PERCACERTOSALUNO']
-    df_display['RANKING'] = df_display['PERCACERTOSALUNO'].fillna(0).rank(ascending=False, method='min').astype(int)
     
-    colunas_ordenadas = ['RANKING', 'ALUNO'] + colunas_para_formatar
-    
-    styler = df_display[colunas_ordenadas].sort_values('RANKING').style
-    format_dict = {col: '{:.1f}%' for col in colunas_para_formatar}
-    
-    for col in colunas_para_formatar:
-        styler = styler.apply(lambda s: s.map(style_performance), subset=[col])
-        
-    styler = styler.format(format_dict)
-    st.dataframe(styler, use_container_width=True, height=600)
+    # As faixas já vêm do cache de processar_dados; só a página visível recebe o CSS
+    tabela = conteudo_painel(
+        'ppr_tabela_detalhada', versao_turma(turma_selecionada),
+        lambda: montar_tabela_detalhada(df, disciplinas, turma_selecionada)
+    )
+    renderizar_tabela_paginada(
+        tabela,
+        chave='tabela_detalhada',
+        faixas=[(colunas_para_formatar, LIMITES_DESEMPENHO, ESTILOS_DESEMPENHO)],
+        formato={col: '{:.1f}%' for col in colunas_para_formatar},
+        coluna_busca='ALUNO',
+        use_container_width=True,
+        height=600
+    )
+
+    # Arquivos gerados em segundo plano, sem travar a página
+    renderizar_exportacao(
+        'exportacao_ppr',
+        {
+            turma_selecionada: lambda: tabelas_exportacao([turma_selecionada]),
+            'Escola (todas as turmas)': lambda: tabelas_exportacao(list(TURMAS_CONFIG)),
+        },
+        nome="Prova_Parana",
+        titulo="Prova Paraná - 1ª Edição"
+    )
 
 # --- Aplicação Principal ---
 def main():
+    if not TURMAS_CONFIG:
+        st.info("Nenhuma turma com Prova Paraná cadastrada para esta escola e ano.")
+        return
+
     with st.sidebar:
         st.markdown('<h2 style="text-align: center; color: #2c3e50;">Painel de Controle</h2>', unsafe_allow_html=True)
         turma_selecionada = st.selectbox("Selecione a Turma:", options=list(TURMAS_CONFIG.keys()))
@@ -270,11 +365,10 @@ def main():
         
         st.markdown("---")
         
-        arquivo_csv = TURMAS_CONFIG[turma_selecionada]["arquivo"]
-        df = carregar_dados(arquivo_csv)
+        df, disciplinas_disponiveis, quarentena = preparar_turma(turma_selecionada)
         
         if df is not None:
-            df, disciplinas_disponiveis = processar_dados(df)
+            exibir_quarentena(quarentena)
             if not disciplinas_disponiveis:
                 st.warning("Nenhuma disciplina encontrada no arquivo.")
                 return
@@ -288,11 +382,13 @@ def main():
     if df is not None and 'disciplina_selecionada' in locals():
         if st.session_state.pagina_atual == "Visão Geral":
             renderizar_metricas_gerais(df, disciplina_selecionada)
-            renderizar_graficos_distribuicao(df, disciplina_selecionada)
+            renderizar_graficos_distribuicao(df, disciplina_selecionada, turma_selecionada)
         elif st.session_state.pagina_atual == "Análise Individual":
-            renderizar_analise_individual(df, disciplinas_disponiveis)
+            renderizar_analise_individual(df, disciplinas_disponiveis, turma_selecionada)
         elif st.session_state.pagina_atual == "Dados Completos":
-            renderizar_tabela_detalhada(df, disciplinas_disponiveis)
+            renderizar_tabela_detalhada(df, disciplinas_disponiveis, turma_selecionada)
+
+    exibir_diagnostico()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file